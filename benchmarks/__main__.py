@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.runner import compare, run_benchmarks, save_results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the recommender tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmark scenarios")
+    run.add_argument("--scale", type=int, default=2000, help="Number of synthetic movies")
+    run.add_argument("--iterations", type=int, default=50)
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument("--seed", type=int, default=7)
+    run.add_argument("--query-latency", type=float, default=0.002, help="In-memory graph round trip (s)")
+    run.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM latency per call (s)")
+    run.add_argument("--token-latency", type=float, default=0.0, help="Fake LLM latency per token (s)")
+    run.add_argument("--embedding-dim", type=int, default=256)
+    run.add_argument("--scenario", action="append", help="Run only the given scenario(s)")
+    run.add_argument("--neo4j-uri", help="Run against a local Neo4j instead of the in-memory graph")
+    run.add_argument("--neo4j-username", default="neo4j")
+    run.add_argument("--neo4j-password", default=os.environ.get("NEO4J_PASSWORD", ""))
+    run.add_argument("--load", action="store_true", help="Load the synthetic catalog into Neo4j")
+    run.add_argument("--reset", action="store_true", help="Delete every node before loading")
+    run.add_argument("--output", default="benchmarks/results/latest.json")
+
+    diff = subparsers.add_parser("compare", help="Compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=0.1, help="Allowed relative slowdown")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print("No regressions")
+        sys.exit(1 if regressions else 0)
+
+    neo4j = None
+    if args.neo4j_uri:
+        neo4j = {
+            "url": args.neo4j_uri,
+            "username": args.neo4j_username,
+            "password": args.neo4j_password,
+        }
+    results = run_benchmarks(
+        scale=args.scale,
+        iterations=args.iterations,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        query_latency=args.query_latency,
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency,
+        embedding_dim=args.embedding_dim,
+        neo4j=neo4j,
+        load=args.load,
+        reset=args.reset,
+        scenarios=args.scenario,
+    )
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    save_results(results, args.output)
+    print(json.dumps(results["results"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
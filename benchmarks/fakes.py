@@ -0,0 +1,141 @@
+import hashlib
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Query emitted by the fake LLM for Cypher generation prompts, answered by InMemoryGraph
+BENCHMARK_CYPHER = (
+    'MATCH (a:Actor {{actorName: "{actor}"}})-[:ACTED_IN]->(m:Movie) '
+    "RETURN m.title AS title LIMIT 10"
+)
+BENCHMARK_CYPHER_PATTERN = re.compile(
+    r'MATCH \(a:Actor \{actorName: "(?P<actor>.*?)"\}\)-\[:ACTED_IN\]->\(m:Movie\) '
+    r"RETURN m\.title AS title LIMIT (?P<limit>\d+)"
+)
+
+# Agent tool chosen for a user message, checked in order
+TOOL_KEYWORDS = (
+    ("preferences", "Movie recommendation based on user preferences"),
+    ("actor", "Movie recommendation based on relationships"),
+    ("starring", "Movie recommendation based on relationships"),
+    ("genre", "Movie recommendation based on relationships"),
+)
+DEFAULT_TOOL = "Movie recommendation based on description"
+
+
+def _seed(text: str) -> int:
+    """Return a stable integer seed for a text."""
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings derived from a hash of the text."""
+
+    def __init__(self, dim: int = 1536, latency: float = 0.0, model: str = "fake-embedding"):
+        """Initialize the fake embeddings.
+
+        Args:
+            dim (int): Vector dimension
+            latency (float): Seconds slept per call, to simulate a remote model
+            model (str): Model name, used as part of cache keys
+        """
+        self.dim = dim
+        self.latency = latency
+        self.model = model
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        rng = np.random.default_rng(_seed(text))
+        vector = rng.standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model that understands the prompts of this project.
+
+    ReAct prompts get one tool call followed by a final answer, Cypher
+    generation prompts get ``BENCHMARK_CYPHER`` and every other prompt gets a
+    short recommendation list. Latency is simulated per call and per token.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_tokens: int = 40
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+
+    def _respond(self, prompt: str) -> str:
+        if "Thought: Do I need to use a tool?" in prompt and "New input:" in prompt:
+            conversation = prompt.split("New input:", 1)[1]
+            user_input = conversation.split("\n", 1)[0].strip()
+            if "Observation:" in conversation:
+                return "Thought: Do I need to use a tool? No\nFinal Answer: " + self._answer(
+                    conversation
+                )
+            tool = next(
+                (name for keyword, name in TOOL_KEYWORDS if keyword in user_input.lower()),
+                DEFAULT_TOOL,
+            )
+            return (
+                "Thought: Do I need to use a tool? Yes\n"
+                f"Action: {tool}\n"
+                f"Action Input: {user_input}"
+            )
+        if "expert Neo4j Developer" in prompt:
+            question = prompt.rsplit("Question:", 1)[-1]
+            quoted = re.search(r'"([^"]+)"', question)
+            return BENCHMARK_CYPHER.format(actor=quoted.group(1) if quoted else "actor 0")
+        return self._answer(prompt)
+
+    def _answer(self, prompt: str) -> str:
+        rng = np.random.default_rng(_seed(prompt))
+        words = [f"movie{int(i)}" for i in rng.integers(0, 10_000, self.answer_tokens)]
+        return "Recommendations: " + " ".join(words)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._respond("\n".join(str(message.content) for message in messages))
+        for token in re.findall(r"\S+\s*|\s+", text):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
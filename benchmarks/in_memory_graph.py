@@ -0,0 +1,518 @@
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.fakes import BENCHMARK_CYPHER_PATTERN
+from benchmarks.synthetic_graph import SyntheticCatalog
+from src.prompts.cypher_prompts import (
+    CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_HYBRID_RECOMMENDATION_TEMPLATE,
+    CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+)
+
+# Profile list -> name -> node ID mapping of the InMemoryGraph attribute it is checked against
+_PROFILE_LISTS = {
+    "user_movies": "ids",
+    "user_actors": "actor_ids",
+    "user_genres": "genre_ids",
+    "user_watched": "ids",
+}
+
+
+def _signature(query: str) -> str:
+    """Collapse whitespace so templates match regardless of indentation."""
+    return " ".join(query.split())
+
+
+class InMemoryGraph:
+    """In-memory stand-in for Neo4jGraph that answers the queries of this project.
+
+    Only the shipped templates, the catalog and vector export queries, the
+    user profile writes and the query emitted by the fake LLM are supported. Every query sleeps for
+    ``query_latency`` seconds to simulate the network round trip to Neo4j.
+    """
+
+    _enhanced_schema = False
+
+    def __init__(
+        self, catalog: SyntheticCatalog, query_latency: float = 0.002, similar_top_n: int = 50
+    ):
+        """Index a synthetic catalog.
+
+        Args:
+            catalog (SyntheticCatalog): Catalog to serve
+            query_latency (float): Seconds slept per query
+            similar_top_n (int): Length of the stored SIMILAR lists, as in similarity_table.py
+        """
+        self.catalog = catalog
+        self.query_latency = query_latency
+        self.similar_top_n = similar_top_n
+        # Stored SIMILAR lists, computed on first use
+        self.similar: Dict[str, List[dict]] = {}
+        # Preference lists of the User nodes, by user ID
+        self.users: Dict[str, Dict[str, List[str]]] = {}
+        self.query_counts: Counter = Counter()
+        self.movies = {movie.title: movie for movie in catalog.movies}
+        self.ids = {movie.title: f"movie:{i}" for i, movie in enumerate(catalog.movies)}
+        self.titles_by_id = {movie_id: title for title, movie_id in self.ids.items()}
+        self.actor_ids = {actor: f"actor:{i}" for i, actor in enumerate(catalog.actors)}
+        self.genre_ids = {genre: f"genre:{i}" for i, genre in enumerate(catalog.genres)}
+        self.names_by_id = {
+            node_id: name
+            for ids in (self.ids, self.actor_ids, self.genre_ids)
+            for name, node_id in ids.items()
+        }
+        self.movies_by_genre: Dict[str, set] = defaultdict(set)
+        self.movies_by_actor: Dict[str, set] = defaultdict(set)
+        for movie in catalog.movies:
+            for genre in movie.genres:
+                self.movies_by_genre[genre].add(movie.title)
+            for actor in movie.actors:
+                self.movies_by_actor[actor].add(movie.title)
+
+        self.schema = (
+            "Node properties:\nMovie {title: STRING, description: STRING}\n"
+            "Actor {actorName: STRING}\nGenre {genre: STRING}\n"
+            "Director {directorName: STRING}\nMovieType {movieType: STRING}\n"
+            "The relationships:\n(:Actor)-[:ACTED_IN]->(:Movie)\n"
+            "(:Movie)-[:IN_GENRE]->(:Genre)\n(:Movie)-[:DIRECTED_BY]->(:Director)\n"
+            "(:Movie)-[:IS_TYPE]->(:MovieType)"
+        )
+        self.structured_schema = {
+            "node_props": {
+                "Movie": [
+                    {"property": "title", "type": "STRING"},
+                    {"property": "description", "type": "STRING"},
+                ],
+                "Actor": [{"property": "actorName", "type": "STRING"}],
+                "Genre": [{"property": "genre", "type": "STRING"}],
+                "Director": [{"property": "directorName", "type": "STRING"}],
+                "MovieType": [{"property": "movieType", "type": "STRING"}],
+            },
+            "rel_props": {},
+            "relationships": [
+                {"start": "Actor", "type": "ACTED_IN", "end": "Movie"},
+                {"start": "Movie", "type": "IN_GENRE", "end": "Genre"},
+                {"start": "Movie", "type": "DIRECTED_BY", "end": "Director"},
+                {"start": "Movie", "type": "IS_TYPE", "end": "MovieType"},
+            ],
+            "metadata": {"constraint": [], "index": []},
+        }
+        self._templates: Dict[str, Tuple[str, Callable]] = {
+            _signature(CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE): ("movie_similarity", self._movie_similarity),
+            _signature(CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_TEMPLATE): ("movie_similarity_batch", self._movie_similarity_batch),
+            _signature(CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_TEMPLATE): ("movie_similarity_precomputed", self._movie_similarity_precomputed),
+            _signature(CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE): ("genre_similarity", self._genre_similarity),
+            _signature(CYPHER_ACTOR_SIMILARITY_SEARCH_TEMPLATE): ("actor_similarity", self._actor_similarity),
+            _signature(CYPHER_HYBRID_RECOMMENDATION_TEMPLATE): ("hybrid_recommendation", self._hybrid_recommendation),
+            _signature(CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE): ("resolve_preference_ids", self._resolve_preference_ids),
+            _signature(CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE): ("movie_similarity_by_id", self._movie_similarity_by_id),
+            _signature(CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE): ("movie_similarity_batch_by_id", self._movie_similarity_batch_by_id),
+            _signature(CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE): ("movie_similarity_precomputed_by_id", self._movie_similarity_precomputed_by_id),
+            _signature(CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE): ("genre_similarity_by_id", self._genre_similarity_by_id),
+            _signature(CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE): ("actor_similarity_by_id", self._actor_similarity_by_id),
+            _signature(CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE): ("movie_similarity_batch_by_user", self._movie_similarity_batch_by_user),
+            _signature(CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE): ("genre_similarity_by_user", self._genre_similarity_by_user),
+            _signature(CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE): ("actor_similarity_by_user", self._actor_similarity_by_user),
+        }
+        # Inline queries of src/prompts/cypher_queries.py, matched on a distinctive fragment
+        self._fragments: List[Tuple[str, str, Callable]] = [
+            # Queries of src/database/user_profiles.py
+            ("MERGE (u:User {userId: $user_id})", "apply_profile_changes", self._apply_profile_changes),
+            ("DETACH DELETE u", "delete_profile", self._delete_profile),
+            # Queries of src/database/preference_snapshot.py
+            ("| a.actorName] AS actors", "snapshot_movies", self._snapshot_movies),
+            ("collect(m.title) AS titles", "catalog_lists", self._catalog_lists),
+            ("count(m.title) AS movies", "catalog_counts", self._catalog_counts),
+            ("m.descriptionEmbedding AS embedding", "movie_vectors", self._movie_vectors),
+            ("RETURN count(m) AS count", "movie_vector_count", self._movie_vector_count),
+            ("UNWIND range(0, size($ids) - 1) AS position", "movie_metadata", self._movie_metadata),
+            ("RETURN m.title AS title", "movie_titles", lambda p: [{"title": t} for t in self.movies]),
+            ("RETURN g.genre AS genre", "genre_names", lambda p: [{"genre": g} for g in self.catalog.genres]),
+            ("RETURN a.actorName AS name", "actor_names", lambda p: [{"name": a} for a in self.catalog.actors]),
+            ("SHOW INDEXES", "show_indexes", lambda p: [{"state": "ONLINE"}]),
+        ]
+
+    @property
+    def get_schema(self) -> str:
+        return self.schema
+
+    @property
+    def get_structured_schema(self) -> Dict[str, Any]:
+        return self.structured_schema
+
+    def refresh_schema(self) -> None:
+        pass
+
+    def add_graph_documents(self, graph_documents: List[Any], include_source: bool = False) -> None:
+        raise NotImplementedError("The in-memory graph is read-only")
+
+    def query(
+        self, query: str, params: dict = {}, session_params: dict = {}, timeout: Any = None
+    ) -> List[Dict[str, Any]]:
+        """Answer a supported query, sleeping ``query_latency`` seconds first.
+
+        ``timeout`` is accepted like the app's graph does and ignored.
+        """
+        if self.query_latency:
+            time.sleep(self.query_latency)
+        name, handler = self._resolve(query)
+        self.query_counts[name] += 1
+        return handler(params or {})
+
+    def _resolve(self, query: str) -> Tuple[str, Callable]:
+        signature = _signature(query)
+        if signature in self._templates:
+            return self._templates[signature]
+        match = BENCHMARK_CYPHER_PATTERN.search(signature)
+        if match:
+            actor, limit = match.group("actor"), int(match.group("limit"))
+            return "generated_cypher", lambda p: [
+                {"title": title} for title in sorted(self.movies_by_actor.get(actor, ()))[:limit]
+            ]
+        for fragment, name, handler in self._fragments:
+            if fragment in signature:
+                return name, handler
+        raise NotImplementedError(f"Query not supported by the in-memory graph: {signature[:120]}")
+
+    def _catalog_lists(self, params: dict) -> List[dict]:
+        return [
+            {
+                "titles": list(self.movies),
+                "genres": list(self.catalog.genres),
+                "actors": list(self.catalog.actors),
+            }
+        ]
+
+    def _catalog_counts(self, params: dict) -> List[dict]:
+        return [
+            {
+                "movies": len(self.movies),
+                "genres": len(self.catalog.genres),
+                "actors": len(self.catalog.actors),
+            }
+        ]
+
+    def _movie_vector_count(self, params: dict) -> List[dict]:
+        return [{"count": len(self.catalog.embeddings)}]
+
+    def _movie_vectors(self, params: dict) -> List[dict]:
+        ids = sorted(self.ids[title] for title in self.catalog.embeddings)
+        page = ids[params["skip"] : params["skip"] + params["limit"]]
+        return [
+            {
+                "id": movie_id,
+                "title": self.titles_by_id[movie_id],
+                "embedding": self.catalog.embeddings[self.titles_by_id[movie_id]],
+            }
+            for movie_id in page
+        ]
+
+    def _movie_metadata(self, params: dict) -> List[dict]:
+        records = []
+        for position, movie_id in enumerate(params["ids"]):
+            movie = self.movies.get(self.titles_by_id.get(movie_id))
+            if movie is None:
+                continue
+            records.append(
+                {
+                    "position": position,
+                    "text": movie.description,
+                    "metadata": {
+                        "title": movie.title,
+                        "type": [movie.movie_type],
+                        "directors": movie.directors,
+                        "actors": movie.actors,
+                        "genres": movie.genres,
+                    },
+                }
+            )
+        return records
+
+    def _snapshot_neighbourhood(self, title: str) -> dict:
+        movie = self.movies[title]
+        return {"title": title, "genres": list(movie.genres), "actors": list(movie.actors)}
+
+    def _snapshot_movies(self, params: dict) -> List[dict]:
+        titles = sorted(self.movies)[params["skip"] : params["skip"] + params["limit"]]
+        return [self._snapshot_neighbourhood(title) for title in titles]
+
+    def _seed_scores(
+        self, seed: str, excluded: set, min_actors: int = 0, without_actors: set = frozenset()
+    ) -> Dict[str, int]:
+        """Score the candidates of one seed with 2 * shared genres + shared actors.
+
+        The single-seed templates count a "No Actor" placeholder, so they pass
+        ``min_actors=1``. Shared actors of the ``without_actors`` candidates
+        are not counted.
+        """
+        movie = self.movies.get(seed)
+        if movie is None:
+            return {}
+        shared_genres: Counter = Counter()
+        for genre in movie.genres:
+            shared_genres.update(self.movies_by_genre[genre])
+        shared_actors: Counter = Counter()
+        for actor in movie.actors:
+            shared_actors.update(self.movies_by_actor[actor])
+        return {
+            title: 2 * count
+            + max(0 if title in without_actors else shared_actors.get(title, 0), min_actors)
+            for title, count in shared_genres.items()
+            if title not in excluded and title != seed
+        }
+
+    @staticmethod
+    def _top_five(scores: Dict[str, int]) -> List[dict]:
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:5]
+        return [{"RecommendedMovie": title, "score": score} for title, score in ranked]
+
+    def _movie_similarity(self, params: dict) -> List[dict]:
+        # The WHERE belongs to the OPTIONAL MATCH: excluded movies are still
+        # recommended, they only lose their shared actors to "No Actor"
+        excluded = set(params["user_watched_movies"]) | set(params["user_movies"])
+        return self._top_five(
+            self._seed_scores(params["movie_title"], set(), min_actors=1, without_actors=excluded)
+        )
+
+    def _movie_similarity_batch(self, params: dict) -> List[dict]:
+        excluded = set(params["excluded_movies"])
+        totals: Counter = Counter()
+        seeds: Dict[str, list] = defaultdict(list)
+        for seed in params["user_movies"]:
+            for title, score in self._seed_scores(seed, excluded).items():
+                totals[title] += score
+                seeds[title].append({"seed": seed, "score": score})
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[: params["limit"]]
+        return [
+            {
+                "RecommendedMovie": title,
+                "score": score,
+                "seeds": sorted(seeds[title], key=lambda s: (-s["score"], s["seed"])),
+            }
+            for title, score in ranked
+        ]
+
+    def _similar_movies(self, seed: str, excluded: set) -> List[dict]:
+        """Return the stored SIMILAR list of a movie without the excluded titles."""
+        if seed not in self.similar:
+            ranked = sorted(self._seed_scores(seed, set()).items(), key=lambda item: (-item[1], item[0]))
+            self.similar[seed] = [
+                {"title": title, "score": score} for title, score in ranked[: self.similar_top_n]
+            ]
+        return [neighbour for neighbour in self.similar[seed] if neighbour["title"] not in excluded]
+
+    def _movie_similarity_precomputed(self, params: dict) -> List[dict]:
+        excluded = set(params["excluded_movies"])
+        return [
+            {
+                "seed": seed,
+                "fresh": seed in self.movies,
+                "neighbours": self._similar_movies(seed, excluded) if seed in self.movies else [],
+            }
+            for seed in params["user_movies"]
+        ]
+
+    def _match_count(self, values: List[str], index: Dict[str, set], excluded: set) -> List[dict]:
+        """Rank like the *_BY_ID and *_BY_USER genre and actor templates.
+
+        Every matched node counts once and ties are broken by title.
+        """
+        counts: Counter = Counter()
+        for value in set(values):
+            counts.update(index.get(value, ()))
+        ranked = sorted(
+            ((title, count) for title, count in counts.items() if title not in excluded),
+            key=lambda item: (-item[1], item[0]),
+        )[:5]
+        return [{"rec.title": title} for title, _ in ranked]
+
+    def _list_match_count(self, values: List[str], index: Dict[str, set], excluded: set) -> List[dict]:
+        """Rank like the title-based genre and actor templates.
+
+        The count is the number of list entries the movie matches, so repeated
+        names count repeatedly, and the template leaves the order of ties open.
+        """
+        counts: Counter = Counter()
+        for value in values:
+            counts.update(title for title in sorted(index.get(value, ())) if title not in excluded)
+        return [{"rec.title": title} for title, _ in counts.most_common(5)]
+
+    def _genre_similarity(self, params: dict) -> List[dict]:
+        return self._list_match_count(
+            params["user_genres"], self.movies_by_genre, set(params["user_watched_movies"])
+        )
+
+    def _actor_similarity(self, params: dict) -> List[dict]:
+        return self._list_match_count(
+            params["user_actors"], self.movies_by_actor, set(params["user_watched_movies"])
+        )
+
+    def _names(self, node_ids: List[str]) -> List[str]:
+        return [self.names_by_id[node_id] for node_id in node_ids if node_id in self.names_by_id]
+
+    def _resolve_preference_ids(self, params: dict) -> List[dict]:
+        def pairs(names: List[str], ids: Dict[str, str]) -> List[list]:
+            return [[name, ids[name]] for name in names if name in ids]
+
+        return [
+            {
+                "movies": pairs(params["titles"], self.ids),
+                "actors": pairs(params["actors"], self.actor_ids),
+                "genres": pairs(params["genres"], self.genre_ids),
+            }
+        ]
+
+    def _movie_similarity_by_id(self, params: dict) -> List[dict]:
+        # Here the exclusion is part of the MATCH and removes the candidates
+        return self._top_five(
+            self._seed_scores(
+                self.names_by_id.get(params["movie_id"]),
+                set(self._names(params["excluded_ids"])),
+                min_actors=1,
+            )
+        )
+
+    def _movie_similarity_batch_by_id(self, params: dict) -> List[dict]:
+        return self._movie_similarity_batch(
+            {
+                "user_movies": self._names(params["movie_ids"]),
+                "excluded_movies": self._names(params["excluded_ids"]),
+                "limit": params["limit"],
+            }
+        )
+
+    def _movie_similarity_precomputed_by_id(self, params: dict) -> List[dict]:
+        records = self._movie_similarity_precomputed(
+            {
+                "user_movies": [self.titles_by_id.get(seed_id) for seed_id in params["movie_ids"]],
+                "excluded_movies": self._names(params["excluded_ids"]),
+            }
+        )
+        for seed_id, record in zip(params["movie_ids"], records):
+            record["seedId"] = seed_id
+        return records
+
+    def _genre_similarity_by_id(self, params: dict) -> List[dict]:
+        return self._match_count(
+            self._names(params["genre_ids"]),
+            self.movies_by_genre,
+            set(self._names(params["watched_ids"])),
+        )
+
+    def _actor_similarity_by_id(self, params: dict) -> List[dict]:
+        return self._match_count(
+            self._names(params["actor_ids"]),
+            self.movies_by_actor,
+            set(self._names(params["watched_ids"])),
+        )
+
+    def _apply_profile_changes(self, params: dict) -> List[dict]:
+        lists = self.users.setdefault(params["user_id"], {key: [] for key in _PROFILE_LISTS})
+        missing = {}
+        for key, ids_attribute in _PROFILE_LISTS.items():
+            removed = set(params["removed"][key])
+            lists[key] = [name for name in lists[key] if name not in removed]
+            ids = getattr(self, ids_attribute)
+            missing[key] = [name for name in params["added"][key] if name not in ids]
+            lists[key].extend(
+                name for name in params["added"][key] if name in ids and name not in lists[key]
+            )
+        return [{"userId": params["user_id"], "missing": missing}]
+
+    def _delete_profile(self, params: dict) -> List[dict]:
+        self.users.pop(params["user_id"], None)
+        return []
+
+    def _movie_similarity_batch_by_user(self, params: dict) -> List[dict]:
+        lists = self.users.get(params["user_id"])
+        if lists is None:
+            return []
+        seeds = lists["user_movies"]
+        if params["seed_ids"] is not None:
+            seeds = [title for title in seeds if self.ids[title] in params["seed_ids"]]
+        return self._movie_similarity_batch(
+            {
+                "user_movies": seeds,
+                "excluded_movies": lists["user_movies"] + lists["user_watched"],
+                "limit": params["limit"],
+            }
+        )
+
+    def _genre_similarity_by_user(self, params: dict) -> List[dict]:
+        lists = self.users.get(params["user_id"])
+        if lists is None:
+            return []
+        return self._match_count(
+            lists["user_genres"], self.movies_by_genre, set(lists["user_watched"])
+        )
+
+    def _actor_similarity_by_user(self, params: dict) -> List[dict]:
+        lists = self.users.get(params["user_id"])
+        if lists is None:
+            return []
+        return self._match_count(
+            lists["user_actors"], self.movies_by_actor, set(lists["user_watched"])
+        )
+
+    def _ranked_hits(self, scores: Dict[str, float], limit: int) -> List[dict]:
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{"title": title, "score": score} for title, score in ranked]
+
+    def _hybrid_recommendation(self, params: dict) -> List[dict]:
+        excluded = set(params["excluded_movies"])
+        limit = params["fetch_k"]
+        titles = list(self.catalog.embeddings)
+        matrix = np.asarray([self.catalog.embeddings[title] for title in titles], dtype=np.float32)
+        query = np.asarray(params["embedding"], dtype=np.float32)
+        similarities = matrix @ query / (
+            np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0) + 1e-9
+        )
+        nearest = [titles[i] for i in np.argsort(-similarities)[:limit]]
+        vector_hits = [
+            {"title": title, "score": float(similarities[titles.index(title)])}
+            for title in nearest
+            if title not in excluded
+        ]
+
+        movie_scores: Counter = Counter()
+        for seed in params["user_movies"]:
+            movie_scores.update(self._seed_scores(seed, excluded))
+        genre_scores: Counter = Counter()
+        for genre in set(params["user_genres"]):
+            genre_scores.update(t for t in self.movies_by_genre.get(genre, ()) if t not in excluded)
+        actor_scores: Counter = Counter()
+        for actor in set(params["user_actors"]):
+            actor_scores.update(t for t in self.movies_by_actor.get(actor, ()) if t not in excluded)
+
+        hits = {
+            "vectorHits": vector_hits,
+            "movieHits": self._ranked_hits(movie_scores, limit),
+            "genreHits": self._ranked_hits(genre_scores, limit),
+            "actorHits": self._ranked_hits(actor_scores, limit),
+        }
+        found = {hit["title"] for source in hits.values() for hit in source}
+        movies = [
+            {
+                "title": title,
+                "description": self.movies[title].description,
+                "genres": self.movies[title].genres,
+                "actors": self.movies[title].actors[:5],
+            }
+            for title in sorted(found)
+        ]
+        return [{**hits, "movies": movies}]
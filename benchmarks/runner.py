@@ -0,0 +1,360 @@
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import streamlit
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+from benchmarks.synthetic_graph import generate_catalog, generate_profiles, load_into_neo4j
+
+
+class BenchmarkSessionState(dict):
+    """Dict with attribute access, standing in for st.session_state outside a Streamlit run."""
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError as e:
+            raise AttributeError(name) from e
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        self[name] = value
+
+
+def install_stand_ins(graph: Any, llm: Any, embeddings: Any) -> None:
+    """Register the graph, LLM and embeddings used by every src module.
+
+    Must run before any module importing ``src.database.graph`` or
+    ``src.chat.llm`` is imported, since those modules connect on import.
+    """
+    graph_module = types.ModuleType("src.database.graph")
+    graph_module.graph = graph
+    llm_module = types.ModuleType("src.chat.llm")
+    llm_module.llm = llm
+    llm_module.embeddings = embeddings
+    sys.modules["src.database.graph"] = graph_module
+    sys.modules["src.chat.llm"] = llm_module
+
+
+def summarize(samples: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    """Return latency percentiles in milliseconds and the throughput of a run."""
+    latencies = np.asarray(samples) * 1000
+    if len(latencies) == 0:
+        return {"count": 0, "errors": errors}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "throughput_per_s": round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+    }
+
+
+def measure(
+    func: Callable[[int], Any], iterations: int, concurrency: int = 1, warmup: int = 2
+) -> Dict[str, Any]:
+    """Call ``func(i)`` for every iteration and summarize the latencies.
+
+    Args:
+        func (Callable[[int], Any]): Benchmarked call, receiving the iteration number
+        iterations (int): Number of measured calls
+        concurrency (int): Number of threads issuing calls
+        warmup (int): Number of unmeasured calls made first
+
+    Returns:
+        Dict[str, Any]: Summary of the run
+    """
+    for i in range(warmup):
+        func(-1 - i)
+
+    samples: List[float] = []
+    errors = 0
+
+    def timed(i: int) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            func(i)
+        except Exception as e:
+            errors += 1
+            print(f"Benchmark call {i} failed: {e}")
+            return
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(iterations):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(iterations)))
+    return summarize(samples, errors, time.perf_counter() - start)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(
+    scale: int = 2000,
+    iterations: int = 50,
+    concurrency: int = 1,
+    seed: int = 7,
+    query_latency: float = 0.002,
+    llm_latency: float = 0.0,
+    token_latency: float = 0.0,
+    embedding_dim: int = 256,
+    neo4j: Optional[Dict[str, str]] = None,
+    load: bool = False,
+    reset: bool = False,
+    scenarios: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Run the benchmark scenarios and return the results.
+
+    Args:
+        scale (int): Number of movies in the synthetic catalog
+        iterations (int): Measured calls per scenario
+        concurrency (int): Threads issuing calls
+        seed (int): Random seed of the synthetic catalog
+        query_latency (float): Simulated round trip of the in-memory graph in seconds
+        llm_latency (float): Simulated latency of every fake LLM call in seconds
+        token_latency (float): Simulated latency of every generated token in seconds
+        embedding_dim (int): Dimension of the fake embeddings
+        neo4j (Dict[str, str], optional): url, username and password of a local
+            Neo4j; the in-memory graph is used when omitted
+        load (bool): Load the synthetic catalog into Neo4j first
+        reset (bool): Delete every node of the Neo4j database before loading
+        scenarios (List[str], optional): Names of the scenarios to run, default all
+
+    Returns:
+        Dict[str, Any]: Run metadata and one summary per scenario
+    """
+    embeddings = FakeEmbeddings(dim=embedding_dim)
+    llm = FakeChatModel(latency=llm_latency, token_latency=token_latency)
+    catalog = generate_catalog(scale, embeddings=embeddings, seed=seed)
+
+    if neo4j:
+        from langchain_neo4j import Neo4jGraph
+
+        graph = Neo4jGraph(**neo4j)
+        if load:
+            load_into_neo4j(graph, catalog, reset=reset)
+            graph.refresh_schema()
+    else:
+        graph = InMemoryGraph(catalog, query_latency=query_latency)
+
+    from src.chat.embedding_cache import CachedEmbeddings
+
+    install_stand_ins(graph, llm, CachedEmbeddings(embeddings, cache_path=None))
+    streamlit.session_state = BenchmarkSessionState(
+        chat_history=[],
+        user_movies=[movie.title for movie in catalog.movies[:5]],
+        user_actors=catalog.actors[:3],
+        user_genres=catalog.genres[:2],
+        user_watched=[movie.title for movie in catalog.movies[5:50]],
+    )
+
+    import src.prompts.cypher_queries as cypher_queries
+    import src.tools.vector_recommender as vector_recommender
+    import src.chat.agent as agent_module
+    from src.database.catalog import CatalogService
+    from src.tools.cypher import recommend_movies_relationships
+    from src.tools.hybrid_recommender import recommend_movies_hybrid
+    import src.tools.user_preferences as user_preferences
+    from src.tools.user_preferences import recommend_movies_user_preferences
+    from src.database.preference_snapshot import PreferenceSnapshotStore
+    from src.monitoring.tracing import tracer
+
+    if not neo4j:
+        from src.tools.numpy_retriever import export_movie_vectors
+
+        index_dir = tempfile.mkdtemp(prefix="movie_vectors_")
+        export_movie_vectors(graph, index_dir)
+        vector_recommender.vector_recommender_pool = vector_recommender.VectorRecommenderPool(
+            size=max(1, concurrency),
+            recommender_kwargs={"retriever_backend": "numpy", "numpy_index_dir": index_dir},
+        )
+    vector_recommender.vector_recommender_pool.warm_up()
+
+    from src.database.collaborative_model import fit_model, get_collaborative_model
+
+    # Scoring only depends on the trained factors, so synthetic profiles serve both backends
+    model_dir = tempfile.mkdtemp(prefix="collaborative_model_")
+    fit_model(generate_profiles(catalog, seed=seed), model_dir, iterations=5)
+    collaborative_model = get_collaborative_model(model_dir)
+
+    # A snapshot of this catalog, not the one a previous run left on disk
+    user_preferences.preference_snapshot_store = PreferenceSnapshotStore(
+        graph, directory=tempfile.mkdtemp(prefix="preference_snapshot_")
+    ).warm_up()
+    preference_snapshot = user_preferences.preference_snapshot_store.get()
+    batched_recommender = user_preferences.MovieRecommenderUserPreferences(graph)
+    precomputed_recommender = user_preferences.MovieRecommenderUserPreferences(
+        graph, similarity_mode="precomputed"
+    )
+
+    agent_module.get_session_id = lambda: "benchmark"
+    if not neo4j:
+        from src.chat.history import ChatHistoryStore
+
+        # Summaries run off the response path and would skew llm_calls_per_call
+        agent_module.chat_history_store = ChatHistoryStore(None)
+
+    catalog_service = CatalogService(graph)
+    state = streamlit.session_state
+    actors = catalog.actors
+    titles = [movie.title for movie in catalog.movies]
+    first_token_ms: List[float] = []
+
+    def stream_response(i: int) -> str:
+        with tracer.span("benchmark_turn", kind="turn") as turn:
+            answer = "".join(
+                agent_module.MovieRecommenderApp.stream_response(
+                    user_input=f"movies like {titles[i % len(titles)]}",
+                    user_favorite_movies=state.user_movies,
+                    user_favorite_actors=state.user_actors,
+                    user_favorite_genres=state.user_genres,
+                    user_watched_movies=state.user_watched,
+                )
+            )
+        if i >= 0 and turn.attributes.get("time_to_first_token_ms") is not None:
+            first_token_ms.append(turn.attributes["time_to_first_token_ms"])
+        return answer
+
+    available: Dict[str, Callable[[int], Any]] = {
+        "sidebar_catalog_uncached": lambda i: (
+            cypher_queries.get_movie_titles(graph),
+            cypher_queries.get_genre_names(graph),
+            cypher_queries.get_actor_names(graph),
+        ),
+        "sidebar_catalog_cached": lambda i: catalog_service.get_snapshot(),
+        "recommend_similar_movies": lambda i: vector_recommender.recommend_similar_movies.invoke(
+            f"movies like {titles[i % len(titles)]}"
+        ),
+        "recommend_movies_relationships": lambda i: recommend_movies_relationships.invoke(
+            {"query": f'movies starring "{actors[i % len(actors)]}"'}
+        ),
+        "recommend_movies_user_preferences": lambda i: recommend_movies_user_preferences.invoke(
+            "recommend based on my preferences"
+        ),
+        "similar_movies_batched": lambda i: batched_recommender.get_similar_movies_scored(),
+        # Stored SIMILAR lists, seeds with too few left after the exclusions are scored live
+        "similar_movies_precomputed": lambda i: precomputed_recommender.get_similar_movies_scored(
+            precomputed=True
+        ),
+        # The three preference branches computed without Neo4j, as during a fallback
+        "preference_snapshot_local": lambda i: (
+            preference_snapshot.similar_movies(
+                state.user_movies, [*state.user_movies, *state.user_watched]
+            ),
+            preference_snapshot.genre_recommendations(state.user_genres, state.user_watched),
+            preference_snapshot.actor_recommendations(state.user_actors, state.user_watched),
+        ),
+        "collaborative_recommend": lambda i: collaborative_model.recommend(
+            state.user_movies, state.user_watched
+        ),
+        "recommend_movies_hybrid": lambda i: recommend_movies_hybrid.invoke(
+            f"movies like {titles[i % len(titles)]}"
+        ),
+        "generate_response": lambda i: agent_module.MovieRecommenderApp.generate_response(
+            user_input=f"movies like {titles[i % len(titles)]}",
+            user_favorite_movies=state.user_movies,
+            user_favorite_actors=state.user_actors,
+            user_favorite_genres=state.user_genres,
+            user_watched_movies=state.user_watched,
+        ),
+        "stream_response": stream_response,
+        # The same question every time, answered from the response cache after the warm-up
+        "generate_response_cached": lambda i: agent_module.MovieRecommenderApp.generate_response(
+            user_input=f"movies like {titles[0]}",
+            user_favorite_movies=state.user_movies,
+            user_favorite_actors=state.user_actors,
+            user_favorite_genres=state.user_genres,
+            user_watched_movies=state.user_watched,
+        ),
+    }
+
+    results: Dict[str, Any] = {}
+    for name, func in available.items():
+        if scenarios and name not in scenarios:
+            continue
+        print(f"Running {name}...")
+        # Every other scenario measures the agent, not the response cache
+        agent_module.response_cache.clear()
+        agent_module.response_cache.enabled = name == "generate_response_cached"
+        # A fresh session, as answers are only cached for turns without history
+        agent_module.get_session_id = lambda name=name: f"benchmark-{name}"
+        for i in range(2):
+            func(-1 - i)
+        queries_before = sum(getattr(graph, "query_counts", {}).values())
+        llm_calls_before = llm.calls
+        summary = measure(func, iterations, concurrency, warmup=0)
+        calls = max(1, summary["count"] + summary["errors"])
+        if hasattr(graph, "query_counts"):
+            summary["graph_queries_per_call"] = round(
+                (sum(graph.query_counts.values()) - queries_before) / calls, 2
+            )
+        summary["llm_calls_per_call"] = round((llm.calls - llm_calls_before) / calls, 2)
+        if name == "stream_response" and first_token_ms:
+            p50, p95 = np.percentile(first_token_ms, [50, 95])
+            summary["first_token_p50_ms"] = round(float(p50), 3)
+            summary["first_token_p95_ms"] = round(float(p95), 3)
+        results[name] = summary
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "backend": "neo4j" if neo4j else "in-memory",
+            "scale": scale,
+            "movies": len(catalog.movies),
+            "actors": len(catalog.actors),
+            "iterations": iterations,
+            "concurrency": concurrency,
+            "query_latency": query_latency if not neo4j else None,
+            "llm_latency": llm_latency,
+            "token_latency": token_latency,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1
+) -> List[str]:
+    """List the scenarios whose p50 or p95 latency regressed by more than ``threshold``."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base or not base.get("count") or not result.get("count"):
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if base[metric] and result[metric] > base[metric] * (1 + threshold):
+                regressions.append(
+                    f"{name} {metric}: {base[metric]:.3f} -> {result[metric]:.3f} "
+                    f"(+{(result[metric] / base[metric] - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+def save_results(results: Dict[str, Any], path: str) -> None:
+    """Write benchmark results as JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
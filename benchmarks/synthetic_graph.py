@@ -0,0 +1,222 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_neo4j import Neo4jGraph
+
+# Ratios of the Netflix dataset used by src/database/create_netflix_db.ipynb
+MOVIES_PER_ACTOR = 0.24
+MOVIES_PER_DIRECTOR = 0.55
+GENRES = 42
+MOVIE_TYPES = ("movie", "tv show")
+
+
+@dataclass
+class SyntheticMovie:
+    title: str
+    description: str
+    movie_type: str
+    genres: List[str]
+    actors: List[str]
+    directors: List[str]
+
+
+@dataclass
+class SyntheticCatalog:
+    """A generated catalog with the shape of the Netflix graph."""
+
+    movies: List[SyntheticMovie] = field(default_factory=list)
+    genres: List[str] = field(default_factory=list)
+    actors: List[str] = field(default_factory=list)
+    directors: List[str] = field(default_factory=list)
+    embeddings: Dict[str, List[float]] = field(default_factory=dict)
+
+
+class _ZipfSampler:
+    """Draws distinct indices where index i has probability ~ 1 / (i + 1) ** exponent."""
+
+    def __init__(self, population: int, exponent: float):
+        weights = 1.0 / np.arange(1, population + 1) ** exponent
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.population = population
+
+    def sample(self, rng: np.random.Generator, size: int) -> List[int]:
+        size = min(size, self.population)
+        chosen: Dict[int, None] = {}
+        while len(chosen) < size:
+            draws = np.searchsorted(self.cdf, rng.random(2 * size), side="right")
+            for index in np.minimum(draws, self.population - 1):
+                chosen.setdefault(int(index))
+        return list(chosen)[:size]
+
+
+def generate_catalog(
+    n_movies: int = 8800,
+    embeddings: Embeddings = None,
+    seed: int = 7,
+    mean_actors: float = 7.0,
+) -> SyntheticCatalog:
+    """Generate a catalog with long-tailed genre, actor and director degrees.
+
+    Genre and actor popularity follow Zipf distributions, so a few genres
+    (like "international movies" in the real data) hold a large share of the
+    catalog while most actors appear in one or two titles.
+
+    Args:
+        n_movies (int): Number of Movie nodes
+        embeddings (Embeddings, optional): Model used for description embeddings
+        seed (int): Random seed
+        mean_actors (float): Average cast size
+
+    Returns:
+        SyntheticCatalog: The generated catalog
+    """
+    rng = np.random.default_rng(seed)
+    n_actors = max(10, int(n_movies / MOVIES_PER_ACTOR))
+    n_directors = max(5, int(n_movies / MOVIES_PER_DIRECTOR))
+    catalog = SyntheticCatalog(
+        genres=[f"genre {i}" for i in range(GENRES)],
+        actors=[f"actor {i}" for i in range(n_actors)],
+        directors=[f"director {i}" for i in range(n_directors)],
+    )
+
+    genre_sampler = _ZipfSampler(GENRES, exponent=1.1)
+    actor_sampler = _ZipfSampler(n_actors, exponent=0.8)
+    director_sampler = _ZipfSampler(n_directors, exponent=0.6)
+    for i in range(n_movies):
+        genre_ids = genre_sampler.sample(rng, int(rng.integers(1, 4)))
+        actor_ids = actor_sampler.sample(rng, int(rng.poisson(mean_actors)))
+        director_ids = director_sampler.sample(rng, 1 + int(rng.random() < 0.1))
+        genres = [catalog.genres[g] for g in genre_ids]
+        catalog.movies.append(
+            SyntheticMovie(
+                title=f"Movie {i}",
+                description=f"A story about {' and '.join(genres)} number {i}.",
+                movie_type=MOVIE_TYPES[int(rng.random() < 0.3)],
+                genres=genres,
+                actors=[catalog.actors[a] for a in actor_ids],
+                directors=[catalog.directors[d] for d in director_ids],
+            )
+        )
+
+    if embeddings is not None:
+        descriptions = [movie.description for movie in catalog.movies]
+        for start in range(0, len(descriptions), 512):
+            batch = catalog.movies[start : start + 512]
+            vectors = embeddings.embed_documents(descriptions[start : start + 512])
+            for movie, vector in zip(batch, vectors):
+                catalog.embeddings[movie.title] = vector
+    return catalog
+
+
+def generate_profiles(
+    catalog: SyntheticCatalog,
+    n_users: int = 2000,
+    seed: int = 7,
+    liked: int = 5,
+    watched: int = 30,
+) -> Dict[str, Dict[str, float]]:
+    """Generate user profiles whose movies cluster around one or two favourite genres.
+
+    Args:
+        catalog (SyntheticCatalog): Catalog the movies are drawn from
+        n_users (int): Number of profiles
+        seed (int): Random seed
+        liked (int): Liked movies per profile
+        watched (int): Watched movies per profile, including the liked ones
+
+    Returns:
+        Dict[str, Dict[str, float]]: Weighted movies per user, liked movies
+            weighted 2.0 and the other watched movies 1.0
+    """
+    rng = np.random.default_rng(seed)
+    by_genre: Dict[str, List[str]] = {genre: [] for genre in catalog.genres}
+    for movie in catalog.movies:
+        for genre in movie.genres:
+            by_genre[genre].append(movie.title)
+    populated = [genre for genre, titles in by_genre.items() if titles]
+    profiles = {}
+    for user in range(n_users):
+        genres = rng.choice(populated, size=min(2, len(populated)), replace=False)
+        pool = sorted({title for genre in genres for title in by_genre[genre]})
+        picks = rng.choice(pool, size=min(watched, len(pool)), replace=False)
+        profiles[f"user {user}"] = {
+            str(title): 2.0 if position < liked else 1.0 for position, title in enumerate(picks)
+        }
+    return profiles
+
+
+LOAD_MOVIES_QUERY = """
+UNWIND $movies AS movie
+MERGE (m:Movie {title: movie.title})
+SET m.description = movie.description
+WITH m, movie
+CALL db.create.setNodeVectorProperty(m, 'descriptionEmbedding', movie.embedding)
+MERGE (mt:MovieType {movieType: movie.type})
+MERGE (m)-[:IS_TYPE]->(mt)
+FOREACH (name IN movie.directors |
+    MERGE (d:Director {directorName: name})
+    MERGE (m)-[:DIRECTED_BY]->(d))
+FOREACH (name IN movie.actors |
+    MERGE (a:Actor {actorName: name})
+    MERGE (a)-[:ACTED_IN]->(m))
+FOREACH (name IN movie.genres |
+    MERGE (g:Genre {genre: name})
+    MERGE (m)-[:IN_GENRE]->(g))
+"""
+
+
+def load_into_neo4j(
+    graph: Neo4jGraph, catalog: SyntheticCatalog, reset: bool = False, batch_size: int = 500
+) -> None:
+    """Write a synthetic catalog into Neo4j with the schema of the notebook.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        catalog (SyntheticCatalog): Catalog to load, with embeddings
+        reset (bool): Delete every node first
+        batch_size (int): Number of movies written per query
+    """
+    if reset:
+        graph.query("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS")
+    for statement in (
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (m:Movie) REQUIRE m.title IS UNIQUE",
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (n:MovieType) REQUIRE n.movieType IS UNIQUE",
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (d:Director) REQUIRE d.directorName IS UNIQUE",
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (a:Actor) REQUIRE a.actorName IS UNIQUE",
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (g:Genre) REQUIRE g.genre IS UNIQUE",
+    ):
+        graph.query(statement)
+
+    dim = len(next(iter(catalog.embeddings.values())))
+    for start in range(0, len(catalog.movies), batch_size):
+        graph.query(
+            LOAD_MOVIES_QUERY,
+            {
+                "movies": [
+                    {
+                        "title": movie.title,
+                        "description": movie.description,
+                        "type": movie.movie_type,
+                        "directors": movie.directors,
+                        "actors": movie.actors,
+                        "genres": movie.genres,
+                        "embedding": catalog.embeddings[movie.title],
+                    }
+                    for movie in catalog.movies[start : start + batch_size]
+                ]
+            },
+        )
+    graph.query(
+        f"""
+        CREATE VECTOR INDEX MovieVector IF NOT EXISTS
+        FOR (m:Movie)
+        ON m.descriptionEmbedding
+        OPTIONS {{indexConfig: {{
+            `vector.dimensions`: {int(dim)},
+            `vector.similarity_function`: 'cosine'
+        }}}}
+        """
+    )
+    graph.query("CALL db.awaitIndexes(300)")
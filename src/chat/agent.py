@@ -1,21 +1,29 @@
-from typing import List, Any
+from typing import List, Any, Iterator, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain.tools import Tool
-from langchain_neo4j import Neo4jChatMessageHistory
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain.prompts.chat import MessagesPlaceholder
 from langchain.prompts.chat import ChatPromptTemplate
 
-from src.chat.llm import llm
+from src.chat.history import BufferedChatMessageHistory, ChatHistoryStore
+from src.chat.llm import llm, embeddings
+from src.chat.response_cache import SemanticResponseCache
+from src.chat.router import IntentRouter, ToolUsageRecorder
+from src.chat.streaming import AGENT_STEP_TAG, AnswerStreamHandler, stream_in_background
+from src.monitoring.callbacks import TracingCallbackHandler
+from src.monitoring.tracing import tracer
 import streamlit as st
 from src.database.graph import graph
 from src.utils import get_session_id
 
 from src.tools.vector_recommender import recommend_similar_movies
-from src.tools.cypher import recommend_movies_relationships
+from src.tools.cypher import cypher_cache, recommend_movies_relationships
+from src.tools.hybrid_recommender import recommend_movies_hybrid
 from src.tools.user_preferences import recommend_movies_user_preferences
+from src.tools.collaborative_recommender import recommend_movies_collaborative
 from src.prompts.llm_prompts import AGENT_PROMPT
 
 
@@ -57,8 +65,60 @@ tools = [
         description="For when you need to find similar movies based on user preferences.",
         func=recommend_movies_user_preferences,
     ),
+    Tool.from_function(
+        name="Movie recommendation based on description and preferences",
+        description=(
+            "For when the user describes the movies they want and the suggestions should also "
+            "match their favourite movies, genres and actors. Use it instead of calling the "
+            "description and preference tools one after the other."
+        ),
+        func=recommend_movies_hybrid,
+    ),
+    Tool.from_function(
+        name="Movie recommendation based on similar viewers",
+        description=(
+            "For when the user asks what people with a similar taste liked or watched. "
+            "Uses the user's favourite and watched movies."
+        ),
+        func=recommend_movies_collaborative,
+    ),
 ]
 
+# Create the router that sends confident requests straight to a tool
+intent_router = IntentRouter(
+    entity_extractor=cypher_cache.extract_entities,
+    embeddings=(
+        embeddings
+        if str(st.secrets.get("ROUTER_USE_EMBEDDINGS", True)).lower() not in ("false", "0")
+        else None
+    ),
+    threshold=float(st.secrets.get("ROUTER_THRESHOLD", 0.8)),
+    min_margin=float(st.secrets.get("ROUTER_MIN_MARGIN", 0.2)),
+    log_path=st.secrets.get("ROUTER_LOG_PATH"),
+    enabled=str(st.secrets.get("ROUTER_ENABLED", True)).lower() not in ("false", "0"),
+)
+
+
+# Keep a bounded, summarised history per session and write it to Neo4j in the background
+chat_history_store = ChatHistoryStore(
+    graph,
+    llm=llm,
+    window_turns=int(st.secrets.get("HISTORY_WINDOW_TURNS", 4)),
+    token_budget=int(st.secrets.get("HISTORY_TOKEN_BUDGET", 1500)),
+    summary_tokens=int(st.secrets.get("HISTORY_SUMMARY_TOKENS", 300)),
+    flush_interval=float(st.secrets.get("HISTORY_FLUSH_INTERVAL", 1.0)),
+)
+
+# Reuse answers to near-identical questions asked with the same preferences
+response_cache = SemanticResponseCache(
+    embeddings=embeddings,
+    entity_extractor=cypher_cache.extract_entities,
+    threshold=float(st.secrets.get("RESPONSE_CACHE_THRESHOLD", 0.95)),
+    ttl_seconds=float(st.secrets.get("RESPONSE_CACHE_TTL", 1800)),
+    max_entries=int(st.secrets.get("RESPONSE_CACHE_MAX_ENTRIES", 512)),
+    enabled=str(st.secrets.get("RESPONSE_CACHE_ENABLED", True)).lower() not in ("false", "0"),
+)
+
 
 class MovieRecommenderAgent:
     """Class to manage the movie recommendation agent."""
@@ -81,8 +141,10 @@ class MovieRecommenderAgent:
         return PromptTemplate.from_template(AGENT_PROMPT)
 
     def _create_agent(self) -> Any:
-        """Create the LangChain agent."""
-        return create_react_agent(llm, self.tools, self.agent_prompt)
+        """Create the LangChain agent, tagged so its final answer can be streamed."""
+        return create_react_agent(llm, self.tools, self.agent_prompt).with_config(
+            tags=[AGENT_STEP_TAG]
+        )
 
     def _create_chat_agent(self) -> RunnableWithMessageHistory:
         """Create the chat agent with message history."""
@@ -93,37 +155,240 @@ class MovieRecommenderAgent:
             history_messages_key="chat_history",
         )
 
-    def _get_chat_history(self) -> Neo4jChatMessageHistory:
-        """Get the chat message history from Neo4j."""
-        return Neo4jChatMessageHistory(session_id=get_session_id(), graph=graph)
+    def _get_chat_history(self) -> BufferedChatMessageHistory:
+        """Get the chat message history of the current session."""
+        return chat_history_store.get_history(get_session_id())
 
-    def response(
-        self,
+    @staticmethod
+    def _build_payload(
         user_input: str,
         user_favorite_movies: List[str],
         user_favorite_actors: List[str],
         user_favorite_genres: List[str],
         user_watched_movies: List[str],
-    ) -> str:
-        """Generate a response based on user input and watched movies."""
-        payload = {
+    ) -> dict:
+        """Build the agent input from the user message and preferences."""
+        return {
             "input": user_input,
             "user_favorite_movies": user_favorite_movies,
             "user_favorite_actors": user_favorite_actors,
             "user_favorite_genres": user_favorite_genres,
             "user_watched_movies": user_watched_movies,
         }
-        response = self.chat_agent.invoke(
-            payload, {"configurable": {"session_id": get_session_id()}}
-        )
+
+    def _invoke(self, payload: dict, callbacks: List[Any] = []) -> str:
+        """Run the agent with message history and return its final answer."""
+        with tracer.span("agent", kind="agent"):
+            response = self.chat_agent.invoke(
+                payload,
+                {
+                    "configurable": {"session_id": get_session_id()},
+                    "callbacks": [TracingCallbackHandler(), *callbacks],
+                },
+            )
         return response["output"]
 
+    def response(
+        self,
+        user_input: str,
+        user_favorite_movies: List[str],
+        user_favorite_actors: List[str],
+        user_favorite_genres: List[str],
+        user_watched_movies: List[str],
+        callbacks: Optional[List[Any]] = None,
+    ) -> str:
+        """Generate a response based on user input and watched movies."""
+        payload = self._build_payload(
+            user_input,
+            user_favorite_movies,
+            user_favorite_actors,
+            user_favorite_genres,
+            user_watched_movies,
+        )
+        return self._invoke(payload, callbacks or [])
+
+    def stream_response(
+        self,
+        user_input: str,
+        user_favorite_movies: List[str],
+        user_favorite_actors: List[str],
+        user_favorite_genres: List[str],
+        user_watched_movies: List[str],
+        callbacks: Optional[List[Any]] = None,
+    ) -> Iterator[str]:
+        """Stream the tokens of the final answer while the agent is running.
+
+        The agent runs in a worker thread and its history is saved as with
+        ``response``. The time to first token is recorded on the active span.
+        """
+        payload = self._build_payload(
+            user_input,
+            user_favorite_movies,
+            user_favorite_actors,
+            user_favorite_genres,
+            user_watched_movies,
+        )
+        handler = AnswerStreamHandler()
+        return stream_in_background(
+            lambda: self._invoke(payload, [handler, *(callbacks or [])]),
+            handler,
+            on_first_token=self._first_token_recorder(),
+        )
+
+    @staticmethod
+    def _first_token_recorder() -> Any:
+        """Return a callback storing the time to first token on the active span."""
+        span = tracer.current_span()
+
+        def record_first_token(seconds: float) -> None:
+            if span is not None:
+                span.set_attribute("time_to_first_token_ms", round(seconds * 1000, 1))
+
+        return record_first_token
+
+    @staticmethod
+    def _answer_text(output: Any) -> str:
+        """Extract the answer from the output of a tool called without the agent."""
+        if isinstance(output, dict):
+            return str(output.get("answer") or output.get("result") or output)
+        return str(output)
+
+    def _save_turn(self, user_input: str, answer: str) -> None:
+        """Store a turn answered without the agent in the message history."""
+        try:
+            self._get_chat_history().add_messages(
+                [HumanMessage(content=user_input), AIMessage(content=answer)]
+            )
+        except Exception as e:
+            print(f"Error saving routed turn to chat history: {e}")
+
+    def cached_response(
+        self,
+        user_input: str,
+        user_favorite_movies: List[str],
+        user_favorite_actors: List[str],
+        user_favorite_genres: List[str],
+        user_watched_movies: List[str],
+    ) -> Optional[str]:
+        """Return a cached answer to the user input and save the turn, None on a miss."""
+        with tracer.span("response_cache", kind="cache") as span:
+            answer = response_cache.lookup(
+                user_input,
+                user_favorite_movies,
+                user_favorite_actors,
+                user_favorite_genres,
+                user_watched_movies,
+                scope=get_session_id(),
+            )
+            span.set_attribute("hit", answer is not None)
+        if answer is not None:
+            self._save_turn(user_input, answer)
+        return answer
+
+    def has_history(self) -> bool:
+        """Return whether the current session has earlier turns or a summary."""
+        try:
+            return bool(self._get_chat_history().messages)
+        except Exception as e:
+            print(f"Error reading chat history: {e}")
+            return True
+
+    def cache_response(
+        self,
+        user_input: str,
+        answer: str,
+        user_favorite_movies: List[str],
+        user_favorite_actors: List[str],
+        user_favorite_genres: List[str],
+        user_watched_movies: List[str],
+        had_history: bool,
+    ) -> None:
+        """Cache an answer for the current session, unless earlier turns shaped it."""
+        if had_history:
+            return
+        response_cache.store(
+            user_input,
+            answer,
+            user_favorite_movies,
+            user_favorite_actors,
+            user_favorite_genres,
+            user_watched_movies,
+            scope=get_session_id(),
+        )
+
+    def dispatch(self, route: str, user_input: str, callbacks: Optional[List[Any]] = None) -> str:
+        """Answer with a single tool, skipping the ReAct planning and answer calls.
+
+        Args:
+            route (str): Name of the tool to call
+            user_input (str): The user message, passed as the tool input
+            callbacks (List[Any], optional): Extra callback handlers
+
+        Returns:
+            str: The answer of the tool
+        """
+        tool = next(tool for tool in self.tools if tool.name == route)
+        with tracer.span("dispatch", kind="agent", route=route):
+            output = tool.invoke(
+                user_input, {"callbacks": [TracingCallbackHandler(), *(callbacks or [])]}
+            )
+        answer = self._answer_text(output)
+        self._save_turn(user_input, answer)
+        return answer
+
+    def stream_dispatch(self, route: str, user_input: str) -> Iterator[str]:
+        """Stream the answer of a single tool, like ``dispatch``."""
+        handler = AnswerStreamHandler(stream_tool_answers=True)
+        return stream_in_background(
+            lambda: self.dispatch(route, user_input, [handler]),
+            handler,
+            on_first_token=self._first_token_recorder(),
+        )
+
 
 class MovieRecommenderApp:
     """Class to manage the movie recommendation application."""
 
     agent = MovieRecommenderAgent(available_tools=tools)
 
+    @staticmethod
+    def _validate_inputs(
+        user_input: str,
+        user_favorite_movies: List[str],
+        user_favorite_actors: List[str],
+        user_favorite_genres: List[str],
+        user_watched_movies: List[str],
+    ) -> None:
+        """
+        Validate the user input and preference lists.
+
+        Raises:
+            ValueError: If the input arguments are of incorrect type.
+        """
+        # Input validation
+        if not isinstance(user_input, str):
+            raise ValueError("user_input must be a string")
+
+        if not isinstance(user_favorite_movies, list) or not all(
+            isinstance(movie, str) for movie in user_favorite_movies
+        ):
+            raise ValueError("user_favorite_movies must be a list of strings")
+
+        if not isinstance(user_favorite_actors, list) or not all(
+            isinstance(actor, str) for actor in user_favorite_actors
+        ):
+            raise ValueError("user_favorite_actors must be a list of strings")
+
+        if not isinstance(user_favorite_genres, list) or not all(
+            isinstance(genre, str) for genre in user_favorite_genres
+        ):
+            raise ValueError("user_favorite_genres must be a list of strings")
+
+        if not isinstance(user_watched_movies, list) or not all(
+            isinstance(movie, str) for movie in user_watched_movies
+        ):
+            raise ValueError("user_watched_movies must be a list of strings")
+
     @staticmethod
     def generate_response(
         user_input: str,
@@ -136,6 +401,10 @@ class MovieRecommenderApp:
         """
         Generate a response based on user input and the list of movies the user has watched.
 
+        Answers to near-identical questions asked with the same preferences
+        come from the response cache. Requests the intent router is confident
+        about are answered by a single tool; all others go through the ReAct agent.
+
         Args:
             user_input (str): The input provided by the user for which a response is to be generated.
             user_watched_movies (List[str]): A list of movie titles that the user has already watched.
@@ -147,40 +416,144 @@ class MovieRecommenderApp:
             ValueError: If the input arguments are of incorrect type.
         """
         try:
-            # Input validation
-            if not isinstance(user_input, str):
-                raise ValueError("user_input must be a string")
-
-            if not isinstance(user_favorite_movies, list) or not all(
-                isinstance(movie, str) for movie in user_favorite_movies
-            ):
-                raise ValueError("user_favorite_movies must be a list of strings")
-
-            if not isinstance(user_favorite_actors, list) or not all(
-                isinstance(actor, str) for actor in user_favorite_actors
-            ):
-                raise ValueError("user_favorite_actors must be a list of strings")
-
-            if not isinstance(user_favorite_genres, list) or not all(
-                isinstance(genre, str) for genre in user_favorite_genres
-            ):
-                raise ValueError("user_favorite_genres must be a list of strings")
+            MovieRecommenderApp._validate_inputs(
+                user_input,
+                user_favorite_movies,
+                user_favorite_actors,
+                user_favorite_genres,
+                user_watched_movies,
+            )
+            preferences = (
+                user_favorite_movies,
+                user_favorite_actors,
+                user_favorite_genres,
+                user_watched_movies,
+            )
+            cached = agent.cached_response(user_input, *preferences)
+            if cached is not None:
+                return cached
+            had_history = agent.has_history()
 
-            if not isinstance(user_watched_movies, list) or not all(
-                isinstance(movie, str) for movie in user_watched_movies
-            ):
-                raise ValueError("user_watched_movies must be a list of strings")
+            decision = intent_router.route(
+                user_input,
+                has_preferences=bool(
+                    user_favorite_movies or user_favorite_actors or user_favorite_genres
+                ),
+                has_watched_movies=bool(user_watched_movies),
+            )
+            outcome = {}
+            if decision.dispatch:
+                try:
+                    answer = agent.dispatch(decision.route, user_input)
+                    intent_router.log(user_input, decision)
+                    agent.cache_response(user_input, answer, *preferences, had_history=had_history)
+                    return answer
+                except Exception as e:
+                    print(f"Error in routed tool {decision.route}, falling back to the agent: {e}")
+                    outcome["error"] = str(e)
 
-            return agent.response(
+            recorder = ToolUsageRecorder(tool.name for tool in agent.tools)
+            answer = agent.response(
                 user_input,
                 user_favorite_movies,
                 user_favorite_actors,
                 user_favorite_genres,
                 user_watched_movies,
+                callbacks=[recorder],
             )
+            intent_router.log(user_input, decision, agent_tools=recorder.tools, **outcome)
+            agent.cache_response(user_input, answer, *preferences, had_history=had_history)
+            return answer
 
         except Exception as e:
             # Log the error
             print(f"An error occurred: {str(e)}")
             # You can also log this to a file or another logging mechanism
             raise
+
+    @staticmethod
+    def stream_response(
+        user_input: str,
+        user_favorite_movies: List[str],
+        user_favorite_actors: List[str],
+        user_favorite_genres: List[str],
+        user_watched_movies: List[str],
+        agent: MovieRecommenderAgent = agent,
+    ) -> Iterator[str]:
+        """
+        Stream the response to the user input token by token, routed like ``generate_response``.
+
+        Args:
+            user_input (str): The input provided by the user for which a response is to be generated.
+            user_watched_movies (List[str]): A list of movie titles that the user has already watched.
+
+        Returns:
+            Iterator[str]: The tokens of the generated response.
+
+        Raises:
+            ValueError: If the input arguments are of incorrect type.
+        """
+        MovieRecommenderApp._validate_inputs(
+            user_input,
+            user_favorite_movies,
+            user_favorite_actors,
+            user_favorite_genres,
+            user_watched_movies,
+        )
+        preferences = (
+            user_favorite_movies,
+            user_favorite_actors,
+            user_favorite_genres,
+            user_watched_movies,
+        )
+        cached = agent.cached_response(user_input, *preferences)
+        if cached is not None:
+            return iter([cached])
+        had_history = agent.has_history()
+
+        decision = intent_router.route(
+            user_input,
+            has_preferences=bool(user_favorite_movies or user_favorite_actors or user_favorite_genres),
+            has_watched_movies=bool(user_watched_movies),
+        )
+
+        def tokens() -> Iterator[str]:
+            answer = []
+            outcome = {}
+            if decision.dispatch:
+                streamed = False
+                try:
+                    for token in agent.stream_dispatch(decision.route, user_input):
+                        streamed = True
+                        answer.append(token)
+                        yield token
+                    intent_router.log(user_input, decision)
+                    agent.cache_response(
+                        user_input, "".join(answer), *preferences, had_history=had_history
+                    )
+                    return
+                except Exception as e:
+                    # Only fall back to the agent when nothing was shown yet
+                    if streamed:
+                        intent_router.log(user_input, decision, error=str(e))
+                        raise
+                    print(f"Error in routed tool {decision.route}, falling back to the agent: {e}")
+                    outcome["error"] = str(e)
+
+            recorder = ToolUsageRecorder(tool.name for tool in agent.tools)
+            for token in agent.stream_response(
+                user_input,
+                user_favorite_movies,
+                user_favorite_actors,
+                user_favorite_genres,
+                user_watched_movies,
+                callbacks=[recorder],
+            ):
+                answer.append(token)
+                yield token
+            intent_router.log(user_input, decision, agent_tools=recorder.tools, **outcome)
+            agent.cache_response(
+                user_input, "".join(answer), *preferences, had_history=had_history
+            )
+
+        return tokens()
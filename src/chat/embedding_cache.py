@@ -0,0 +1,215 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.monitoring.tracing import tracer
+
+# Keys per disk lookup, below SQLite's limit of bound variables per statement
+LOOKUP_CHUNK_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before it is used as a cache key.
+
+    Applies unicode NFKC normalization, case folding and whitespace collapsing,
+    so "Movies like  Inception" and "movies like inception" share an entry.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an in-memory LRU tier and a SQLite tier on disk.
+
+    Entries are keyed on the model name plus the normalized text. Vectors are
+    stored as float32 blobs, so the disk cache survives restarts and can be
+    shared between worker processes on the same machine.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: Optional[str] = None,
+        cache_path: Optional[str] = ".cache/embeddings.sqlite3",
+        memory_max_entries: int = 2048,
+        disk_max_entries: int = 100_000,
+    ):
+        """Initialize the cache.
+
+        Args:
+            underlying (Embeddings): Embedding model used on a cache miss
+            model_name (str, optional): Model name used in the cache key.
+                Defaults to the ``model`` attribute of the underlying embeddings.
+            cache_path (str, optional): Path of the SQLite file, None disables the disk tier
+            memory_max_entries (int): Maximum number of vectors kept in memory
+            disk_max_entries (int): Maximum number of vectors kept on disk
+        """
+        self.underlying = underlying
+        self.model_name = model_name or getattr(underlying, "model", type(underlying).__name__)
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if cache_path:
+            self._connection = self._open_disk_cache(cache_path)
+
+    @staticmethod
+    def _open_disk_cache(cache_path: str) -> Optional[sqlite3.Connection]:
+        """Open (and create if needed) the SQLite cache file."""
+        try:
+            directory = os.path.dirname(cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(cache_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+            )
+            connection.commit()
+            return connection
+        except sqlite3.Error as e:
+            print(f"Error opening embedding cache, continuing without disk tier: {e}")
+            return None
+
+    def _key(self, text: str) -> str:
+        """Build the cache key for the given text."""
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        """Store a vector in the memory tier, evicting the least recently used ones."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _lookup(self, keys: List[str]) -> dict:
+        """Look keys up in the memory tier, then in the disk tier."""
+        found = {}
+        missing = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+                self.stats["memory_hits"] += 1
+            else:
+                missing.append(key)
+
+        if missing and self._connection is not None:
+            rows = []
+            for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+                chunk = missing[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(
+                    self._connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+            for key, blob in rows:
+                vector = array("f", blob).tolist()
+                found[key] = vector
+                self._remember(key, vector)
+                self.stats["disk_hits"] += 1
+            if rows:
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows],
+                )
+                self._connection.commit()
+        return found
+
+    def _store(self, entries: dict) -> None:
+        """Write new vectors to both tiers and enforce the disk size limit."""
+        for key, vector in entries.items():
+            self._remember(key, vector)
+        if self._connection is None:
+            return
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+            [(key, array("f", vector).tobytes(), now) for key, vector in entries.items()],
+        )
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.disk_max_entries
+        if overflow > 0:
+            self._connection.execute(
+                """
+                DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_access LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+            self.stats["evictions"] += overflow
+        self._connection.commit()
+
+    def _embed(self, texts: List[str], embed_missing) -> List[List[float]]:
+        """Return cached vectors and embed only the texts that are not cached."""
+        keys = [self._key(text) for text in texts]
+        missing = {}
+        with self._lock:
+            found = self._lookup(list(dict.fromkeys(keys)))
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            with tracer.span(
+                "embeddings", kind="embedding", model=self.model_name, texts=len(missing)
+            ):
+                vectors = embed_missing(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            with self._lock:
+                self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, serving repeated texts from the cache."""
+        return self._embed(texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, serving repeated texts from the cache."""
+        return self._embed(
+            [text], lambda texts: [self.underlying.embed_query(texts[0])]
+        )[0]
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters, the hit rate and the size of both tiers."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4)
+            if lookups
+            else 0.0
+        )
+        stats["memory_entries"] = len(self._memory)
+        if self._connection is not None:
+            with self._lock:
+                (stats["disk_entries"],) = self._connection.execute(
+                    "SELECT COUNT(*) FROM embeddings"
+                ).fetchone()
+        return stats
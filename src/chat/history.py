@@ -0,0 +1,473 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, messages_from_dict
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_neo4j import Neo4jGraph
+
+from src.monitoring.tracing import tracer
+from src.prompts.llm_prompts import HISTORY_SUMMARY_PROMPT
+
+# Same layout as langchain_neo4j.Neo4jChatMessageHistory: a Session node pointing
+# at its newest Message through LAST_MESSAGE, messages chained with NEXT.
+# Loading only reads; the session node is created by the first write.
+LOAD_HISTORY_QUERY = """
+MATCH (s:Session {{id: $session_id}})
+OPTIONAL MATCH (s)-[:LAST_MESSAGE]->(last_message)
+OPTIONAL MATCH p = (last_message)<-[:NEXT*0..{window}]-()
+WITH s, p
+ORDER BY length(p) DESC
+LIMIT 1
+WITH s, CASE WHEN p IS NULL THEN [] ELSE nodes(p) END AS newest_first
+RETURN s.summary AS summary,
+       [node IN reverse(newest_first) | {{role: node.role, content: node.content}}] AS messages
+"""
+
+APPEND_MESSAGES_QUERY = """
+MERGE (s:Session {id: $session_id})
+WITH s
+OPTIONAL MATCH (s)-[lm:LAST_MESSAGE]->(last_message)
+DELETE lm
+WITH s, last_message
+UNWIND range(0, size($messages) - 1) AS i
+CREATE (m:Message {role: $messages[i].role, content: $messages[i].content})
+WITH s, last_message, i, m
+ORDER BY i
+WITH s, last_message, collect(m) AS created
+FOREACH (i IN range(0, size(created) - 2) |
+    FOREACH (a IN [created[i]] |
+        FOREACH (b IN [created[i + 1]] | CREATE (a)-[:NEXT]->(b))))
+FOREACH (first IN CASE WHEN last_message IS NULL THEN [] ELSE [created[0]] END |
+    CREATE (last_message)-[:NEXT]->(first))
+WITH s, created[size(created) - 1] AS newest
+CREATE (s)-[:LAST_MESSAGE]->(newest)
+"""
+
+SAVE_SUMMARY_QUERY = """
+MERGE (s:Session {id: $session_id})
+SET s.summary = $summary
+"""
+
+CLEAR_HISTORY_QUERY = """
+MATCH (s:Session {id: $session_id})
+OPTIONAL MATCH (s)-[:LAST_MESSAGE]->(last_message)
+OPTIONAL MATCH (last_message)<-[:NEXT*0..]-(message)
+DETACH DELETE message
+REMOVE s.summary
+"""
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate of about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a human message."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+@dataclass
+class SessionState:
+    """Working set of one chat session."""
+
+    summary: str = ""
+    # Turns moved out of the window that the summary does not cover yet
+    to_summarize: List[BaseMessage] = field(default_factory=list)
+    recent: List[BaseMessage] = field(default_factory=list)
+    # Messages not written to Neo4j yet
+    unsaved: List[BaseMessage] = field(default_factory=list)
+    summary_dirty: bool = False
+    last_access: float = field(default_factory=time.monotonic)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.unsaved or self.to_summarize or self.summary_dirty)
+
+
+class ChatHistoryStore:
+    """Bounded, summarised chat histories cached in memory per session.
+
+    Only the last ``window_turns`` turns are kept in full, and fewer when
+    they exceed ``token_budget``. Older turns are folded into a rolling summary
+    of at most ``summary_tokens`` tokens. The prompt therefore stays the same
+    size however long a session runs.
+
+    The working set of a session is loaded from Neo4j once and then served
+    from memory. New messages and summary updates are queued and written by a
+    background thread in batches, one query per session, so neither Neo4j
+    nor the summarising LLM call sits on the response path.
+
+    While Neo4j is unreachable the writer backs off exponentially. At most
+    ``max_sessions`` sessions and ``max_unsaved_messages`` queued messages per
+    session are kept; beyond that the oldest unsaved data is dropped.
+    """
+
+    def __init__(
+        self,
+        graph_instance: Optional[Neo4jGraph],
+        llm: Optional[BaseLanguageModel] = None,
+        window_turns: int = 4,
+        token_budget: int = 1500,
+        summary_tokens: int = 300,
+        flush_interval: float = 1.0,
+        max_sessions: int = 256,
+        max_unsaved_messages: int = 200,
+        max_backoff: float = 60.0,
+    ):
+        """Initialize the store.
+
+        Args:
+            graph_instance (Neo4jGraph, optional): Graph the histories are persisted
+                to, None keeps them in memory only
+            llm (BaseLanguageModel, optional): Model writing the summaries; without
+                one, turns leaving the window are dropped
+            window_turns (int): Maximum number of turns kept in full
+            token_budget (int): Maximum estimated tokens of summary plus recent turns
+            summary_tokens (int): Maximum estimated tokens of the summary
+            flush_interval (float): Seconds the writer waits to batch updates
+            max_sessions (int): Number of sessions kept in memory, including
+                sessions with unsaved changes
+            max_unsaved_messages (int): Messages queued per session before the
+                oldest are dropped
+            max_backoff (float): Maximum seconds between retries after failed writes
+        """
+        self.graph = graph_instance
+        self.window_turns = max(1, window_turns)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self.max_unsaved_messages = max_unsaved_messages
+        self.max_backoff = max_backoff
+        self.summary_chain = (
+            PromptTemplate.from_template(HISTORY_SUMMARY_PROMPT) | llm | StrOutputParser()
+            if llm is not None
+            else None
+        )
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Held while a batch is written, so a flush never overlaps the writer thread
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        # Consecutive failed writes and when the writer may retry
+        self._failures = 0
+        self._retry_at = 0.0
+        self.stats = {
+            "loads": 0,
+            "hits": 0,
+            "batches": 0,
+            "messages_written": 0,
+            "summaries": 0,
+            "errors": 0,
+            "dropped_sessions": 0,
+            "dropped_messages": 0,
+        }
+        atexit.register(self.flush, 5.0)
+
+    def get_history(self, session_id: str) -> "BufferedChatMessageHistory":
+        """Return the chat history of a session."""
+        return BufferedChatMessageHistory(self, session_id)
+
+    def _state(self, session_id: str) -> SessionState:
+        """Return the cached working set of a session, loading it on first use."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self.stats["hits"] += 1
+                self._sessions.move_to_end(session_id)
+                state.last_access = time.monotonic()
+                return state
+
+        state = self._load(session_id)
+        with self._lock:
+            # Another thread may have loaded the session meanwhile
+            state = self._sessions.setdefault(session_id, state)
+            self._sessions.move_to_end(session_id)
+            self._evict()
+            return state
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        """Increment a counter of ``stats``."""
+        with self._lock:
+            self.stats[key] += amount
+
+    def _load(self, session_id: str) -> SessionState:
+        """Load the summary and the newest turns of a session from Neo4j."""
+        state = SessionState()
+        if self.graph is None:
+            return state
+        self._count("loads")
+        with tracer.span("chat_history.load", kind="history") as span:
+            try:
+                rows = self.graph.query(
+                    LOAD_HISTORY_QUERY.format(window=self.window_turns * 2 - 1),
+                    {"session_id": session_id},
+                )
+            except Exception as e:
+                self._count("errors")
+                print(f"Error loading chat history: {e}")
+                return state
+            if rows:
+                state.summary = rows[0]["summary"] or ""
+                state.recent = messages_from_dict(
+                    [
+                        {"type": message["role"], "data": {"content": message["content"]}}
+                        for message in rows[0]["messages"]
+                    ]
+                )
+            # A stored window may start with an answer whose question was cut off
+            while state.recent and not isinstance(state.recent[0], HumanMessage):
+                state.recent.pop(0)
+            span.set_attribute("rows", len(state.recent))
+        return state
+
+    def _evict(self) -> None:
+        """Drop the least recently used sessions, keeping unsaved ones while possible."""
+        # The newest session is the one being returned and is never evicted
+        for session_id in list(self._sessions)[:-1]:
+            if len(self._sessions) <= self.max_sessions:
+                return
+            if not self._sessions[session_id].dirty:
+                del self._sessions[session_id]
+        # Only sessions with unsaved changes are left, as when Neo4j is down
+        for session_id in list(self._sessions)[:-1]:
+            if len(self._sessions) <= self.max_sessions:
+                return
+            state = self._sessions.pop(session_id)
+            self.stats["dropped_sessions"] += 1
+            self.stats["dropped_messages"] += len(state.unsaved)
+            print(f"Dropping unsaved chat history of {len(state.unsaved)} message(s)")
+
+    def messages(self, session_id: str) -> List[BaseMessage]:
+        """Return the summary, as a system message, followed by the recent turns."""
+        state = self._state(session_id)
+        with self._lock:
+            messages: List[BaseMessage] = []
+            if state.summary:
+                messages.append(SystemMessage(content=SUMMARY_PREFIX + state.summary))
+            # Until the writer has summarised them, overflowing turns are kept verbatim
+            messages.extend(state.to_summarize)
+            messages.extend(state.recent)
+            return messages
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        """Append messages to a session and queue them for writing."""
+        state = self._state(session_id)
+        with self._lock:
+            state.recent.extend(messages)
+            state.unsaved.extend(messages)
+            self._trim(state)
+        self._schedule()
+
+    def _trim(self, state: SessionState) -> None:
+        """Move the oldest turns out of the window until it fits the limits."""
+        turns = split_turns(state.recent)
+        summary_cost = estimate_tokens(state.summary) if state.summary else 0
+        while len(turns) > 1 and (
+            len(turns) > self.window_turns
+            or summary_cost
+            + sum(estimate_tokens(str(message.content)) for turn in turns for message in turn)
+            > self.token_budget
+        ):
+            oldest = turns.pop(0)
+            if self.summary_chain is not None:
+                state.to_summarize.extend(oldest)
+        state.recent = [message for turn in turns for message in turn]
+
+    def clear(self, session_id: str) -> None:
+        """Delete the history of a session from memory and from Neo4j."""
+        with self._lock:
+            self._sessions[session_id] = SessionState()
+        if self.graph is not None:
+            try:
+                self.graph.query(CLEAR_HISTORY_QUERY, {"session_id": session_id})
+            except Exception as e:
+                print(f"Error clearing chat history: {e}")
+
+    def _schedule(self) -> None:
+        """Wake the writer thread, starting it on first use."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="chat-history-writer", daemon=True
+                )
+                self._worker.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        """Writer loop: wait for updates, let them accumulate briefly, write them."""
+        while True:
+            self._wake.wait()
+            time.sleep(max(self.flush_interval, self._retry_at - time.monotonic()))
+            self._wake.clear()
+            self._write_pending()
+
+    def _write_pending(self, timeout: Optional[float] = None) -> None:
+        """Summarise and persist every session with pending changes."""
+        if not self._write_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return
+        try:
+            with self._lock:
+                pending = [
+                    (session_id, state)
+                    for session_id, state in self._sessions.items()
+                    if state.dirty
+                ]
+            if pending:
+                self._count("batches")
+            failed = False
+            for session_id, state in pending:
+                self._summarize(state)
+                failed = not self._persist(session_id, state) or failed
+            if failed:
+                self._failures += 1
+                self._retry_at = time.monotonic() + min(
+                    self.max_backoff, self.flush_interval * 2**self._failures
+                )
+                self._wake.set()
+            elif pending:
+                self._failures = 0
+                self._retry_at = 0.0
+        finally:
+            self._write_lock.release()
+
+    def _summarize(self, state: SessionState) -> None:
+        """Fold the turns that left the window into the rolling summary."""
+        with self._lock:
+            overflow = list(state.to_summarize)
+            summary = state.summary
+        if not overflow or self.summary_chain is None:
+            return
+        transcript = "\n".join(f"{message.type}: {message.content}" for message in overflow)
+        with tracer.span("chat_history.summarize", kind="history", messages=len(overflow)):
+            try:
+                updated = self.summary_chain.invoke(
+                    {
+                        "summary": summary or "(empty)",
+                        "messages": transcript,
+                        "max_words": int(self.summary_tokens * 0.75),
+                    }
+                ).strip()
+            except Exception as e:
+                self._count("errors")
+                print(f"Error summarizing chat history: {e}")
+                return
+        # Hard limit in case the model ignores the requested length
+        updated = updated[: self.summary_tokens * 4]
+        with self._lock:
+            state.summary = updated
+            del state.to_summarize[: len(overflow)]
+            state.summary_dirty = True
+            self.stats["summaries"] += 1
+
+    def _persist(self, session_id: str, state: SessionState) -> bool:
+        """Write the unsaved messages and the summary of a session to Neo4j.
+
+        The messages and the summary are written separately, and only the
+        part that failed is queued again, so a retry never appends the same
+        messages twice.
+
+        Returns:
+            bool: False if any write failed
+        """
+        with self._lock:
+            unsaved = list(state.unsaved)
+            summary = state.summary if state.summary_dirty else None
+            state.unsaved.clear()
+            state.summary_dirty = False
+        if self.graph is None or (not unsaved and summary is None):
+            return True
+        saved = True
+        with tracer.span("chat_history.save", kind="history", rows=len(unsaved)):
+            if unsaved:
+                try:
+                    self.graph.query(
+                        APPEND_MESSAGES_QUERY,
+                        {
+                            "session_id": session_id,
+                            "messages": [
+                                {"role": message.type, "content": str(message.content)}
+                                for message in unsaved
+                            ],
+                        },
+                    )
+                    self._count("messages_written", len(unsaved))
+                except Exception as e:
+                    saved = False
+                    self._count("errors")
+                    print(f"Error saving chat messages: {e}")
+                    # Put the messages back, ahead of newer ones, so the next flush retries them
+                    with self._lock:
+                        state.unsaved[:0] = unsaved
+                        overflow = len(state.unsaved) - self.max_unsaved_messages
+                        if overflow > 0:
+                            del state.unsaved[:overflow]
+                            self.stats["dropped_messages"] += overflow
+            if summary is not None:
+                try:
+                    self.graph.query(
+                        SAVE_SUMMARY_QUERY, {"session_id": session_id, "summary": summary}
+                    )
+                except Exception as e:
+                    saved = False
+                    self._count("errors")
+                    print(f"Error saving chat summary: {e}")
+                    with self._lock:
+                        state.summary_dirty = True
+        return saved
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Write all pending changes now, waiting for a running batch first.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a running batch
+        """
+        self._write_pending(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the counters and the number of cached sessions."""
+        with self._lock:
+            return {**self.stats, "sessions": len(self._sessions)}
+
+
+class BufferedChatMessageHistory(BaseChatMessageHistory):
+    """Chat history of one session, backed by a ``ChatHistoryStore``."""
+
+    def __init__(self, store: ChatHistoryStore, session_id: str):
+        """Initialize the history.
+
+        Args:
+            store (ChatHistoryStore): Store holding the working set of the session
+            session_id (str): Session identifier
+        """
+        if not session_id:
+            raise ValueError("Please ensure that the session_id parameter is provided")
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.store.messages(self.session_id)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.add_messages(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
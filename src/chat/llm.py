@@ -1,12 +1,21 @@
 import streamlit as st
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from src.chat.embedding_cache import CachedEmbeddings
 
-# Create the LLM
+# Create the LLM, streaming tokens to callbacks and reporting token usage.
+# Every chain shares it; invoke() still returns the complete message.
 llm = ChatOpenAI(
     openai_api_key=st.secrets["OPENAI_API_KEY"],
     model=st.secrets["OPENAI_MODEL"],
     temperature=0.5,
+    streaming=True,
+    stream_usage=True,
 )
 
-# Create the Embedding model
-embeddings = OpenAIEmbeddings(openai_api_key=st.secrets["OPENAI_API_KEY"])
+# Create the Embedding model, cached in memory and on disk
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(openai_api_key=st.secrets["OPENAI_API_KEY"]),
+    cache_path=st.secrets.get("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3"),
+    memory_max_entries=int(st.secrets.get("EMBEDDING_CACHE_MEMORY_ENTRIES", 2048)),
+    disk_max_entries=int(st.secrets.get("EMBEDDING_CACHE_DISK_ENTRIES", 100_000)),
+)
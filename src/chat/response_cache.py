@@ -0,0 +1,288 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.chat.embedding_cache import normalize_text
+
+
+@dataclass
+class CachedResponse:
+    """An answer of the agent and what it was computed from."""
+
+    question: str
+    # Unit-length embedding of the question
+    vector: np.ndarray
+    answer: str
+    watched: FrozenSet[str]
+    # Catalog names mentioned in the question
+    entities: FrozenSet[str]
+    created_at: float
+    hits: int = 0
+    # Case-folded answer, searched for newly watched titles
+    folded_answer: str = field(default="", repr=False)
+
+
+def preference_key(
+    user_favorite_movies: Sequence[str],
+    user_favorite_actors: Sequence[str],
+    user_favorite_genres: Sequence[str],
+) -> str:
+    """Return a hash of the preference lists that does not depend on their order."""
+    digest = hashlib.sha256()
+    for values in (user_favorite_movies, user_favorite_actors, user_favorite_genres):
+        for value in sorted({normalize_text(value) for value in values}):
+            digest.update(value.encode("utf-8"))
+            digest.update(b"\x00")
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def _mentions(folded_answer: str, titles: Iterable[str]) -> bool:
+    """Return whether any of the titles appears as whole words in the answer."""
+    for title in titles:
+        folded = title.casefold()
+        if folded in folded_answer and re.search(
+            r"(?<!\w)" + re.escape(folded) + r"(?!\w)", folded_answer
+        ):
+            return True
+    return False
+
+
+class SemanticResponseCache:
+    """LRU cache of agent answers, matched on the meaning of the question.
+
+    Answers are grouped by a scope, such as the chat session, and a hash of
+    the favourite movies, actors and genres, so they are only reused in the
+    same scope and for the same preferences. Within a group a
+    question is answered from the cache when it is identical after
+    normalization, or when the cosine similarity of its embedding to a cached
+    question passes ``threshold`` and both mention the same movies, actors
+    and genres, so "movies like Alien" is not answered with the cached
+    answer to "movies like Aliens". The watched movies are kept per entry: an
+    answer that mentions a movie watched since it was cached is not reused.
+    Entries expire after ``ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings],
+        entity_extractor: Optional[Callable[[str], Tuple[str, List[Tuple[str, str]]]]] = None,
+        threshold: float = 0.95,
+        ttl_seconds: float = 1800.0,
+        max_entries: int = 512,
+        enabled: bool = True,
+    ):
+        """Initialize the cache.
+
+        Args:
+            embeddings (Embeddings, optional): Model embedding the questions,
+                None only reuses answers to identical questions
+            entity_extractor (Callable, optional): Returns the question template
+                and the (slot, value) pairs of the names it mentions
+            threshold (float): Minimum cosine similarity of a semantic hit
+            ttl_seconds (float): Seconds an answer is reused for
+            max_entries (int): Maximum number of cached answers
+            enabled (bool): Whether answers are cached at all
+        """
+        self.embeddings = embeddings
+        self.entity_extractor = entity_extractor
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        # Normalized questions per preference hash
+        self._groups: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expired": 0,
+            "evictions": 0,
+            "watched_rejections": 0,
+        }
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        """Return the unit-length embedding of a question, None if it cannot be computed."""
+        if self.embeddings is None:
+            return None
+        try:
+            vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        except Exception as e:
+            print(f"Error embedding question for the response cache: {e}")
+            return None
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def _entities(self, question: str) -> FrozenSet[str]:
+        """Return the normalized catalog names mentioned in a question."""
+        if self.entity_extractor is None:
+            return frozenset()
+        try:
+            _, entities = self.entity_extractor(question)
+        except Exception as e:
+            print(f"Error extracting entities for the response cache: {e}")
+            return frozenset()
+        return frozenset(normalize_text(value) for _, value in entities)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        group = self._groups.get(key[0])
+        if group is not None:
+            group.discard(key[1])
+            if not group:
+                del self._groups[key[0]]
+
+    def _usable(self, key: Tuple[str, str], watched: FrozenSet[str], now: float) -> bool:
+        """Return whether an entry may answer a question, dropping it once expired."""
+        entry = self._entries[key]
+        if now - entry.created_at > self.ttl_seconds:
+            self._remove(key)
+            self.stats["expired"] += 1
+            return False
+        if _mentions(entry.folded_answer, watched - entry.watched):
+            self.stats["watched_rejections"] += 1
+            return False
+        return True
+
+    def _hit(self, key: Tuple[str, str], stat: str) -> str:
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.stats[stat] += 1
+        return entry.answer
+
+    def lookup(
+        self,
+        user_input: str,
+        user_favorite_movies: Sequence[str],
+        user_favorite_actors: Sequence[str],
+        user_favorite_genres: Sequence[str],
+        user_watched_movies: Sequence[str],
+        scope: str = "",
+    ) -> Optional[str]:
+        """Return a cached answer to the question, None on a miss.
+
+        Args:
+            user_input (str): The user message
+            user_favorite_movies (Sequence[str]): Favourite movies of the user
+            user_favorite_actors (Sequence[str]): Favourite actors of the user
+            user_favorite_genres (Sequence[str]): Favourite genres of the user
+            user_watched_movies (Sequence[str]): Movies the user has watched
+            scope (str): Only answers stored with the same scope are reused
+
+        Returns:
+            str: The cached answer, None if there is no usable one
+        """
+        if not self.enabled:
+            return None
+        group = scope + ":" + preference_key(
+            user_favorite_movies, user_favorite_actors, user_favorite_genres
+        )
+        question = normalize_text(user_input)
+        watched = frozenset(user_watched_movies)
+        now = time.time()
+        with self._lock:
+            key = (group, question)
+            if key in self._entries and self._usable(key, watched, now):
+                return self._hit(key, "exact_hits")
+            has_candidates = bool(self._groups.get(group))
+        if not has_candidates:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        # Embedding may call the model, so it runs without holding the lock
+        vector = self._embed(question)
+        entities = self._entities(user_input)
+        with self._lock:
+            candidates = [
+                (group, text)
+                for text in list(self._groups.get(group, ()))
+                if text != question
+                and self._entries[(group, text)].entities == entities
+                and self._usable((group, text), watched, now)
+            ]
+            if vector is not None and candidates:
+                matrix = np.stack([self._entries[key].vector for key in candidates])
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    return self._hit(candidates[best], "semantic_hits")
+            self.stats["misses"] += 1
+            return None
+
+    def store(
+        self,
+        user_input: str,
+        answer: str,
+        user_favorite_movies: Sequence[str],
+        user_favorite_actors: Sequence[str],
+        user_favorite_genres: Sequence[str],
+        user_watched_movies: Sequence[str],
+        scope: str = "",
+    ) -> None:
+        """Cache the answer of the agent to a question.
+
+        Args:
+            user_input (str): The user message
+            answer (str): The answer of the agent
+            user_favorite_movies (Sequence[str]): Favourite movies of the user
+            user_favorite_actors (Sequence[str]): Favourite actors of the user
+            user_favorite_genres (Sequence[str]): Favourite genres of the user
+            user_watched_movies (Sequence[str]): Movies the user has watched
+            scope (str): Scope the answer may be reused in, like a session ID
+        """
+        if not self.enabled or not answer:
+            return
+        group = scope + ":" + preference_key(
+            user_favorite_movies, user_favorite_actors, user_favorite_genres
+        )
+        question = normalize_text(user_input)
+        vector = self._embed(question)
+        if vector is None:
+            if self.embeddings is not None:
+                return
+            vector = np.zeros(0, dtype=np.float32)
+        entry = CachedResponse(
+            question=question,
+            vector=vector,
+            answer=answer,
+            watched=frozenset(user_watched_movies),
+            entities=self._entities(user_input),
+            created_at=time.time(),
+            folded_answer=answer.casefold(),
+        )
+        with self._lock:
+            key = (group, question)
+            self._remove(key)
+            self._entries[key] = entry
+            self._groups.setdefault(group, set()).add(question)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            self.stats["stores"] += 1
+
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters, the hit rate and the number of entries."""
+        stats = dict(self.stats)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["entries"] = len(self._entries)
+        return stats
+
@@ -0,0 +1,415 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+from src.monitoring.tracing import tracer
+
+# Routes the router can dispatch to directly, named like the agent tools
+DESCRIPTION_ROUTE = "Movie recommendation based on description"
+RELATIONSHIPS_ROUTE = "Movie recommendation based on relationships"
+PREFERENCES_ROUTE = "Movie recommendation based on user preferences"
+# Everything else, including general chat, goes through the ReAct agent
+AGENT_ROUTE = "agent"
+ROUTES = (DESCRIPTION_ROUTE, RELATIONSHIPS_ROUTE, PREFERENCES_ROUTE, AGENT_ROUTE)
+
+# (route, pattern, evidence) checked against the lower-cased message
+KEYWORD_RULES: Tuple[Tuple[str, "re.Pattern[str]", float], ...] = tuple(
+    (route, re.compile(pattern), evidence)
+    for route, pattern, evidence in (
+        (
+            PREFERENCES_ROUTE,
+            r"\b(based on|according to|taking|consider\w*|using)\b.{0,25}\bmy\b.{0,15}"
+            r"\b(preferences|taste|favou?rites?)\b",
+            0.95,
+        ),
+        (PREFERENCES_ROUTE, r"\b(movies|films|shows) (that )?i (like|love|liked|loved|enjoy)\b", 0.8),
+        (PREFERENCES_ROUTE, r"\bmy (preferences|taste|favou?rite (movies|films|actors|genres))\b", 0.8),
+        (RELATIONSHIPS_ROUTE, r"\b(starring|featuring|acted|actors?|actress(es)?|cast)\b", 0.6),
+        (RELATIONSHIPS_ROUTE, r"\b(directed by|directors?)\b", 0.7),
+        (RELATIONSHIPS_ROUTE, r"\b(genres?|tv shows?|series|documentar(y|ies)|stand-?up)\b", 0.5),
+        (DESCRIPTION_ROUTE, r"\b(similar to|like|such as|reminds? me of|in the style of)\b", 0.5),
+        (DESCRIPTION_ROUTE, r"\b(about|plot|story|storyline|where)\b", 0.4),
+        (AGENT_ROUTE, r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|bye)\b", 0.9),
+        (AGENT_ROUTE, r"\b(who|when|why|how many|how much|what is|what's|explain|tell me about)\b", 0.6),
+        (AGENT_ROUTE, r"\b(and also|as well as|compare|instead|previous|earlier|last answer)\b", 0.6),
+    )
+)
+
+# Labelled examples for the embedding signal
+LABELLED_EXAMPLES: Dict[str, Tuple[str, ...]] = {
+    DESCRIPTION_ROUTE: (
+        "recommend movies similar to Inception",
+        "I want something like The Irishman",
+        "films about a heist that goes wrong",
+        "a movie about space exploration and survival",
+        "shows with a story like Stranger Things",
+        "something dark and mysterious with a twist ending",
+        "a feel-good movie about friendship",
+        "movies where a detective hunts a serial killer",
+    ),
+    RELATIONSHIPS_ROUTE: (
+        "movies starring Tom Hanks",
+        "which films did Leonardo DiCaprio act in",
+        "recommend horror movies",
+        "movies directed by Martin Scorsese",
+        "romantic comedies with Adam Sandler",
+        "documentaries in the crime genre",
+        "TV shows with Bryan Cranston",
+        "show me international thrillers",
+    ),
+    PREFERENCES_ROUTE: (
+        "recommend something based on my preferences",
+        "what should I watch according to the movies I like",
+        "suggest movies taking my favourite actors into account",
+        "use my favourite genres to recommend something",
+        "based on my taste, what's next",
+        "recommend using my favorites",
+    ),
+    AGENT_ROUTE: (
+        "hello",
+        "thanks, that was helpful",
+        "who directed Inception",
+        "how many movies are in the database",
+        "why did you recommend that",
+        "tell me more about the second one",
+        "what is the plot of Narcos",
+        "can you compare these two movies",
+    ),
+}
+
+
+@dataclass
+class RouteDecision:
+    """Outcome of routing one message."""
+
+    route: str
+    confidence: float
+    dispatch: bool
+    scores: Dict[str, float] = field(default_factory=dict)
+    reasons: List[str] = field(default_factory=list)
+    decision_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    seconds: float = 0.0
+
+
+def _noisy_or(evidence: Iterable[float]) -> float:
+    """Combine independent pieces of evidence into one confidence in [0, 1]."""
+    return 1.0 - math.prod(1.0 - value for value in evidence)
+
+
+class IntentRouter:
+    """Classifies a message into an agent tool or ``AGENT_ROUTE`` without an LLM call.
+
+    Three local signals contribute evidence per route: keyword rules, catalog
+    entities found in the message and, when the first two are not decisive,
+    the cosine similarity of the message embedding to labelled examples.
+    Evidence is combined with a noisy-OR. A route is dispatched directly only
+    when its confidence reaches ``threshold`` and beats the runner-up by
+    ``min_margin``; everything else goes through the full ReAct agent.
+    When ``log_path`` is set, every decision is appended to a JSONL log for
+    auditing. The log keeps the message template with catalog names replaced
+    by slots and a hash of the message, never the raw text.
+    """
+
+    def __init__(
+        self,
+        entity_extractor: Optional[Callable[[str], Tuple[str, List[Tuple[str, str]]]]] = None,
+        embeddings: Optional[Embeddings] = None,
+        threshold: float = 0.8,
+        min_margin: float = 0.2,
+        log_path: Optional[str] = None,
+        log_max_bytes: int = 5_000_000,
+        examples: Dict[str, Sequence[str]] = LABELLED_EXAMPLES,
+        enabled: bool = True,
+    ):
+        """Initialize the router.
+
+        Args:
+            entity_extractor (Callable, optional): Returns the template and typed
+                (slot, value) entities of a message, like ``CypherCache.extract_entities``
+            embeddings (Embeddings, optional): Model for the example similarity signal
+            threshold (float): Minimum confidence for direct dispatch
+            min_margin (float): Minimum lead over the second best route
+            log_path (str, optional): JSONL file receiving every decision, None disables it
+            log_max_bytes (int): Size after which the log is rotated to ``<log_path>.1``
+            examples (Dict[str, Sequence[str]]): Labelled example messages per route
+            enabled (bool): When False every message goes to the agent
+        """
+        self.entity_extractor = entity_extractor
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self.examples = examples
+        self.enabled = enabled
+        self._example_vectors: Optional[Tuple[List[str], np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.stats: Counter = Counter()
+
+    def _keyword_evidence(
+        self, message: str, evidence: Dict[str, List[float]], reasons: List[str]
+    ) -> None:
+        text = message.lower()
+        for route, pattern, value in KEYWORD_RULES:
+            match = pattern.search(text)
+            if match:
+                evidence[route].append(value)
+                reasons.append(f"keyword '{match.group(0).strip()}' -> {route} ({value})")
+
+    def _catalog_evidence(
+        self, message: str, evidence: Dict[str, List[float]], reasons: List[str]
+    ) -> None:
+        if self.entity_extractor is None:
+            return
+        try:
+            _, entities = self.entity_extractor(message)
+        except Exception as e:
+            print(f"Error extracting entities for routing: {e}")
+            return
+        kinds = Counter(re.sub(r"\d+$", "", slot) for slot, _ in entities)
+        if kinds["actor"]:
+            evidence[RELATIONSHIPS_ROUTE].append(0.8)
+            reasons.append(f"{kinds['actor']} catalog actor(s) -> {RELATIONSHIPS_ROUTE} (0.8)")
+        if kinds["genre"]:
+            evidence[RELATIONSHIPS_ROUTE].append(0.6)
+            reasons.append(f"{kinds['genre']} catalog genre(s) -> {RELATIONSHIPS_ROUTE} (0.6)")
+        if kinds["movie"] or kinds["quoted"]:
+            evidence[DESCRIPTION_ROUTE].append(0.5)
+            reasons.append(f"catalog title or quoted name -> {DESCRIPTION_ROUTE} (0.5)")
+
+    def _example_matrix(self) -> Tuple[List[str], np.ndarray]:
+        """Embed the labelled examples once and keep them as unit rows."""
+        with self._lock:
+            if self._example_vectors is None:
+                labels = [route for route, texts in self.examples.items() for _ in texts]
+                texts = [text for route_texts in self.examples.values() for text in route_texts]
+                matrix = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+                matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+                self._example_vectors = (labels, matrix)
+            return self._example_vectors
+
+    def _embedding_evidence(
+        self, message: str, evidence: Dict[str, List[float]], reasons: List[str]
+    ) -> None:
+        if self.embeddings is None:
+            return
+        try:
+            labels, matrix = self._example_matrix()
+            query = np.asarray(self.embeddings.embed_query(message), dtype=np.float32)
+        except Exception as e:
+            print(f"Error embedding message for routing: {e}")
+            return
+        similarities = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        best: Dict[str, float] = {}
+        for label, similarity in zip(labels, similarities):
+            best[label] = max(best.get(label, -1.0), float(similarity))
+        # Softmax over the best match per route, sharp enough to separate close scores
+        routes = list(best)
+        weights = np.exp((np.array([best[route] for route in routes]) - max(best.values())) / 0.02)
+        probabilities = weights / weights.sum()
+        for route, probability in zip(routes, probabilities):
+            value = round(0.7 * float(probability), 3)
+            if value >= 0.05:
+                evidence[route].append(value)
+                reasons.append(f"closest example similarity {best[route]:.3f} -> {route} ({value})")
+
+    def _scores(self, evidence: Dict[str, List[float]]) -> Dict[str, float]:
+        return {route: round(_noisy_or(evidence.get(route, ())), 4) for route in ROUTES}
+
+    def _is_decisive(self, scores: Dict[str, float]) -> bool:
+        ranked = sorted(scores.values(), reverse=True)
+        return ranked[0] >= self.threshold and ranked[0] - ranked[1] >= self.min_margin
+
+    def route(
+        self, message: str, has_preferences: bool = True, has_watched_movies: bool = False
+    ) -> RouteDecision:
+        """Classify a message.
+
+        Args:
+            message (str): The user message
+            has_preferences (bool): Whether the user set any preferences; the
+                preference tool is never dispatched without them
+            has_watched_movies (bool): Whether the user marked watched movies.
+                The relationship tool does not exclude them, so that route is
+                left to the agent, which filters its answer.
+
+        Returns:
+            RouteDecision: The chosen route and whether to dispatch it directly
+        """
+        start = time.perf_counter()
+        if not self.enabled:
+            return RouteDecision(
+                route=AGENT_ROUTE, confidence=0.0, dispatch=False, reasons=["router disabled"]
+            )
+
+        with tracer.span("router", kind="router") as span:
+            evidence: Dict[str, List[float]] = defaultdict(list)
+            reasons: List[str] = []
+            self._keyword_evidence(message, evidence, reasons)
+            self._catalog_evidence(message, evidence, reasons)
+            scores = self._scores(evidence)
+            if not self._is_decisive(scores):
+                self._embedding_evidence(message, evidence, reasons)
+                scores = self._scores(evidence)
+
+            route = max(scores, key=scores.get)
+            confidence = scores[route]
+            dispatch = route != AGENT_ROUTE and self._is_decisive(scores)
+            if dispatch and route == PREFERENCES_ROUTE and not has_preferences:
+                dispatch = False
+                reasons.append("no user preferences set")
+            if dispatch and route == RELATIONSHIPS_ROUTE and has_watched_movies:
+                dispatch = False
+                reasons.append("watched movies must be filtered by the agent")
+
+            decision = RouteDecision(
+                route=route if dispatch else AGENT_ROUTE,
+                confidence=confidence,
+                dispatch=dispatch,
+                scores=scores,
+                reasons=reasons,
+                seconds=round(time.perf_counter() - start, 6),
+            )
+            span.set_attribute("route", decision.route)
+            span.set_attribute("confidence", confidence)
+        self.stats["dispatched" if dispatch else "agent"] += 1
+        return decision
+
+    def _message_template(self, message: str) -> Optional[str]:
+        """Return the message with catalog names replaced by slots, if an extractor is set."""
+        if self.entity_extractor is None:
+            return None
+        try:
+            template, _ = self.entity_extractor(message)
+        except Exception as e:
+            print(f"Error extracting entities for the decision log: {e}")
+            return None
+        return template
+
+    def log(self, message: str, decision: RouteDecision, **outcome) -> None:
+        """Append a decision, and what happened afterwards, to the decision log.
+
+        The raw message is not written: the record keeps its template and a
+        SHA-256 hash, which is enough to group repeated messages.
+
+        Args:
+            message (str): The routed message
+            decision (RouteDecision): The decision taken
+            **outcome: Extra fields, like the tools the agent used or an error
+        """
+        if not self.log_path:
+            return
+        record = {
+            "timestamp": time.time(),
+            "message_template": self._message_template(message),
+            "message_sha256": hashlib.sha256(message.encode("utf-8")).hexdigest(),
+            **asdict(decision),
+            **outcome,
+        }
+        try:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                if (
+                    os.path.exists(self.log_path)
+                    and os.path.getsize(self.log_path) >= self.log_max_bytes
+                ):
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as log_file:
+                    log_file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing router decision log: {e}")
+
+    def get_stats(self) -> dict:
+        """Return the number of dispatched and agent-routed messages."""
+        stats = dict(self.stats)
+        total = stats.get("dispatched", 0) + stats.get("agent", 0)
+        stats["dispatch_rate"] = round(stats.get("dispatched", 0) / total, 4) if total else 0.0
+        return stats
+
+
+class ToolUsageRecorder(BaseCallbackHandler):
+    """Records which of the given tools an agent run used, as labels for the decision log."""
+
+    def __init__(self, tool_names: Iterable[str]):
+        self.tool_names = set(tool_names)
+        self.tools: List[str] = []
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        if name in self.tool_names:
+            self.tools.append(name)
+
+
+def audit_decisions(log_path: str) -> dict:
+    """Summarize a decision log.
+
+    Decisions routed to the agent record the tools the agent actually used,
+    which serve as labels. Dispatched decisions skip the agent, so nothing is
+    recorded for them: they are labelled by hand during review, by adding a
+    ``label`` field with the correct route to the record. A ``label`` also
+    overrides the tools of an agent decision. Dispatch accuracy is only
+    reported once some dispatched decisions carry a label, while abstentions
+    show how often the agent used exactly one tool that the router could have
+    dispatched.
+
+    Args:
+        log_path (str): Path of the JSONL decision log
+
+    Returns:
+        dict: Route counts, confidence quantiles, the number of dispatches still
+            to label, their accuracy when labelled and missed dispatches
+    """
+    routes: Counter = Counter()
+    confidences: List[float] = []
+    correct = labelled = unlabelled = missed = abstained = 0
+    with open(log_path, encoding="utf-8") as log_file:
+        for line in log_file:
+            record = json.loads(line)
+            routes[record["route"]] += 1
+            confidences.append(record["confidence"])
+            label = record.get("label")
+            if label is None and len(record.get("agent_tools") or []) == 1:
+                label = record["agent_tools"][0]
+            if record["dispatch"]:
+                if label is not None:
+                    labelled += 1
+                    correct += label == record["route"]
+                else:
+                    unlabelled += 1
+            else:
+                abstained += 1
+                missed += label in (DESCRIPTION_ROUTE, RELATIONSHIPS_ROUTE, PREFERENCES_ROUTE)
+    quantiles = np.percentile(confidences, [50, 90]).round(3).tolist() if confidences else []
+    summary = {
+        "decisions": sum(routes.values()),
+        "routes": dict(routes),
+        "confidence_p50_p90": quantiles,
+        "labelled_dispatches": labelled,
+        "unlabelled_dispatches": unlabelled,
+        "abstentions_with_single_tool": f"{missed}/{abstained}",
+    }
+    if labelled:
+        summary["dispatch_accuracy"] = round(correct / labelled, 4)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit the decisions of the intent router")
+    parser.add_argument("log", nargs="?", default=".cache/router_decisions.jsonl")
+    args = parser.parse_args()
+    print(json.dumps(audit_decisions(args.log), indent=2))
@@ -0,0 +1,183 @@
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Tag of the ReAct agent step; its LLM output is streamed after FINAL_ANSWER_PREFIX
+AGENT_STEP_TAG = "agent_step"
+# Tag of the chains producing the user-facing answer of a return_direct tool
+ANSWER_TAG = "answer"
+FINAL_ANSWER_PREFIX = "Final Answer:"
+
+_DONE = object()
+
+
+class AnswerStreamHandler(BaseCallbackHandler):
+    """Collects the tokens of the user-facing answer into a thread-safe queue.
+
+    LLM runs tagged with ``AGENT_STEP_TAG`` are buffered until the ReAct
+    ``Final Answer:`` marker appears, so thoughts and tool calls are never
+    shown. With ``stream_tool_answers`` the runs tagged with ``ANSWER_TAG``
+    are streamed as a whole, for return_direct tools invoked without the agent.
+    """
+
+    def __init__(self, stream_tool_answers: bool = False):
+        """Initialize the handler.
+
+        Args:
+            stream_tool_answers (bool): Stream the runs tagged with ``ANSWER_TAG``
+        """
+        self.stream_tool_answers = stream_tool_answers
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.streamed = False
+        self._pending: Dict[UUID, str] = {}
+        self._streaming: Set[UUID] = set()
+        self._strip_leading: Set[UUID] = set()
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """Seconds between the creation of the handler and the first streamed token."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    def _start(self, run_id: UUID, tags: Optional[List[str]]) -> None:
+        tags = tags or []
+        if AGENT_STEP_TAG in tags:
+            self._pending[run_id] = ""
+        elif self.stream_tool_answers and ANSWER_TAG in tags:
+            self._streaming.add(run_id)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(run_id, tags)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(run_id, tags)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self._streaming:
+            self._emit(run_id, token)
+            return
+        if run_id not in self._pending:
+            return
+
+        text = self._pending[run_id] + token
+        if FINAL_ANSWER_PREFIX not in text:
+            self._pending[run_id] = text
+            return
+        del self._pending[run_id]
+        self._streaming.add(run_id)
+        self._strip_leading.add(run_id)
+        self._emit(run_id, text.split(FINAL_ANSWER_PREFIX, 1)[1])
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._pending.pop(run_id, None)
+        self._streaming.discard(run_id)
+        self._strip_leading.discard(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.on_llm_end(None, run_id=run_id)
+
+    def _emit(self, run_id: UUID, token: str) -> None:
+        """Put a token on the queue, dropping the whitespace after the answer marker."""
+        if run_id in self._strip_leading:
+            token = token.lstrip()
+            if not token:
+                return
+            self._strip_leading.discard(run_id)
+        if not token:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.streamed = True
+        self.queue.put(token)
+
+    def finish(self) -> None:
+        """Signal that no more tokens will arrive."""
+        self.queue.put(_DONE)
+
+    def tokens(self) -> Iterator[str]:
+        """Yield queued tokens until ``finish`` is called."""
+        while True:
+            token = self.queue.get()
+            if token is _DONE:
+                return
+            yield token
+
+
+def stream_in_background(
+    func: Callable[[], Any],
+    handler: AnswerStreamHandler,
+    on_first_token: Optional[Callable[[float], None]] = None,
+) -> Iterator[str]:
+    """Run ``func`` in a worker thread and yield the answer tokens as they arrive.
+
+    The worker runs in a copy of the current context with the Streamlit script
+    context attached, so tracing spans and ``get_session_id`` keep working.
+    When nothing was streamed (for example a model without token callbacks)
+    the complete output of ``func`` is yielded at the end. Errors raised by
+    ``func`` are re-raised in the consuming thread.
+
+    Args:
+        func (Callable[[], Any]): Call producing the final answer
+        handler (AnswerStreamHandler): Handler passed to the callbacks of ``func``
+        on_first_token (Callable[[float], None], optional): Called with the
+            time to first token in seconds
+
+    Yields:
+        str: Tokens of the answer
+    """
+    result: Dict[str, Any] = {}
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        try:
+            result["output"] = context.run(func)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            handler.finish()
+
+    worker = threading.Thread(target=run, name="answer-stream", daemon=True)
+    script_ctx = get_script_run_ctx()
+    if script_ctx is not None:
+        add_script_run_ctx(worker, script_ctx)
+    worker.start()
+
+    for token in handler.tokens():
+        if on_first_token is not None and handler.time_to_first_token is not None:
+            on_first_token(handler.time_to_first_token)
+            on_first_token = None
+        yield token
+    worker.join()
+
+    if "error" in result:
+        raise result["error"]
+    if not handler.streamed:
+        if on_first_token is not None:
+            on_first_token(time.perf_counter() - handler.started_at)
+        yield str(result["output"])
+
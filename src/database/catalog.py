@@ -0,0 +1,166 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import streamlit as st
+from langchain_neo4j import Neo4jGraph
+
+from src.database.graph import graph
+from src.database.search import CatalogSearch
+import src.prompts.cypher_queries as cypher_queries
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of the catalog option lists shared by all sessions."""
+
+    movie_titles: Tuple[str, ...] = ()
+    genre_names: Tuple[str, ...] = ()
+    actor_names: Tuple[str, ...] = ()
+    counts: Tuple[int, int, int] = (0, 0, 0)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def version(self) -> Tuple[int, int, int]:
+        """Version of the snapshot, derived from the node counts it was built from."""
+        return self.counts
+
+
+class CatalogService:
+    """Process-wide cache of the movie, genre and actor option lists.
+
+    The lists are loaded in a single round trip, stored as tuples of interned
+    strings and refreshed in a background thread once the TTL has passed.
+    A refresh first compares the node counts with the cached version and only
+    reloads the lists when the catalog actually changed.
+    """
+
+    def __init__(self, graph_instance: Neo4jGraph, ttl_seconds: float = 600.0):
+        """Initialize the catalog service.
+
+        Args:
+            graph_instance (Neo4jGraph): Neo4j graph instance
+            ttl_seconds (float): Age after which a background refresh is triggered
+        """
+        self.graph = graph_instance
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "reloads": 0, "errors": 0}
+
+    @staticmethod
+    def _intern(values) -> Tuple[str, ...]:
+        """Convert a list of values into a tuple of interned strings."""
+        return tuple(sys.intern(str(value)) for value in values if value is not None)
+
+    def _load(self) -> CatalogSnapshot:
+        """Load all three option lists from Neo4j."""
+        titles, genres, actors = cypher_queries.get_catalog_lists(self.graph)
+        snapshot = CatalogSnapshot(
+            movie_titles=self._intern(titles),
+            genre_names=self._intern(genres),
+            actor_names=self._intern(actors),
+            counts=(len(titles), len(genres), len(actors)),
+        )
+        return snapshot
+
+    def _refresh(self) -> None:
+        """Refresh the snapshot, reloading the lists only if the counts changed."""
+        try:
+            counts = tuple(cypher_queries.get_catalog_counts(self.graph))
+            current = self._snapshot
+            if current is not None and counts == current.version:
+                snapshot = CatalogSnapshot(
+                    movie_titles=current.movie_titles,
+                    genre_names=current.genre_names,
+                    actor_names=current.actor_names,
+                    counts=current.counts,
+                )
+                reloaded = False
+            else:
+                snapshot, reloaded = self._load(), True
+            with self._lock:
+                self._snapshot = snapshot
+                self.stats["refreshes"] += 1
+                self.stats["reloads"] += int(reloaded)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"Error refreshing catalog: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _schedule_refresh(self) -> None:
+        """Start a background refresh unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._refresh, name="catalog-refresh", daemon=True
+        ).start()
+
+    def get_snapshot(self) -> CatalogSnapshot:
+        """Return the current catalog snapshot.
+
+        The first call loads the catalog synchronously. Later calls always
+        return the cached snapshot and schedule a background refresh when it
+        is older than the TTL.
+
+        Returns:
+            CatalogSnapshot: The cached catalog lists
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    self.stats["misses"] += 1
+                    snapshot = self._snapshot = self._load()
+                    self.stats["reloads"] += 1
+                    return snapshot
+        with self._lock:
+            self.stats["hits"] += 1
+        if time.monotonic() - snapshot.loaded_at > self.ttl_seconds:
+            self._schedule_refresh()
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Force a background refresh on the next access."""
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot = CatalogSnapshot(
+                    movie_titles=self._snapshot.movie_titles,
+                    genre_names=self._snapshot.genre_names,
+                    actor_names=self._snapshot.actor_names,
+                    counts=(-1, -1, -1),
+                    loaded_at=0.0,
+                )
+
+    def get_stats(self) -> dict:
+        """Return the hit/miss counters together with the snapshot sizes."""
+        snapshot = self._snapshot
+        with self._lock:
+            stats = dict(self.stats)
+        if snapshot is not None:
+            stats["movies"], stats["genres"], stats["actors"] = (
+                len(snapshot.movie_titles),
+                len(snapshot.genre_names),
+                len(snapshot.actor_names),
+            )
+            stats["age_seconds"] = round(time.monotonic() - snapshot.loaded_at, 1)
+        return stats
+
+
+# Create the Catalog service shared by all sessions
+catalog = CatalogService(
+    graph_instance=graph,
+    ttl_seconds=float(st.secrets.get("CATALOG_TTL_SECONDS", 600)),
+)
+
+# Create the typeahead search over the catalog lists
+catalog_search = CatalogSearch(catalog.get_snapshot)
@@ -0,0 +1,551 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_neo4j import Neo4jGraph
+
+# Weight of a profile relationship; a movie that is liked and watched gets both
+INTERACTION_WEIGHTS = {"LIKES": 2.0, "WATCHED": 1.0}
+
+MODEL_FILE = "model.json"
+ITEM_FACTORS_FILE = "item_factors.npy"
+USER_FACTORS_FILE = "user_factors.npy"
+INTERACTIONS_FILE = "interactions.npz"
+HISTORY_FILE = "versions.jsonl"
+
+PROFILE_INTERACTIONS_QUERY = f"""
+MATCH (u:User)
+WHERE $since IS NULL OR u.updatedAt > datetime({{epochMillis: $since}})
+RETURN u.userId AS userId,
+    u.updatedAt.epochMillis AS updatedAt,
+    [(u)-[r:{"|".join(INTERACTION_WEIGHTS)}]->(m:Movie) | [type(r), m.title]] AS interactions
+ORDER BY u.userId
+SKIP $skip LIMIT $limit
+"""
+
+# User ID -> title -> interaction weight
+UserRows = Dict[str, Dict[str, float]]
+
+
+def fetch_interactions(
+    graph: Neo4jGraph, since: Optional[int] = None, batch_size: int = 1000
+) -> Tuple[UserRows, Optional[int]]:
+    """Read the liked and watched movies of the stored user profiles.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        since (int, optional): Only read profiles updated after this time, in
+            epoch milliseconds
+        batch_size (int): Number of profiles fetched per query
+
+    Returns:
+        Tuple[UserRows, Optional[int]]: The weighted movies per user, including
+            users without any, and the latest update time that was read
+    """
+    rows: UserRows = {}
+    latest = since
+    skip = 0
+    while True:
+        result = graph.query(
+            PROFILE_INTERACTIONS_QUERY, {"since": since, "skip": skip, "limit": batch_size}
+        )
+        for record in result:
+            weights: Dict[str, float] = {}
+            for rel_type, title in record["interactions"] or []:
+                weights[title] = weights.get(title, 0.0) + INTERACTION_WEIGHTS[rel_type]
+            rows[record["userId"]] = weights
+            if record["updatedAt"] is not None:
+                latest = max(latest or 0, record["updatedAt"])
+        if len(result) < batch_size:
+            break
+        skip += batch_size
+    return rows, latest
+
+
+def _to_csr(
+    rows: UserRows, user_ids: Sequence[str], item_index: Dict[str, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pack the rows of the given users into indptr, indices and weights arrays."""
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    indices: List[int] = []
+    weights: List[float] = []
+    for position, user_id in enumerate(user_ids):
+        row = rows[user_id]
+        indices.extend(item_index[title] for title in row)
+        weights.extend(row.values())
+        indptr[position + 1] = len(indices)
+    return indptr, np.asarray(indices, dtype=np.int32), np.asarray(weights, dtype=np.float32)
+
+
+def _transpose(
+    indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, n_columns: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the CSR arrays of the transposed matrix."""
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    transposed_indptr = np.zeros(n_columns + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_columns), out=transposed_indptr[1:])
+    return transposed_indptr, rows[order], weights[order]
+
+
+def _solve_row(
+    gram: np.ndarray, factors: np.ndarray, weights: np.ndarray, alpha: float
+) -> np.ndarray:
+    """Solve the implicit-feedback least squares problem of one row.
+
+    Args:
+        gram (np.ndarray): ``F^T F + regularization * I`` of all fixed factors
+        factors (np.ndarray): Fixed factors of the row's interactions
+        weights (np.ndarray): Interaction weights, turned into confidence ``1 + alpha * w``
+        alpha (float): Confidence scale
+
+    Returns:
+        np.ndarray: Factors of the row
+    """
+    confidence = alpha * weights
+    a = gram + (factors.T * confidence) @ factors
+    b = factors.T @ (1.0 + confidence)
+    return np.linalg.solve(a, b)
+
+
+def _solve_rows(
+    fixed: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    weights: np.ndarray,
+    alpha: float,
+    regularization: float,
+) -> np.ndarray:
+    """Recompute the factors of every row with the other side fixed."""
+    fixed = fixed.astype(np.float64)
+    gram = fixed.T @ fixed + regularization * np.eye(fixed.shape[1])
+    solved = np.zeros((len(indptr) - 1, fixed.shape[1]), dtype=np.float32)
+    for row in range(len(indptr) - 1):
+        start, end = indptr[row], indptr[row + 1]
+        if start < end:
+            solved[row] = _solve_row(
+                gram, fixed[indices[start:end]], weights[start:end].astype(np.float64), alpha
+            )
+    return solved
+
+
+def train_als(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    weights: np.ndarray,
+    n_items: int,
+    factors: int = 32,
+    iterations: int = 15,
+    alpha: float = 10.0,
+    regularization: float = 0.1,
+    item_factors: Optional[np.ndarray] = None,
+    seed: int = 42,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Factorize a user-item matrix with implicit-feedback alternating least squares.
+
+    Args:
+        indptr (np.ndarray): Row offsets of the user-item matrix
+        indices (np.ndarray): Item of every interaction
+        weights (np.ndarray): Weight of every interaction
+        n_items (int): Number of items
+        factors (int): Number of latent factors
+        iterations (int): Number of alternating user and item updates
+        alpha (float): Confidence scale of the interactions
+        regularization (float): L2 regularization
+        item_factors (np.ndarray, optional): Initial item factors, e.g. of a previous
+            run. Every iteration starts by solving the user factors.
+        seed (int): Random seed of the initial factors
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: float32 user and item factors
+    """
+    if item_factors is None:
+        rng = np.random.default_rng(seed)
+        item_factors = rng.normal(0, 0.01, (n_items, factors)).astype(np.float32)
+    user_factors = np.zeros((len(indptr) - 1, factors), dtype=np.float32)
+    item_indptr, item_indices, item_weights = _transpose(indptr, indices, weights, n_items)
+    for _ in range(iterations):
+        user_factors = _solve_rows(item_factors, indptr, indices, weights, alpha, regularization)
+        item_factors = _solve_rows(
+            user_factors, item_indptr, item_indices, item_weights, alpha, regularization
+        )
+    return user_factors, item_factors
+
+
+def _extend_factors(
+    previous: np.ndarray, known: int, total: int, factors: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Keep the factors of the first ``known`` rows and initialize the new ones."""
+    extended = rng.normal(0, 0.01, (total, factors)).astype(np.float32)
+    extended[:known] = previous[:known]
+    return extended
+
+
+def _write_atomic(path: str, write) -> None:
+    """Write a file under a temporary name and move it into place."""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+def load_training_state(directory: str) -> Optional[Dict[str, Any]]:
+    """Load a stored model with its item factors and interactions, None if there is none."""
+    try:
+        with open(os.path.join(directory, MODEL_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        interactions = np.load(os.path.join(directory, INTERACTIONS_FILE))
+        state = {
+            "meta": meta,
+            "user_factors": np.load(os.path.join(directory, USER_FACTORS_FILE)),
+            "item_factors": np.load(os.path.join(directory, ITEM_FACTORS_FILE)),
+            "indptr": interactions["indptr"],
+            "indices": interactions["indices"],
+            "weights": interactions["weights"],
+        }
+    except FileNotFoundError:
+        return None
+    if len(state["item_factors"]) != len(meta["titles"]) or len(state["user_factors"]) != len(
+        meta["user_ids"]
+    ):
+        print(f"Error loading collaborative model from {directory}: files do not match")
+        return None
+    return state
+
+
+def _rows_of(state: Dict[str, Any]) -> UserRows:
+    """Unpack the interactions of a stored model into weighted movies per user."""
+    titles = state["meta"]["titles"]
+    indptr, indices, weights = state["indptr"], state["indices"], state["weights"]
+    return {
+        user_id: {
+            titles[item]: float(weight)
+            for item, weight in zip(
+                indices[indptr[row] : indptr[row + 1]], weights[indptr[row] : indptr[row + 1]]
+            )
+        }
+        for row, user_id in enumerate(state["meta"]["user_ids"])
+    }
+
+
+def fit_model(
+    rows: UserRows,
+    directory: str,
+    previous: Optional[Dict[str, Any]] = None,
+    factors: int = 32,
+    iterations: int = 15,
+    incremental_iterations: int = 3,
+    alpha: float = 10.0,
+    regularization: float = 0.1,
+    trained_until: Optional[int] = None,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """Train a model on the given profiles and store it as the next version.
+
+    With a previous model, ``rows`` only holds the profiles that changed.
+    They replace their stored rows, movies and users not seen before are
+    appended, and training starts from the stored factors, so a few
+    iterations are enough.
+
+    Args:
+        rows (UserRows): Weighted movies per user; an empty row removes the user
+        directory (str): Model directory
+        previous (Dict[str, Any], optional): State returned by load_training_state
+        factors (int): Number of latent factors
+        iterations (int): Iterations of a full training run
+        incremental_iterations (int): Iterations when starting from a previous model
+        alpha (float): Confidence scale of the interactions
+        regularization (float): L2 regularization
+        trained_until (int, optional): Latest profile update included, in epoch milliseconds
+        seed (int): Random seed of the initial factors
+
+    Returns:
+        Dict[str, Any]: Metadata of the stored model
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    if previous is not None:
+        merged = _rows_of(previous)
+        merged.update(rows)
+        titles = list(previous["meta"]["titles"])
+        user_ids = [user_id for user_id in previous["meta"]["user_ids"] if merged.get(user_id)]
+    else:
+        merged, titles, user_ids = dict(rows), [], []
+    known_users = set(user_ids)
+    user_ids.extend(
+        sorted(user_id for user_id, row in rows.items() if row and user_id not in known_users)
+    )
+    if not user_ids:
+        raise ValueError("No user profiles with liked or watched movies found to train on")
+
+    item_index = {title: position for position, title in enumerate(titles)}
+    for user_id in user_ids:
+        for title in merged[user_id]:
+            if title not in item_index:
+                item_index[title] = len(titles)
+                titles.append(title)
+    indptr, indices, weights = _to_csr(merged, user_ids, item_index)
+
+    item_factors = None
+    if previous is not None:
+        item_factors = _extend_factors(
+            previous["item_factors"], len(previous["meta"]["titles"]), len(titles), factors, rng
+        )
+    user_factors, item_factors = train_als(
+        indptr,
+        indices,
+        weights,
+        len(titles),
+        factors=factors,
+        iterations=incremental_iterations if previous is not None else iterations,
+        alpha=alpha,
+        regularization=regularization,
+        item_factors=item_factors,
+        seed=seed,
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    _write_atomic(os.path.join(directory, ITEM_FACTORS_FILE), lambda f: np.save(f, item_factors))
+    _write_atomic(os.path.join(directory, USER_FACTORS_FILE), lambda f: np.save(f, user_factors))
+    _write_atomic(
+        os.path.join(directory, INTERACTIONS_FILE),
+        lambda f: np.savez_compressed(f, indptr=indptr, indices=indices, weights=weights),
+    )
+    previous_meta = previous["meta"] if previous is not None else {}
+    meta = {
+        "version": previous_meta.get("version", 0) + 1,
+        "parent_version": previous_meta.get("version"),
+        "mode": "incremental" if previous is not None else "full",
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "trained_until": trained_until,
+        "factors": factors,
+        "alpha": alpha,
+        "regularization": regularization,
+        "users": len(user_ids),
+        "items": len(titles),
+        "interactions": int(len(indices)),
+        "updated_users": len(rows),
+        "seconds": round(time.perf_counter() - start, 3),
+        "size_bytes": sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in (ITEM_FACTORS_FILE, USER_FACTORS_FILE, INTERACTIONS_FILE)
+        ),
+    }
+    # The model file is written last, so readers never see it ahead of the arrays
+    _write_atomic(
+        os.path.join(directory, MODEL_FILE),
+        lambda f: f.write(
+            json.dumps({**meta, "titles": titles, "user_ids": user_ids}).encode("utf-8")
+        ),
+    )
+    with open(os.path.join(directory, HISTORY_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps(meta) + "\n")
+    return meta
+
+
+def train_model(
+    graph: Neo4jGraph,
+    directory: str,
+    full: bool = False,
+    factors: int = 32,
+    iterations: int = 15,
+    incremental_iterations: int = 3,
+    alpha: float = 10.0,
+    regularization: float = 0.1,
+    batch_size: int = 1000,
+) -> Optional[Dict[str, Any]]:
+    """Train the collaborative filtering model from the stored user profiles.
+
+    Unless ``full`` is set, only profiles updated since the stored model was
+    trained are read, and training continues from its factors.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        directory (str): Model directory
+        full (bool): Retrain from all profiles
+        factors (int): Number of latent factors
+        iterations (int): Iterations of a full training run
+        incremental_iterations (int): Iterations of an incremental run
+        alpha (float): Confidence scale of the interactions
+        regularization (float): L2 regularization
+        batch_size (int): Number of profiles fetched per query
+
+    Returns:
+        Dict[str, Any]: Metadata of the new model, None if no profile changed
+    """
+    previous = None if full else load_training_state(directory)
+    if previous is not None and previous["meta"].get("factors") != factors:
+        print("Number of factors changed, retraining from all profiles")
+        previous = None
+    since = previous["meta"].get("trained_until") if previous is not None else None
+    rows, latest = fetch_interactions(graph, since=since, batch_size=batch_size)
+    if previous is not None and not rows:
+        return None
+    return fit_model(
+        rows,
+        directory,
+        previous=previous,
+        factors=factors,
+        iterations=iterations,
+        incremental_iterations=incremental_iterations,
+        alpha=alpha,
+        regularization=regularization,
+        trained_until=latest,
+    )
+
+
+class CollaborativeModel:
+    """Scores movies for a set of liked and watched movies with a trained model.
+
+    The session is projected onto the item factors with one small least
+    squares solve, the same step that trains the user factors, so it needs
+    no stored profile. Scoring all movies is then one matrix-vector product.
+    """
+
+    def __init__(self, directory: str):
+        """Load a model written by ``fit_model``.
+
+        Args:
+            directory (str): Model directory
+        """
+        with open(os.path.join(directory, MODEL_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.titles: List[str] = meta.pop("titles")
+        meta.pop("user_ids")
+        self.meta: Dict[str, Any] = meta
+        self.item_factors = np.load(os.path.join(directory, ITEM_FACTORS_FILE))
+        if self.item_factors.shape[0] != len(self.titles):
+            raise ValueError(f"Item factors in {directory} do not match the model file")
+        self.index = {title: position for position, title in enumerate(self.titles)}
+        factors = self.item_factors.astype(np.float64)
+        self._gram = factors.T @ factors + meta["regularization"] * np.eye(factors.shape[1])
+
+    @property
+    def version(self) -> int:
+        return self.meta["version"]
+
+    def user_vector(self, weights: Dict[str, float]) -> Optional[np.ndarray]:
+        """Return the factors of a set of weighted movies, None if the model knows none of them."""
+        known = [
+            (self.index[title], weight) for title, weight in weights.items() if title in self.index
+        ]
+        if not known:
+            return None
+        items = np.fromiter((item for item, _ in known), dtype=np.int64, count=len(known))
+        values = np.fromiter((weight for _, weight in known), dtype=np.float64, count=len(known))
+        factors = self.item_factors[items].astype(np.float64)
+        return _solve_row(self._gram, factors, values, self.meta["alpha"]).astype(np.float32)
+
+    def recommend(
+        self,
+        liked: Iterable[str],
+        watched: Iterable[str] = (),
+        top_k: int = 10,
+        explain: int = 2,
+    ) -> List[Dict[str, Any]]:
+        """Rank the movies of the model for a set of liked and watched movies.
+
+        Args:
+            liked (Iterable[str]): Titles of liked movies
+            watched (Iterable[str]): Titles of watched movies
+            top_k (int): Number of movies to return
+            explain (int): Number of liked or watched movies listed per result
+                as the closest to it
+
+        Returns:
+            List[Dict[str, Any]]: Titles with their score and the closest
+                session movies, best first, without liked or watched movies
+        """
+        weights: Dict[str, float] = {}
+        for rel_type, titles in (("LIKES", liked), ("WATCHED", watched)):
+            for title in titles:
+                weights[title] = weights.get(title, 0.0) + INTERACTION_WEIGHTS[rel_type]
+        vector = self.user_vector(weights)
+        if vector is None:
+            return []
+        scores = self.item_factors @ vector
+        seen = np.fromiter(
+            (self.index[title] for title in weights if title in self.index), dtype=np.int64
+        )
+        scores[seen] = -np.inf
+        k = min(top_k, len(scores) - len(seen))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        closest = np.argsort(-(self.item_factors[top] @ self.item_factors[seen].T), axis=1)
+        return [
+            {
+                "title": self.titles[item],
+                "score": round(float(scores[item]), 4),
+                "because": [self.titles[seen[j]] for j in closest[rank, :explain]],
+            }
+            for rank, item in enumerate(top)
+        ]
+
+
+_models: Dict[str, Tuple[float, CollaborativeModel]] = {}
+_models_lock = threading.Lock()
+
+
+def get_collaborative_model(directory: str) -> Optional[CollaborativeModel]:
+    """Return the process-wide model of a directory, reloaded after it is retrained.
+
+    Returns:
+        CollaborativeModel: The model, None if none was trained yet
+    """
+    try:
+        modified = os.path.getmtime(os.path.join(directory, MODEL_FILE))
+    except OSError:
+        return None
+    with _models_lock:
+        cached = _models.get(directory)
+        if cached is None or cached[0] != modified:
+            try:
+                _models[directory] = (modified, CollaborativeModel(directory))
+            except Exception as e:
+                print(f"Error loading collaborative model from {directory}: {e}")
+                return cached[1] if cached else None
+        return _models[directory][1]
+
+
+if __name__ == "__main__":
+    from src.database.graph import graph
+
+    parser = argparse.ArgumentParser(
+        description="Train the collaborative filtering model from the stored user profiles"
+    )
+    parser.add_argument("--directory", default=".cache/collaborative_model")
+    parser.add_argument("--full", action="store_true", help="Retrain from all profiles")
+    parser.add_argument("--factors", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--incremental-iterations", type=int, default=3)
+    parser.add_argument("--alpha", type=float, default=10.0)
+    parser.add_argument("--regularization", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    meta = train_model(
+        graph,
+        args.directory,
+        full=args.full,
+        factors=args.factors,
+        iterations=args.iterations,
+        incremental_iterations=args.incremental_iterations,
+        alpha=args.alpha,
+        regularization=args.regularization,
+        batch_size=args.batch_size,
+    )
+    if meta is None:
+        print("No profile changed since the last training run")
+    else:
+        print(
+            f"Trained model version {meta['version']} ({meta['mode']}): {meta['users']} users, "
+            f"{meta['items']} movies, {meta['interactions']} interactions, "
+            f"{meta['size_bytes'] / 1024:.1f} KiB in {meta['seconds']}s"
+        )
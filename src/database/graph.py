@@ -1,10 +1,42 @@
 import streamlit as st
-from langchain_neo4j import Neo4jGraph
+from src.database.migrations import apply_migrations, build_migrations, migrate
+from src.database.schema import apply_schema_snapshot
+from src.database.timeout_graph import TimeoutNeo4jGraph
+from src.monitoring.tracing import instrument_graph
 
-# Create the Graph
-graph = Neo4jGraph(
-    url=st.secrets["NEO4J_URI"],
-    username=st.secrets["NEO4J_USERNAME"],
-    password=st.secrets["NEO4J_PASSWORD"],
+
+def _enabled(key: str, default: bool = True) -> bool:
+    return str(st.secrets.get(key, default)).lower() not in ("false", "0")
+
+
+# Create the Graph, with a tracing span around every query. The schema comes
+# from the snapshot on disk instead of being introspected on every start.
+graph = instrument_graph(
+    TimeoutNeo4jGraph(
+        url=st.secrets["NEO4J_URI"],
+        username=st.secrets["NEO4J_USERNAME"],
+        password=st.secrets["NEO4J_PASSWORD"],
+        refresh_schema=False,
+    )
+)
+schema_snapshot = apply_schema_snapshot(
+    graph, path=st.secrets.get("SCHEMA_SNAPSHOT_PATH", ".cache/graph_schema.json")
 )
 
+# Migrations run from the deploy step (python -m src.database.migrations).
+# At startup they only run when enabled, as idempotent CREATE ... IF NOT EXISTS
+# statements without waiting for the indexes to populate. Checking the query
+# plans waits for the indexes and runs an EXPLAIN per shipped query, so it is
+# opt-in too and only warns unless SCHEMA_VERIFY_STRICT is set.
+vector_dimensions = int(st.secrets.get("VECTOR_DIMENSIONS", 1536))
+if _enabled("SCHEMA_MIGRATE_ON_START", False):
+    apply_migrations(graph, build_migrations(vector_dimensions))
+if _enabled("SCHEMA_VERIFY_ON_START", False):
+    schema_migration = migrate(
+        graph,
+        vector_dimensions=vector_dimensions,
+        apply=False,
+        verify=True,
+        timeout=int(st.secrets.get("SCHEMA_INDEX_TIMEOUT", 300)),
+        strict=_enabled("SCHEMA_VERIFY_STRICT", False),
+    )
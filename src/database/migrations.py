@@ -0,0 +1,392 @@
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Sequence
+
+from langchain_neo4j import Neo4jGraph
+
+from src.prompts.cypher_prompts import (
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_HYBRID_RECOMMENDATION_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_USER_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE,
+)
+
+
+class SchemaMigrationError(Exception):
+    """Raised when an index does not come online."""
+
+
+class SchemaRegressionError(Exception):
+    """Raised when a shipped query no longer plans an index seek."""
+
+
+@dataclass
+class Migration:
+    """A named, idempotent schema statement."""
+
+    name: str
+    statement: str
+
+
+@dataclass
+class PlanCheck:
+    """A shipped query and the operators its plan must contain."""
+
+    name: str
+    query: str
+    expected: Sequence[str] = ("IndexSeek",)
+
+
+@dataclass
+class MigrationReport:
+    """What a migration run created, failed to create and found in the plans."""
+
+    applied: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    offline_indexes: List[str] = field(default_factory=list)
+    plan_regressions: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.failed or self.offline_indexes or self.plan_regressions)
+
+
+def build_migrations(vector_dimensions: int = 1536) -> List[Migration]:
+    """Return the constraints and indexes the application queries rely on.
+
+    Every statement uses ``IF NOT EXISTS``, so running them again, or on a
+    database built by ``create_netflix_db.ipynb``, changes nothing. The
+    uniqueness constraints also give the range indexes behind the lookups by
+    title, actor name and genre.
+
+    Args:
+        vector_dimensions (int): Dimensions of the description embeddings
+
+    Returns:
+        List[Migration]: Statements in the order they are applied
+    """
+    return [
+        Migration(
+            "movie_title_unique",
+            "CREATE CONSTRAINT movie_title_unique IF NOT EXISTS "
+            "FOR (m:Movie) REQUIRE m.title IS UNIQUE",
+        ),
+        Migration(
+            "actor_name_unique",
+            "CREATE CONSTRAINT actor_name_unique IF NOT EXISTS "
+            "FOR (a:Actor) REQUIRE a.actorName IS UNIQUE",
+        ),
+        Migration(
+            "genre_name_unique",
+            "CREATE CONSTRAINT genre_name_unique IF NOT EXISTS "
+            "FOR (g:Genre) REQUIRE g.genre IS UNIQUE",
+        ),
+        Migration(
+            "director_name_unique",
+            "CREATE CONSTRAINT director_name_unique IF NOT EXISTS "
+            "FOR (d:Director) REQUIRE d.directorName IS UNIQUE",
+        ),
+        Migration(
+            "movie_type_unique",
+            "CREATE CONSTRAINT movie_type_unique IF NOT EXISTS "
+            "FOR (t:MovieType) REQUIRE t.movieType IS UNIQUE",
+        ),
+        Migration(
+            "session_id_unique",
+            "CREATE CONSTRAINT session_id_unique IF NOT EXISTS "
+            "FOR (s:Session) REQUIRE s.id IS UNIQUE",
+        ),
+        Migration(
+            "user_id_unique",
+            "CREATE CONSTRAINT user_id_unique IF NOT EXISTS "
+            "FOR (u:User) REQUIRE u.userId IS UNIQUE",
+        ),
+        Migration(
+            "movie_id_range",
+            "CREATE RANGE INDEX movie_id_range IF NOT EXISTS FOR (m:Movie) ON (m.id)",
+        ),
+        Migration(
+            "catalog_names_fulltext",
+            "CREATE FULLTEXT INDEX catalog_names_fulltext IF NOT EXISTS "
+            "FOR (n:Movie|Actor|Director|Genre) "
+            "ON EACH [n.title, n.actorName, n.directorName, n.genre]",
+        ),
+        Migration(
+            "MovieVector",
+            "CREATE VECTOR INDEX MovieVector IF NOT EXISTS "
+            "FOR (m:Movie) ON m.descriptionEmbedding "
+            "OPTIONS {indexConfig: {"
+            f"`vector.dimensions`: {int(vector_dimensions)}, "
+            "`vector.similarity_function`: 'cosine'}}",
+        ),
+    ]
+
+
+# Shipped queries whose anchor node must be found through an index
+PLAN_CHECKS = [
+    PlanCheck("movie_similarity", CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE),
+    PlanCheck("movie_similarity_batch", CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_TEMPLATE),
+    PlanCheck("movie_similarity_precomputed", CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_TEMPLATE),
+    PlanCheck("genre_similarity", CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE),
+    PlanCheck("actor_similarity", CYPHER_ACTOR_SIMILARITY_SEARCH_TEMPLATE),
+    PlanCheck("resolve_preference_ids", CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE),
+    PlanCheck(
+        "movie_similarity_by_id",
+        CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+        expected=("ByElementIdSeek",),
+    ),
+    PlanCheck(
+        "movie_similarity_batch_by_id",
+        CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE,
+        expected=("ByElementIdSeek",),
+    ),
+    PlanCheck(
+        "movie_similarity_precomputed_by_id",
+        CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE,
+        expected=("ByElementIdSeek",),
+    ),
+    PlanCheck(
+        "genre_similarity_by_id",
+        CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+        expected=("ByElementIdSeek",),
+    ),
+    PlanCheck(
+        "actor_similarity_by_id",
+        CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+        expected=("ByElementIdSeek",),
+    ),
+    PlanCheck("movie_similarity_batch_by_user", CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE),
+    PlanCheck(
+        "movie_similarity_precomputed_by_user",
+        CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_USER_TEMPLATE,
+    ),
+    PlanCheck("genre_similarity_by_user", CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE),
+    PlanCheck("actor_similarity_by_user", CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE),
+    PlanCheck(
+        "hybrid_recommendation",
+        CYPHER_HYBRID_RECOMMENDATION_TEMPLATE,
+        expected=("ProcedureCall", "IndexSeek"),
+    ),
+    # Same lookup as get_movie_metadata in cypher_queries.py
+    PlanCheck(
+        "movie_metadata",
+        """
+        UNWIND range(0, size($ids) - 1) AS position
+        MATCH (node:Movie)
+        WHERE elementId(node) = $ids[position]
+        RETURN node.title AS title
+        """,
+        expected=("ByElementIdSeek",),
+    ),
+]
+
+# Placeholder values, only used to plan the queries
+PLAN_PARAMS = {
+    "movie_title": "",
+    "user_movies": [""],
+    "user_watched_movies": [""],
+    "user_genres": [""],
+    "user_actors": [""],
+    "excluded_movies": [""],
+    "ids": [""],
+    "titles": [""],
+    "actors": [""],
+    "genres": [""],
+    "movie_id": "",
+    "user_id": "",
+    "seed_ids": None,
+    "movie_ids": [""],
+    "excluded_ids": [""],
+    "watched_ids": [""],
+    "genre_ids": [""],
+    "actor_ids": [""],
+    "limit": 1,
+    "max_age_days": 1,
+    "index_name": "MovieVector",
+    "fetch_k": 1,
+    "embedding": [0.0],
+}
+
+# Operators reading every node of a label, or of the whole graph
+SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+
+def apply_migrations(graph: Neo4jGraph, migrations: Sequence[Migration]) -> MigrationReport:
+    """Run every migration, recording the ones that fail instead of stopping.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        migrations (Sequence[Migration]): Statements to run
+
+    Returns:
+        MigrationReport: The applied and failed migrations
+    """
+    report = MigrationReport()
+    for migration in migrations:
+        try:
+            graph.query(migration.statement)
+            report.applied.append(migration.name)
+        except Exception as e:
+            print(f"Error applying migration {migration.name}: {e}")
+            report.failed[migration.name] = str(e)
+    return report
+
+
+def await_indexes(graph: Neo4jGraph, names: Sequence[str], timeout: int = 300) -> List[str]:
+    """Wait for the indexes to finish populating.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        names (Sequence[str]): Names of the indexes and constraints to check
+        timeout (int): Seconds to wait
+
+    Returns:
+        List[str]: ``name (state)`` of every index that is not online
+    """
+    try:
+        graph.query("CALL db.awaitIndexes($timeout)", {"timeout": timeout})
+    except Exception as e:
+        print(f"Error waiting for indexes: {e}")
+    # Constraints are backed by an index of the same name
+    result = graph.query(
+        "SHOW INDEXES YIELD name, state WHERE name IN $names RETURN name, state",
+        {"names": list(names)},
+    )
+    return [f"{row['name']} ({row['state']})" for row in result if row["state"] != "ONLINE"]
+
+
+def _operators(plan: Dict[str, Any]) -> Iterator[str]:
+    """Yield the operator names of a plan tree, without the runtime suffix."""
+    yield plan["operatorType"].split("@")[0]
+    for child in plan.get("children", []):
+        yield from _operators(child)
+
+
+def explain(graph: Neo4jGraph, query: str, params: Dict[str, Any]) -> List[str]:
+    """Return the operators the planner picks for a query, without running it."""
+    _, summary, _ = graph._driver.execute_query(
+        f"EXPLAIN {query}", parameters_=params, database_=graph._database
+    )
+    return list(_operators(summary.plan))
+
+
+def verify_query_plans(
+    graph: Neo4jGraph, checks: Sequence[PlanCheck] = PLAN_CHECKS
+) -> Dict[str, str]:
+    """Check that every shipped query uses its indexes.
+
+    A plan regresses when it scans a label or the whole graph, or misses one
+    of the expected operators.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        checks (Sequence[PlanCheck]): Queries to plan
+
+    Returns:
+        Dict[str, str]: The reason per regressed query, empty if none
+    """
+    regressions = {}
+    for check in checks:
+        try:
+            operators = explain(graph, check.query, PLAN_PARAMS)
+        except Exception as e:
+            regressions[check.name] = f"could not be planned: {e}"
+            continue
+        scans = [op for op in operators if op in SCAN_OPERATORS]
+        missing = [
+            expected for expected in check.expected if not any(expected in op for op in operators)
+        ]
+        if scans or missing:
+            regressions[check.name] = (
+                f"scans {scans or 'nothing'}, missing {missing or 'nothing'}, "
+                f"plan: {' <- '.join(operators)}"
+            )
+    return regressions
+
+
+def migrate(
+    graph: Neo4jGraph,
+    vector_dimensions: int = 1536,
+    apply: bool = True,
+    verify: bool = True,
+    timeout: int = 300,
+    strict: bool = True,
+) -> MigrationReport:
+    """Bring the schema up to date and check the query plans.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        vector_dimensions (int): Dimensions of the description embeddings
+        apply (bool): Create the missing constraints and indexes
+        verify (bool): Plan every shipped query with ``EXPLAIN``
+        timeout (int): Seconds to wait for the indexes to come online
+        strict (bool): Raise on offline indexes and plan regressions instead
+            of printing a warning
+
+    Returns:
+        MigrationReport: What was applied and checked
+
+    Raises:
+        SchemaMigrationError: If ``strict`` and an index is not online after ``timeout``
+        SchemaRegressionError: If ``strict`` and a shipped query no longer uses its indexes
+    """
+    migrations = build_migrations(vector_dimensions)
+    report = apply_migrations(graph, migrations) if apply else MigrationReport()
+    report.offline_indexes = await_indexes(graph, [m.name for m in migrations], timeout)
+    if report.offline_indexes:
+        message = f"Indexes not online after {timeout}s: {', '.join(report.offline_indexes)}"
+        if strict:
+            raise SchemaMigrationError(message)
+        print(f"Warning: {message}")
+    if verify:
+        report.plan_regressions = verify_query_plans(graph)
+        if report.plan_regressions:
+            details = "\n".join(
+                f"  {name}: {reason}" for name, reason in report.plan_regressions.items()
+            )
+            if strict:
+                raise SchemaRegressionError(f"Query plans regressed:\n{details}")
+            print(f"Warning: Query plans regressed:\n{details}")
+    return report
+
+
+if __name__ == "__main__":
+    import streamlit as st
+
+    parser = argparse.ArgumentParser(description="Create the schema indexes and check the query plans")
+    parser.add_argument("--check-only", action="store_true", help="Only check the indexes and plans")
+    parser.add_argument("--timeout", type=int, default=300, help="Seconds to wait for the indexes")
+    args = parser.parse_args()
+
+    graph = Neo4jGraph(
+        url=st.secrets["NEO4J_URI"],
+        username=st.secrets["NEO4J_USERNAME"],
+        password=st.secrets["NEO4J_PASSWORD"],
+        refresh_schema=False,
+    )
+    try:
+        report = migrate(
+            graph,
+            vector_dimensions=int(st.secrets.get("VECTOR_DIMENSIONS", 1536)),
+            apply=not args.check_only,
+            timeout=args.timeout,
+        )
+    except (SchemaMigrationError, SchemaRegressionError) as e:
+        print(e)
+        raise SystemExit(1)
+    print(f"Applied {len(report.applied)} migrations, {len(report.failed)} failed")
+    for name, error in report.failed.items():
+        print(f"  {name}: {error}")
+    print(f"All {len(PLAN_CHECKS)} query plans use their indexes")
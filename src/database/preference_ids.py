@@ -0,0 +1,192 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from langchain_neo4j import Neo4jGraph
+
+from src.database.catalog import CatalogSnapshot
+from src.prompts.cypher_prompts import CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE
+
+# Session state list -> (label, parameter of CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE)
+PREFERENCE_LISTS = {
+    "user_movies": ("Movie", "titles"),
+    "user_watched": ("Movie", "titles"),
+    "user_actors": ("Actor", "actors"),
+    "user_genres": ("Genre", "genres"),
+}
+
+# Column of CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE holding the [name, id] pairs per label
+RESULT_COLUMNS = {"Movie": "movies", "Actor": "actors", "Genre": "genres"}
+
+SESSION_STATE_KEY = "preference_resolver"
+
+
+@dataclass(frozen=True)
+class ResolvedPreferences:
+    """Node IDs of the user's preferences, as sets and as query parameters."""
+
+    movie_ids: FrozenSet[str] = frozenset()
+    watched_ids: FrozenSet[str] = frozenset()
+    actor_ids: FrozenSet[str] = frozenset()
+    genre_ids: FrozenSet[str] = frozenset()
+    excluded_ids: FrozenSet[str] = frozenset()
+    # Lists built once per change, so repeated queries reuse the same objects
+    params: Dict[str, List[str]] = field(default_factory=dict)
+    unresolved: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+
+def _ordered_ids(names: Sequence[str], ids: Dict[str, Optional[str]]) -> List[str]:
+    """Return the IDs of the resolved names, in order and without duplicates."""
+    return list(dict.fromkeys(ids[name] for name in names if ids.get(name)))
+
+
+class PreferenceResolver:
+    """Maps the preference lists of one session to internal node IDs.
+
+    Names are looked up once, with an index seek each, and remembered, so a
+    change to a list only looks up the names that were added. As long as the
+    lists do not change, ``resolve`` returns the same result without a query.
+    Names that are not in the graph are looked up again on the next change,
+    and the remembered IDs are dropped when the catalog version changes.
+    """
+
+    def __init__(
+        self,
+        graph_instance: Neo4jGraph,
+        catalog_provider: Optional[Callable[[], CatalogSnapshot]] = None,
+    ):
+        """Initialize the resolver.
+
+        Args:
+            graph_instance (Neo4jGraph): Neo4j graph instance
+            catalog_provider (Callable, optional): Returns the current catalog,
+                whose version invalidates the remembered IDs
+        """
+        self.graph = graph_instance
+        self.catalog_provider = catalog_provider
+        # Name -> node ID per label, only for names found in the graph
+        self._ids: Dict[str, Dict[str, str]] = {label: {} for label in RESULT_COLUMNS}
+        self._catalog_version: Any = None
+        self._fingerprint: Optional[Tuple] = None
+        self._resolved = ResolvedPreferences()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "refreshes": 0,
+            "lookups": 0,
+            "names_looked_up": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _fingerprint_of(lists: Dict[str, Sequence[str]]) -> Tuple:
+        return tuple((key, len(values), hash(tuple(values))) for key, values in lists.items())
+
+    def _check_catalog_version(self) -> None:
+        """Forget the remembered IDs when the catalog changed since they were looked up."""
+        if self.catalog_provider is None:
+            return
+        try:
+            version = self.catalog_provider().version
+        except Exception as e:
+            print(f"Error loading catalog for the preference resolver: {e}")
+            return
+        if version != self._catalog_version:
+            if self._catalog_version is not None:
+                self.stats["invalidations"] += 1
+            self._ids = {label: {} for label in RESULT_COLUMNS}
+            self._fingerprint = None
+            self._catalog_version = version
+
+    def _lookup(self, lists: Dict[str, Sequence[str]]) -> None:
+        """Look up the names not seen before in a single query."""
+        params: Dict[str, set] = {"titles": set(), "actors": set(), "genres": set()}
+        for key, values in lists.items():
+            label, param = PREFERENCE_LISTS[key]
+            known = self._ids[label]
+            params[param].update(value for value in values if value not in known)
+        if not any(params.values()):
+            return
+
+        result = self.graph.query(
+            CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE,
+            {param: list(values) for param, values in params.items()},
+        )
+        record = result[0] if result else {}
+        self.stats["lookups"] += 1
+        self.stats["names_looked_up"] += sum(len(values) for values in params.values())
+        for label, column in RESULT_COLUMNS.items():
+            self._ids[label].update(
+                (name, node_id) for name, node_id in record.get(column) or [] if node_id
+            )
+
+    def resolve(self, session_state: Any) -> ResolvedPreferences:
+        """Return the node IDs of the session's preference lists.
+
+        Args:
+            session_state (st.session_state): Session state holding the lists
+
+        Returns:
+            ResolvedPreferences: IDs of the liked and watched movies, the actors
+                and the genres, and the names that are not in the graph
+        """
+        lists = {key: list(session_state.get(key, []) or []) for key in PREFERENCE_LISTS}
+        fingerprint = self._fingerprint_of(lists)
+        with self._lock:
+            self._check_catalog_version()
+            if fingerprint == self._fingerprint:
+                self.stats["hits"] += 1
+                return self._resolved
+            self._lookup(lists)
+
+            ids = {
+                key: _ordered_ids(values, self._ids[PREFERENCE_LISTS[key][0]])
+                for key, values in lists.items()
+            }
+            excluded = list(dict.fromkeys(ids["user_movies"] + ids["user_watched"]))
+            self._resolved = ResolvedPreferences(
+                movie_ids=frozenset(ids["user_movies"]),
+                watched_ids=frozenset(ids["user_watched"]),
+                actor_ids=frozenset(ids["user_actors"]),
+                genre_ids=frozenset(ids["user_genres"]),
+                excluded_ids=frozenset(excluded),
+                params={
+                    "movie_ids": ids["user_movies"],
+                    "watched_ids": ids["user_watched"],
+                    "actor_ids": ids["user_actors"],
+                    "genre_ids": ids["user_genres"],
+                    "excluded_ids": excluded,
+                },
+                unresolved={
+                    key: tuple(
+                        value for value in values
+                        if self._ids[PREFERENCE_LISTS[key][0]].get(value) is None
+                    )
+                    for key, values in lists.items()
+                },
+            )
+            self._fingerprint = fingerprint
+            self.stats["refreshes"] += 1
+            return self._resolved
+
+
+def get_preference_resolver(
+    graph_instance: Neo4jGraph,
+    session_state: Any,
+    catalog_provider: Optional[Callable[[], CatalogSnapshot]] = None,
+) -> PreferenceResolver:
+    """Return the resolver of a session, creating it on first use.
+
+    Args:
+        graph_instance (Neo4jGraph): Neo4j graph instance
+        session_state (st.session_state): Session state the resolver is kept in
+        catalog_provider (Callable, optional): Returns the current catalog
+
+    Returns:
+        PreferenceResolver: The session's resolver
+    """
+    resolver = session_state.get(SESSION_STATE_KEY)
+    if resolver is None or resolver.graph is not graph_instance:
+        resolver = PreferenceResolver(graph_instance, catalog_provider)
+        session_state[SESSION_STATE_KEY] = resolver
+    return resolver
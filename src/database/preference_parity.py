@@ -0,0 +1,248 @@
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_neo4j import Neo4jGraph
+
+from src.database.graph import graph
+from src.database.preference_ids import PreferenceResolver
+from src.database.preference_snapshot import (
+    PreferenceSnapshot,
+    export_snapshot,
+    preference_snapshot_store,
+)
+from src.database.user_profiles import UserProfileStore, diff_profiles
+from src.prompts.cypher_prompts import (
+    CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+)
+
+# Branches compared by compare_preferences, the *_by_user ones only with a profile
+PARITY_BRANCHES = ("batched", "per_seed", "genre", "actor")
+PROFILE_PARITY_BRANCHES = ("batched_by_user", "genre_by_user", "actor_by_user")
+
+# Prefix of the temporary profiles written by run_parity
+PARITY_PROFILE_PREFIX = "parity-"
+
+
+def sample_preferences(
+    snapshot: PreferenceSnapshot,
+    rng: random.Random,
+    movies: int = 5,
+    watched: int = 20,
+    actors: int = 3,
+    genres: int = 2,
+) -> Dict[str, List[str]]:
+    """Draw random preference lists from the snapshot.
+
+    The actors are drawn from the cast of the liked movies, as a user would
+    pick them, so the actor branch has overlapping candidates to rank.
+
+    Returns:
+        Dict[str, List[str]]: The lists keyed like the session state
+    """
+    liked = rng.sample(snapshot.titles, min(movies, len(snapshot.titles)))
+    cast = sorted({name for title in liked for name in snapshot.neighbourhood(title)[1]})
+    return {
+        "user_movies": liked,
+        "user_watched": rng.sample(snapshot.titles, min(watched, len(snapshot.titles))),
+        "user_actors": rng.sample(cast, min(actors, len(cast))),
+        "user_genres": rng.sample(snapshot.genres, min(genres, len(snapshot.genres))),
+    }
+
+
+def compare_preferences(
+    graph_instance: Neo4jGraph,
+    snapshot: PreferenceSnapshot,
+    preferences: Dict[str, List[str]],
+    limit: int = 10,
+    user_id: Optional[str] = None,
+) -> Dict[str, Tuple[Any, Any]]:
+    """Run the Cypher templates and the snapshot on the same preferences.
+
+    Args:
+        graph_instance (Neo4jGraph): Neo4j graph instance
+        snapshot (PreferenceSnapshot): Snapshot to check
+        preferences (Dict[str, List[str]]): Preference lists keyed like the session state
+        limit (int): Number of movies of the batched branch
+        user_id (str, optional): Profile holding the same lists. When given,
+            the *_BY_USER templates are compared as well
+
+    Returns:
+        Dict[str, Tuple[Any, Any]]: Cypher and snapshot results of the
+            branches that differ, empty if all match
+    """
+    params = PreferenceResolver(graph_instance).resolve(preferences).params
+    liked, watched = preferences["user_movies"], preferences["user_watched"]
+    excluded = [*liked, *watched]
+
+    cypher = {
+        "batched": [
+            {"title": record["RecommendedMovie"], "score": record["score"], "seeds": record["seeds"]}
+            for record in graph_instance.query(
+                CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE,
+                {"movie_ids": params["movie_ids"], "excluded_ids": params["excluded_ids"], "limit": limit},
+            )
+        ],
+        "per_seed": [
+            record["RecommendedMovie"]
+            for movie_id in params["movie_ids"]
+            for record in graph_instance.query(
+                CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+                {"movie_id": movie_id, "excluded_ids": params["excluded_ids"]},
+            )
+        ],
+        "genre": [
+            record["rec.title"]
+            for record in graph_instance.query(
+                CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+                {"genre_ids": params["genre_ids"], "watched_ids": params["watched_ids"]},
+            )
+        ],
+        "actor": [
+            record["rec.title"]
+            for record in graph_instance.query(
+                CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+                {"actor_ids": params["actor_ids"], "watched_ids": params["watched_ids"]},
+            )
+        ],
+    }
+    local = {
+        "batched": snapshot.similar_movies(liked, excluded, limit),
+        "per_seed": snapshot.similar_movies_per_seed(liked, excluded),
+        "genre": snapshot.genre_recommendations(preferences["user_genres"], watched),
+        "actor": snapshot.actor_recommendations(preferences["user_actors"], watched),
+    }
+    branches = PARITY_BRANCHES
+    if user_id is not None:
+        branches += PROFILE_PARITY_BRANCHES
+        cypher["batched_by_user"] = [
+            {"title": record["RecommendedMovie"], "score": record["score"], "seeds": record["seeds"]}
+            for record in graph_instance.query(
+                CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE,
+                {"user_id": user_id, "seed_ids": None, "limit": limit},
+            )
+        ]
+        cypher["genre_by_user"] = [
+            record["rec.title"]
+            for record in graph_instance.query(
+                CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE, {"user_id": user_id}
+            )
+        ]
+        cypher["actor_by_user"] = [
+            record["rec.title"]
+            for record in graph_instance.query(
+                CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE, {"user_id": user_id}
+            )
+        ]
+        local.update(
+            batched_by_user=local["batched"],
+            genre_by_user=local["genre"],
+            actor_by_user=local["actor"],
+        )
+    return {
+        branch: (cypher[branch], local[branch])
+        for branch in branches
+        if cypher[branch] != local[branch]
+    }
+
+
+def run_parity(
+    graph_instance: Neo4jGraph,
+    snapshot: PreferenceSnapshot,
+    samples: int = 50,
+    seed: int = 0,
+    limit: int = 10,
+    max_reported: int = 5,
+    profiles: bool = True,
+) -> Dict[str, Any]:
+    """Compare the Cypher templates and the snapshot on random preference sets.
+
+    With ``profiles``, every preference set is also written to a temporary
+    ``User`` node, deleted afterwards, to compare the *_BY_USER templates.
+
+    Args:
+        graph_instance (Neo4jGraph): Neo4j graph instance
+        snapshot (PreferenceSnapshot): Snapshot to check
+        samples (int): Number of preference sets
+        seed (int): Seed of the random preference sets
+        limit (int): Number of movies of the batched branch
+        max_reported (int): Maximum number of mismatches included in the report
+        profiles (bool): Also compare the templates starting from a User node
+
+    Returns:
+        Dict[str, Any]: Number of samples and mismatching samples, the
+            mismatches per branch and the first mismatches with both results
+    """
+    rng = random.Random(seed)
+    branches = PARITY_BRANCHES + (PROFILE_PARITY_BRANCHES if profiles else ())
+    profile_store = UserProfileStore(graph_instance)
+    report: Dict[str, Any] = {
+        "samples": samples,
+        "mismatching_samples": 0,
+        "branches": {branch: 0 for branch in branches},
+        "examples": [],
+    }
+    for _ in range(samples):
+        preferences = sample_preferences(snapshot, rng)
+        user_id = None
+        if profiles:
+            user_id = PARITY_PROFILE_PREFIX + uuid.uuid4().hex
+            profile_store.apply_changes(user_id, diff_profiles({}, preferences))
+        try:
+            mismatches = compare_preferences(
+                graph_instance, snapshot, preferences, limit, user_id
+            )
+        finally:
+            if user_id is not None:
+                profile_store.delete(user_id)
+        if not mismatches:
+            continue
+        report["mismatching_samples"] += 1
+        for branch, (cypher, local) in mismatches.items():
+            report["branches"][branch] += 1
+            if len(report["examples"]) < max_reported:
+                report["examples"].append(
+                    {"branch": branch, "preferences": preferences, "cypher": cypher, "snapshot": local}
+                )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the preference snapshot ranks like the Cypher templates"
+    )
+    parser.add_argument("--directory", default=preference_snapshot_store.directory)
+    parser.add_argument("--export", action="store_true", help="Export a fresh snapshot first")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument(
+        "--no-profiles", action="store_true", help="Skip the templates starting from a User node"
+    )
+    args = parser.parse_args()
+
+    try:
+        current = None if args.export else PreferenceSnapshot.load(args.directory)
+    except FileNotFoundError:
+        current = None
+    if current is None:
+        current = export_snapshot(graph)
+        current.save(args.directory)
+
+    start = time.perf_counter()
+    result = run_parity(
+        graph, current, args.samples, args.seed, args.limit, profiles=not args.no_profiles
+    )
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["mismatching_samples"] else 0)
@@ -0,0 +1,562 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import streamlit as st
+from langchain_neo4j import Neo4jGraph
+
+from src.database.graph import graph
+
+SNAPSHOT_FILE = "snapshot.json"
+ADJACENCY_FILE = "adjacency.npz"
+
+_MOVIE_COLUMNS = """
+RETURN m.title AS title,
+    [(m)-[:IN_GENRE]->(g:Genre) | g.genre] AS genres,
+    [(a:Actor)-[:ACTED_IN]->(m) | a.actorName] AS actors
+"""
+
+SNAPSHOT_MOVIES_QUERY = (
+    "MATCH (m:Movie)" + _MOVIE_COLUMNS + "ORDER BY m.title\nSKIP $skip LIMIT $limit\n"
+)
+
+# Title -> (genre names, actor names)
+Neighbourhoods = Dict[str, Tuple[List[str], List[str]]]
+
+
+def _signature(genres: Sequence[str], actors: Sequence[str]) -> Tuple[int, int]:
+    """Return the change signature of a movie: a 128-bit digest of its sorted names."""
+    digest = hashlib.blake2b(digest_size=16)
+    for names in (genres, actors):
+        for name in sorted(name or "" for name in names):
+            digest.update(name.encode("utf-8"))
+            digest.update(b"\x00")
+        digest.update(b"\x01")
+    high, low = np.frombuffer(digest.digest(), dtype=np.int64).tolist()
+    return high, low
+
+
+def _pack(
+    rows: Sequence[Sequence[str]], index: Dict[str, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack the names of every row into CSR arrays, without duplicates per row."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indices: List[int] = []
+    for position, names in enumerate(rows):
+        indices.extend(sorted({index[name] for name in names if name is not None}))
+        indptr[position + 1] = len(indices)
+    return indptr, np.asarray(indices, dtype=np.int32)
+
+
+def _transpose(
+    indptr: np.ndarray, indices: np.ndarray, n_columns: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the CSR arrays of the transposed adjacency."""
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    transposed_indptr = np.zeros(n_columns + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_columns), out=transposed_indptr[1:])
+    return transposed_indptr, rows[order]
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, rows: Iterable[int]) -> np.ndarray:
+    """Concatenate the columns of the given rows."""
+    parts = [indices[indptr[row] : indptr[row + 1]] for row in rows]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+
+class PreferenceSnapshot:
+    """Movie-genre and movie-actor adjacency in CSR arrays, scored like the preference templates.
+
+    Movies are numbered in title order, so ``ORDER BY score DESC, m.title``
+    becomes a sort on the score and the movie number. Python orders strings
+    like Cypher except for characters outside the Basic Multilingual Plane.
+    """
+
+    def __init__(
+        self,
+        titles: List[str],
+        genres: List[str],
+        actors: List[str],
+        movie_genres: Tuple[np.ndarray, np.ndarray],
+        movie_actors: Tuple[np.ndarray, np.ndarray],
+        signatures: np.ndarray,
+        created_at: Optional[float] = None,
+    ):
+        """Wrap exported arrays. Use ``from_neighbourhoods`` or ``load`` to build one.
+
+        Args:
+            titles (List[str]): Movie titles in sorted order
+            genres (List[str]): Genre names
+            actors (List[str]): Actor names
+            movie_genres (Tuple[np.ndarray, np.ndarray]): CSR indptr and genre indices per movie
+            movie_actors (Tuple[np.ndarray, np.ndarray]): CSR indptr and actor indices per movie
+            signatures (np.ndarray): Change signature of every movie
+            created_at (float, optional): Time of the export
+        """
+        self.titles = titles
+        self.genres = genres
+        self.actors = actors
+        self.movie_genres = movie_genres
+        self.movie_actors = movie_actors
+        self.signatures = signatures
+        self.created_at = created_at or time.time()
+        self.genre_movies = _transpose(*movie_genres, len(genres))
+        self.actor_movies = _transpose(*movie_actors, len(actors))
+        self.title_index = {title: position for position, title in enumerate(titles)}
+        self.genre_index = {name: position for position, name in enumerate(genres)}
+        self.actor_index = {name: position for position, name in enumerate(actors)}
+
+    @classmethod
+    def from_neighbourhoods(
+        cls,
+        rows: Neighbourhoods,
+        signatures: Dict[str, Tuple[int, int]],
+        created_at: Optional[float] = None,
+    ) -> "PreferenceSnapshot":
+        """Build a snapshot from the genre and actor names of every movie."""
+        titles = sorted(rows)
+        genres = sorted({name for g, _ in rows.values() for name in g if name is not None})
+        actors = sorted({name for _, a in rows.values() for name in a if name is not None})
+        genre_index = {name: position for position, name in enumerate(genres)}
+        actor_index = {name: position for position, name in enumerate(actors)}
+        return cls(
+            titles,
+            genres,
+            actors,
+            _pack([rows[title][0] for title in titles], genre_index),
+            _pack([rows[title][1] for title in titles], actor_index),
+            np.asarray([signatures[title] for title in titles], dtype=np.int64).reshape(-1, 2),
+            created_at,
+        )
+
+    def _neighbourhood(self, movie: int) -> Tuple[List[str], List[str]]:
+        (genre_indptr, genre_indices), (actor_indptr, actor_indices) = (
+            self.movie_genres,
+            self.movie_actors,
+        )
+        return (
+            [self.genres[g] for g in genre_indices[genre_indptr[movie] : genre_indptr[movie + 1]]],
+            [self.actors[a] for a in actor_indices[actor_indptr[movie] : actor_indptr[movie + 1]]],
+        )
+
+    def neighbourhood(self, title: str) -> Tuple[List[str], List[str]]:
+        """Return the genre and actor names of a movie, empty if it is unknown."""
+        movie = self.title_index.get(title)
+        return self._neighbourhood(movie) if movie is not None else ([], [])
+
+    def neighbourhoods(self) -> Neighbourhoods:
+        """Return the genre and actor names of every movie."""
+        return {title: self._neighbourhood(movie) for movie, title in enumerate(self.titles)}
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    @staticmethod
+    def _positions(names: Iterable[str], index: Dict[str, int]) -> List[int]:
+        """Return the positions of the known names, in order and without duplicates."""
+        return list(dict.fromkeys(index[name] for name in names if name in index))
+
+    def _excluded(self, titles: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(len(self.titles), dtype=bool)
+        mask[self._positions(titles, self.title_index)] = True
+        return mask
+
+    def _top(self, candidates: np.ndarray, scores: np.ndarray, limit: int) -> np.ndarray:
+        """Return the candidates with the highest score, ties broken by title."""
+        order = np.lexsort((candidates, -scores))
+        return candidates[order[:limit]]
+
+    def _seed_scores(self, seed: int, excluded: np.ndarray, min_actors: int) -> np.ndarray:
+        """Score every movie against one seed with 2 * shared genres + shared actors.
+
+        Movies sharing no genre with the seed, the seed and excluded movies score 0.
+        """
+        n = len(self.titles)
+        genre_indptr, genre_indices = self.movie_genres
+        actor_indptr, actor_indices = self.movie_actors
+        shared_genres = np.bincount(
+            _gather(*self.genre_movies, genre_indices[genre_indptr[seed] : genre_indptr[seed + 1]]),
+            minlength=n,
+        )
+        shared_actors = np.bincount(
+            _gather(*self.actor_movies, actor_indices[actor_indptr[seed] : actor_indptr[seed + 1]]),
+            minlength=n,
+        )
+        shared_genres[seed] = 0
+        shared_genres[excluded] = 0
+        return np.where(
+            shared_genres > 0, 2 * shared_genres + np.maximum(shared_actors, min_actors), 0
+        )
+
+    def similar_movies(
+        self, liked: Sequence[str], excluded: Iterable[str], limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Score movies against all liked movies, like the batched similarity templates.
+
+        Args:
+            liked (Sequence[str]): Titles of the seed movies
+            excluded (Iterable[str]): Titles left out of the results
+            limit (int): Number of movies to return
+
+        Returns:
+            List[Dict[str, Any]]: Records with the title, the summed score and
+                the per-seed scores, best first
+        """
+        blocked = self._excluded(excluded)
+        total = np.zeros(len(self.titles), dtype=np.int64)
+        per_seed: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        for seed in self._positions(liked, self.title_index):
+            scores = self._seed_scores(seed, blocked, min_actors=0)
+            candidates = np.flatnonzero(scores)
+            total[candidates] += scores[candidates]
+            per_seed.append((seed, candidates, scores[candidates]))
+
+        candidates = np.flatnonzero(total)
+        top = self._top(candidates, total[candidates], limit)
+        seeds: Dict[int, List[Tuple[int, str]]] = {int(movie): [] for movie in top}
+        for seed, seed_candidates, seed_scores in per_seed:
+            positions = np.searchsorted(seed_candidates, top)
+            for movie, position in zip(top, positions):
+                if position < len(seed_candidates) and seed_candidates[position] == movie:
+                    seeds[int(movie)].append((int(seed_scores[position]), self.titles[seed]))
+        return [
+            {
+                "title": self.titles[movie],
+                "score": int(total[movie]),
+                "seeds": [
+                    {"seed": seed, "score": score}
+                    for score, seed in sorted(seeds[int(movie)], key=lambda s: (-s[0], s[1]))
+                ],
+            }
+            for movie in top
+        ]
+
+    def similar_movies_per_seed(
+        self, liked: Sequence[str], excluded: Iterable[str], limit: int = 5
+    ) -> List[str]:
+        """Return the top movies of every liked movie in turn, like the per-seed template.
+
+        A candidate without shared actors counts one, as the template counts
+        its "No Actor" placeholder.
+        """
+        blocked = self._excluded(excluded)
+        titles = []
+        for seed in self._positions(liked, self.title_index):
+            scores = self._seed_scores(seed, blocked, min_actors=1)
+            candidates = np.flatnonzero(scores)
+            titles.extend(self.titles[movie] for movie in self._top(candidates, scores[candidates], limit))
+        return titles
+
+    def _match_count(
+        self,
+        names: Iterable[str],
+        index: Dict[str, int],
+        adjacency: Tuple[np.ndarray, np.ndarray],
+        watched: Iterable[str],
+        limit: int,
+    ) -> List[str]:
+        counts = np.bincount(
+            _gather(*adjacency, self._positions(names, index)), minlength=len(self.titles)
+        )
+        counts[self._excluded(watched)] = 0
+        candidates = np.flatnonzero(counts)
+        return [self.titles[movie] for movie in self._top(candidates, counts[candidates], limit)]
+
+    def genre_recommendations(
+        self, genres: Iterable[str], watched: Iterable[str], limit: int = 5
+    ) -> List[str]:
+        """Rank movies by the number of the given genres they are in, like the genre template."""
+        return self._match_count(genres, self.genre_index, self.genre_movies, watched, limit)
+
+    def actor_recommendations(
+        self, actors: Iterable[str], watched: Iterable[str], limit: int = 5
+    ) -> List[str]:
+        """Rank movies by the number of the given actors in their cast, like the actor template."""
+        return self._match_count(actors, self.actor_index, self.actor_movies, watched, limit)
+
+    def save(self, directory: str) -> None:
+        """Write the snapshot to a directory, replacing a previous one."""
+        os.makedirs(directory, exist_ok=True)
+        adjacency_path = os.path.join(directory, ADJACENCY_FILE)
+        with open(adjacency_path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                movie_genres_indptr=self.movie_genres[0],
+                movie_genres_indices=self.movie_genres[1],
+                movie_actors_indptr=self.movie_actors[0],
+                movie_actors_indices=self.movie_actors[1],
+                signatures=self.signatures,
+            )
+        os.replace(adjacency_path + ".tmp", adjacency_path)
+        snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        with open(snapshot_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "created_at": self.created_at,
+                    "titles": self.titles,
+                    "genres": self.genres,
+                    "actors": self.actors,
+                },
+                f,
+            )
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+
+    @classmethod
+    def load(cls, directory: str) -> "PreferenceSnapshot":
+        """Read a snapshot written by ``save``."""
+        with open(os.path.join(directory, SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(directory, ADJACENCY_FILE))
+        if len(arrays["movie_genres_indptr"]) != len(meta["titles"]) + 1:
+            raise ValueError(f"Adjacency in {directory} does not match the snapshot file")
+        return cls(
+            meta["titles"],
+            meta["genres"],
+            meta["actors"],
+            (arrays["movie_genres_indptr"], arrays["movie_genres_indices"]),
+            (arrays["movie_actors_indptr"], arrays["movie_actors_indices"]),
+            arrays["signatures"],
+            meta["created_at"],
+        )
+
+
+def _read_neighbourhoods(
+    result: List[Dict[str, Any]], rows: Neighbourhoods, signatures: Dict[str, Tuple]
+) -> None:
+    for record in result:
+        genres, actors = list(record["genres"] or []), list(record["actors"] or [])
+        rows[record["title"]] = (genres, actors)
+        signatures[record["title"]] = _signature(genres, actors)
+
+
+def export_snapshot(graph: Neo4jGraph, batch_size: int = 2000) -> PreferenceSnapshot:
+    """Read the genres and actors of every movie into a snapshot.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        batch_size (int): Number of movies fetched per query
+
+    Returns:
+        PreferenceSnapshot: The snapshot
+    """
+    created_at = time.time()
+    rows: Neighbourhoods = {}
+    signatures: Dict[str, Tuple] = {}
+    skip = 0
+    while True:
+        result = graph.query(SNAPSHOT_MOVIES_QUERY, {"skip": skip, "limit": batch_size})
+        _read_neighbourhoods(result, rows, signatures)
+        if len(result) < batch_size:
+            break
+        skip += batch_size
+    return PreferenceSnapshot.from_neighbourhoods(rows, signatures, created_at)
+
+
+def refresh_snapshot(
+    graph: Neo4jGraph, snapshot: PreferenceSnapshot, batch_size: int = 2000
+) -> Tuple[PreferenceSnapshot, int]:
+    """Bring a snapshot up to date with the movies that changed.
+
+    The genre and actor names of every movie are read in pages and hashed,
+    and the digests are compared with the snapshot. The arrays are rebuilt
+    only when a movie was added, changed or deleted.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        snapshot (PreferenceSnapshot): Snapshot to refresh
+        batch_size (int): Number of movies fetched per query
+
+    Returns:
+        Tuple[PreferenceSnapshot, int]: The refreshed snapshot, the same
+            object if nothing changed, and the number of changed movies
+    """
+    created_at = time.time()
+    stored = {
+        title: tuple(signature)
+        for title, signature in zip(snapshot.titles, snapshot.signatures.tolist())
+    }
+    current: Dict[str, Tuple] = {}
+    changed: Neighbourhoods = {}
+    skip = 0
+    while True:
+        result = graph.query(SNAPSHOT_MOVIES_QUERY, {"skip": skip, "limit": batch_size})
+        _read_neighbourhoods(result, changed, current)
+        for record in result:
+            if stored.get(record["title"]) == current[record["title"]]:
+                del changed[record["title"]]
+        if len(result) < batch_size:
+            break
+        skip += batch_size
+
+    removed = [title for title in stored if title not in current]
+    if not changed and not removed:
+        snapshot.created_at = created_at
+        return snapshot, 0
+
+    rows = snapshot.neighbourhoods()
+    for title in removed:
+        rows.pop(title, None)
+    rows.update(changed)
+    signatures = {title: current[title] for title in rows}
+    return (
+        PreferenceSnapshot.from_neighbourhoods(rows, signatures, created_at),
+        len(changed) + len(removed),
+    )
+
+
+class PreferenceSnapshotStore:
+    """Keeps the preference snapshot in memory and on disk, refreshed in the background.
+
+    The first ``get`` loads the snapshot from disk, or exports it when there
+    is none, so a restart does not depend on Neo4j. Once the snapshot is
+    older than ``refresh_interval``, ``get`` starts a delta refresh in a
+    background thread and keeps returning the current snapshot meanwhile.
+    """
+
+    def __init__(
+        self,
+        graph_instance: Neo4jGraph,
+        directory: str = ".cache/preference_snapshot",
+        refresh_interval: float = 300.0,
+        batch_size: int = 2000,
+        enabled: bool = True,
+    ):
+        """Initialize the store.
+
+        Args:
+            graph_instance (Neo4jGraph): Neo4j graph instance
+            directory (str): Directory the snapshot is saved in
+            refresh_interval (float): Seconds after which the snapshot is refreshed
+            batch_size (int): Number of movies fetched per query
+            enabled (bool): Whether a snapshot is kept at all
+        """
+        self.graph = graph_instance
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._snapshot: Optional[PreferenceSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        # A failed export is retried after refresh_interval, not on every request
+        self._retry_at = 0.0
+        self.stats = {"exports": 0, "loads": 0, "refreshes": 0, "movies_refreshed": 0, "errors": 0}
+
+    def _load_or_export(self) -> Optional[PreferenceSnapshot]:
+        try:
+            snapshot = PreferenceSnapshot.load(self.directory)
+            self.stats["loads"] += 1
+            return snapshot
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading preference snapshot: {e}")
+        try:
+            snapshot = export_snapshot(self.graph, self.batch_size)
+            snapshot.save(self.directory)
+            self.stats["exports"] += 1
+            return snapshot
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Error exporting preference snapshot: {e}")
+            return None
+
+    def get(self) -> Optional[PreferenceSnapshot]:
+        """Return the current snapshot, None if it is disabled or could not be built."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._snapshot is None and time.time() >= self._retry_at:
+                self._snapshot = self._load_or_export()
+                if self._snapshot is None:
+                    self._retry_at = time.time() + self.refresh_interval
+            snapshot = self._snapshot
+            if (
+                snapshot is not None
+                and time.time() - snapshot.created_at > self.refresh_interval
+                and (self._refresh_thread is None or not self._refresh_thread.is_alive())
+            ):
+                self._refresh_thread = threading.Thread(
+                    target=self.refresh, name="preference-snapshot-refresh", daemon=True
+                )
+                self._refresh_thread.start()
+        return snapshot
+
+    def refresh(self) -> int:
+        """Apply the changes in the graph to the snapshot and save it.
+
+        Returns:
+            int: Number of changed movies
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return 0
+        try:
+            refreshed, changed = refresh_snapshot(self.graph, snapshot, self.batch_size)
+            if changed:
+                refreshed.save(self.directory)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Error refreshing preference snapshot: {e}")
+            return 0
+        with self._lock:
+            self._snapshot = refreshed
+            self.stats["refreshes"] += 1
+            self.stats["movies_refreshed"] += changed
+        return changed
+
+    def warm_up(self) -> "PreferenceSnapshotStore":
+        """Load or export the snapshot ahead of the first request."""
+        self.get()
+        return self
+
+    def get_stats(self) -> dict:
+        """Return the counters and the size and age of the current snapshot."""
+        stats = dict(self.stats)
+        snapshot = self._snapshot
+        stats["movies"] = len(snapshot) if snapshot is not None else 0
+        stats["age_seconds"] = (
+            round(time.time() - snapshot.created_at, 1) if snapshot is not None else None
+        )
+        return stats
+
+
+# Create the preference snapshot shared by all sessions
+preference_snapshot_store = PreferenceSnapshotStore(
+    graph_instance=graph,
+    directory=st.secrets.get("PREFERENCE_SNAPSHOT_DIR", ".cache/preference_snapshot"),
+    refresh_interval=float(st.secrets.get("PREFERENCE_SNAPSHOT_REFRESH_SECONDS", 300)),
+    enabled=str(st.secrets.get("PREFERENCE_SNAPSHOT_ENABLED", True)).lower() not in ("false", "0"),
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export or refresh the movie-genre and movie-actor snapshot"
+    )
+    parser.add_argument("--directory", default=preference_snapshot_store.directory)
+    parser.add_argument("--full", action="store_true", help="Export every movie again")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        current = None if args.full else PreferenceSnapshot.load(args.directory)
+    except FileNotFoundError:
+        current = None
+    if current is None:
+        current, changed = export_snapshot(graph, args.batch_size), None
+    else:
+        current, changed = refresh_snapshot(graph, current, args.batch_size)
+    current.save(args.directory)
+    action = "Exported" if changed is None else f"Refreshed {changed} changed movies,"
+    print(
+        f"{action} {len(current)} movies, {len(current.genres)} genres and "
+        f"{len(current.actors)} actors to {args.directory} in {time.perf_counter() - start:.1f}s"
+    )
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain_neo4j import Neo4jGraph
+
+# Bump when the pruning or the rendering changes, so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 2
+
+# Labels of the chat history and the user profiles, never queried by generated Cypher
+EXCLUDED_LABELS = {"Session", "Message", "User"}
+EXCLUDED_PROPERTY_TYPES = {"LIST"}
+EXCLUDED_PROPERTY_FRAGMENTS = ("embedding",)
+
+# Names only come from the token stores, so this is cheap on any database size
+SCHEMA_FINGERPRINT_QUERY = """
+CALL db.labels() YIELD label
+WITH collect(label) AS labels
+CALL db.relationshipTypes() YIELD relationshipType
+WITH labels, collect(relationshipType) AS types
+CALL db.propertyKeys() YIELD propertyKey
+RETURN labels, types, collect(propertyKey) AS keys
+"""
+
+
+@dataclass
+class SchemaSnapshot:
+    """Pruned graph schema saved to disk, with the fingerprint it was built for."""
+
+    version: int
+    fingerprint: str
+    structured_schema: Dict[str, Any]
+    schema: str
+    format: int = SNAPSHOT_FORMAT
+    created_at: float = field(default_factory=time.time)
+
+
+def schema_fingerprint(graph: Neo4jGraph) -> str:
+    """Hash the label, relationship type and property key names of the database.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+
+    Returns:
+        str: Hex digest that changes whenever a name is added or removed
+    """
+    row = graph.query(SCHEMA_FINGERPRINT_QUERY)[0]
+    parts = [
+        f"{len(row['labels'])} labels",
+        *sorted(row["labels"]),
+        f"{len(row['types'])} types",
+        *sorted(row["types"]),
+        f"{len(row['keys'])} keys",
+        *sorted(row["keys"]),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _keep_property(prop: Dict[str, Any]) -> bool:
+    name = prop["property"].lower()
+    return prop.get("type") not in EXCLUDED_PROPERTY_TYPES and not any(
+        fragment in name for fragment in EXCLUDED_PROPERTY_FRAGMENTS
+    )
+
+
+def prune_schema(structured_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop what generated Cypher never needs from a structured schema.
+
+    Removes the chat history and user profile labels, embedding and list
+    properties, and the index and constraint metadata.
+
+    Args:
+        structured_schema (Dict[str, Any]): Schema as returned by ``Neo4jGraph``
+
+    Returns:
+        Dict[str, Any]: Pruned schema in the same layout
+    """
+    node_props = {
+        label: [
+            {"property": prop["property"], "type": prop.get("type")}
+            for prop in props
+            if _keep_property(prop)
+        ]
+        for label, props in structured_schema.get("node_props", {}).items()
+        if label not in EXCLUDED_LABELS
+    }
+    rel_props = {
+        rel_type: [
+            {"property": prop["property"], "type": prop.get("type")}
+            for prop in props
+            if _keep_property(prop)
+        ]
+        for rel_type, props in structured_schema.get("rel_props", {}).items()
+    }
+    relationships = [
+        rel
+        for rel in structured_schema.get("relationships", [])
+        if rel["start"] not in EXCLUDED_LABELS and rel["end"] not in EXCLUDED_LABELS
+    ]
+    return {
+        "node_props": node_props,
+        "rel_props": {rel_type: props for rel_type, props in rel_props.items() if props},
+        "relationships": relationships,
+        "metadata": {"constraint": [], "index": []},
+    }
+
+
+def _format_properties(props: List[Dict[str, Any]]) -> str:
+    """Render properties as ``name`` for strings and ``name: TYPE`` otherwise."""
+    return ", ".join(
+        prop["property"] if prop.get("type") == "STRING" else f"{prop['property']}: {prop['type']}"
+        for prop in props
+    )
+
+
+def format_compact_schema(structured_schema: Dict[str, Any]) -> str:
+    """Render a schema with only what ``CYPHER_GENERATION_TEMPLATE`` uses.
+
+    Lists each label with its property names, the relationship properties and
+    the relationship patterns. Properties are strings unless a type is given.
+
+    Args:
+        structured_schema (Dict[str, Any]): Pruned structured schema
+
+    Returns:
+        str: Schema text for the Cypher generation prompt
+    """
+    lines = ["Nodes (properties are STRING unless typed):"]
+    for label, props in sorted(structured_schema["node_props"].items()):
+        lines.append(f"{label} {{{_format_properties(props)}}}")
+    if structured_schema["rel_props"]:
+        lines.append("Relationship properties:")
+        for rel_type, props in sorted(structured_schema["rel_props"].items()):
+            lines.append(f"{rel_type} {{{_format_properties(props)}}}")
+    lines.append("Relationships:")
+    for rel in sorted(
+        structured_schema["relationships"], key=lambda r: (r["start"], r["type"], r["end"])
+    ):
+        lines.append(f"(:{rel['start']})-[:{rel['type']}]->(:{rel['end']})")
+    return "\n".join(lines)
+
+
+def load_snapshot(path: str) -> Optional[SchemaSnapshot]:
+    """Read a snapshot from disk, None if it is missing, unreadable or outdated."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != SNAPSHOT_FORMAT:
+            return None
+        return SchemaSnapshot(**data)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading schema snapshot: {e}")
+        return None
+
+
+def save_snapshot(snapshot: SchemaSnapshot, path: str) -> None:
+    """Write a snapshot to disk atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(asdict(snapshot), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_snapshot(
+    graph: Neo4jGraph, fingerprint: str, previous: Optional[SchemaSnapshot] = None
+) -> SchemaSnapshot:
+    """Introspect the database and build a new snapshot.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        fingerprint (str): Fingerprint of the database being introspected
+        previous (SchemaSnapshot, optional): Snapshot being replaced
+
+    Returns:
+        SchemaSnapshot: The new snapshot, one version above the previous one
+    """
+    graph.refresh_schema()
+    structured_schema = prune_schema(graph.get_structured_schema)
+    return SchemaSnapshot(
+        version=(previous.version + 1) if previous else 1,
+        fingerprint=fingerprint,
+        structured_schema=structured_schema,
+        schema=format_compact_schema(structured_schema),
+    )
+
+
+def apply_schema_snapshot(
+    graph: Neo4jGraph, path: str = ".cache/graph_schema.json", rebuild: bool = False
+) -> Optional[SchemaSnapshot]:
+    """Set the schema of a graph from the snapshot on disk.
+
+    The snapshot is used as long as its fingerprint matches the database.
+    Otherwise the schema is introspected once and the snapshot rewritten.
+    Use it with a graph created with ``refresh_schema=False``.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        path (str): Path of the snapshot file
+        rebuild (bool): Introspect even if the snapshot is current
+
+    Returns:
+        SchemaSnapshot: The snapshot in use, None if none could be built
+    """
+    snapshot = load_snapshot(path)
+    try:
+        fingerprint = schema_fingerprint(graph)
+    except Exception as e:
+        print(f"Error fingerprinting the graph schema: {e}")
+        fingerprint = None
+
+    if rebuild or snapshot is None or (fingerprint and snapshot.fingerprint != fingerprint):
+        try:
+            snapshot = build_snapshot(graph, fingerprint or "", previous=snapshot)
+            save_snapshot(snapshot, path)
+        except Exception as e:
+            print(f"Error building the schema snapshot: {e}")
+            if snapshot is None:
+                return None
+
+    graph.structured_schema = snapshot.structured_schema
+    graph.schema = snapshot.schema
+    return snapshot
+
+
+if __name__ == "__main__":
+    import streamlit as st
+
+    parser = argparse.ArgumentParser(description="Rebuild or show the graph schema snapshot")
+    parser.add_argument("--path", default=st.secrets.get("SCHEMA_SNAPSHOT_PATH", ".cache/graph_schema.json"))
+    parser.add_argument("--rebuild", action="store_true", help="Introspect even if the snapshot is current")
+    args = parser.parse_args()
+
+    graph = Neo4jGraph(
+        url=st.secrets["NEO4J_URI"],
+        username=st.secrets["NEO4J_USERNAME"],
+        password=st.secrets["NEO4J_PASSWORD"],
+        refresh_schema=False,
+    )
+    snapshot = apply_schema_snapshot(graph, args.path, rebuild=args.rebuild)
+    if snapshot is None:
+        print("No schema snapshot available")
+    else:
+        print(f"Schema snapshot v{snapshot.version} ({snapshot.fingerprint[:12]})")
+        print(snapshot.schema)
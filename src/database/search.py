@@ -0,0 +1,223 @@
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from src.chat.embedding_cache import normalize_text
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the character trigrams of a normalized text, padded at word boundaries."""
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TypeaheadIndex:
+    """In-memory prefix and fuzzy search over a list of names.
+
+    Every word start of every name is kept in a sorted list, so the names
+    containing a word beginning with the typed text are found with a binary
+    search. When nothing matches, names are ranked by the trigram similarity
+    to the query instead, which tolerates typos.
+    """
+
+    def __init__(self, values: Sequence[str], min_similarity: float = 0.4, max_scan: int = 2000):
+        """Build the index.
+
+        Args:
+            values (Sequence[str]): Names to search
+            min_similarity (float): Minimum Dice coefficient of a fuzzy match
+            max_scan (int): Maximum prefix matches ranked per query
+        """
+        self.values = tuple(values)
+        self.min_similarity = min_similarity
+        self.max_scan = max_scan
+        self._normalized = [normalize_text(value) for value in self.values]
+        # First value of every value and normalized text, for exact lookups
+        self._ids: Dict[str, int] = {}
+        self._exact: Dict[str, int] = {}
+        for value_id, text in enumerate(self._normalized):
+            self._ids.setdefault(self.values[value_id], value_id)
+            self._exact.setdefault(text, value_id)
+
+        # (text from a word start to the end, position of that word, value id)
+        suffixes: List[Tuple[str, int, int]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._trigram_counts: List[int] = []
+        for value_id, text in enumerate(self._normalized):
+            words = text.split(" ")
+            offset = 0
+            for position, word in enumerate(words):
+                suffixes.append((text[offset:], position, value_id))
+                offset += len(word) + 1
+            grams = trigrams(text)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(value_id)
+        suffixes.sort()
+        self._keys = [key for key, _, _ in suffixes]
+        self._entries = [(position, value_id) for _, position, value_id in suffixes]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _prefix_matches(self, query: str) -> List[int]:
+        """Return the ids of the names with a word starting with ``query``, best first."""
+        best: Dict[int, int] = {}
+        start = bisect_left(self._keys, query)
+        for i in range(start, min(start + self.max_scan, len(self._keys))):
+            if not self._keys[i].startswith(query):
+                break
+            position, value_id = self._entries[i]
+            best[value_id] = min(position, best.get(value_id, position))
+        # Matches at the start of the name first, then shorter names
+        return sorted(best, key=lambda v: (best[v], len(self._normalized[v]), self._normalized[v]))
+
+    def _fuzzy_matches(
+        self, query: str, limit: int, min_similarity: Optional[float] = None
+    ) -> List[int]:
+        """Return the ids of the names most similar to ``query`` by trigram overlap."""
+        if min_similarity is None:
+            min_similarity = self.min_similarity
+        grams = trigrams(query)
+        overlap: Counter = Counter()
+        for gram in grams:
+            overlap.update(self._postings.get(gram, ()))
+        scored = []
+        for value_id, shared in overlap.items():
+            similarity = 2 * shared / (len(grams) + self._trigram_counts[value_id])
+            if similarity >= min_similarity:
+                scored.append((-similarity, len(self._normalized[value_id]), value_id))
+        scored.sort()
+        return [value_id for _, _, value_id in scored[:limit]]
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """Return up to ``limit`` names matching the typed text.
+
+        Args:
+            query (str): Typed text
+            limit (int): Maximum number of names returned
+
+        Returns:
+            List[str]: Prefix matches, or fuzzy matches when there are none
+        """
+        query = normalize_text(query)
+        if not query:
+            return []
+        ids = self._prefix_matches(query)[:limit]
+        if not ids and len(query) >= 3:
+            ids = self._fuzzy_matches(query, limit)
+        return [self.values[value_id] for value_id in ids]
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Return the name equal to ``name`` up to case and spacing, None if there is none."""
+        value_id = self._ids.get(name)
+        if value_id is None:
+            value_id = self._exact.get(normalize_text(name))
+        return None if value_id is None else self.values[value_id]
+
+    def closest(self, name: str, min_similarity: float) -> Optional[str]:
+        """Return the most similar name by trigram overlap, None if none is similar enough."""
+        query = normalize_text(name)
+        ids = self._fuzzy_matches(query, 1, min_similarity) if len(query) >= 3 else []
+        return self.values[ids[0]] if ids else None
+
+
+@dataclass
+class NameMatches:
+    """Names of an imported list, matched against a catalog list."""
+
+    matched: List[str] = field(default_factory=list)
+    # (given name, catalog name) of the names only matched by similarity
+    fuzzy: List[Tuple[str, str]] = field(default_factory=list)
+    unknown: List[str] = field(default_factory=list)
+    # Names without an exact match left over once the fuzzy budget was spent
+    unchecked: List[str] = field(default_factory=list)
+
+
+class CatalogSearch:
+    """Typeahead indexes over the lists of a catalog snapshot.
+
+    An index is rebuilt only when the snapshot list it was built from is
+    replaced, which the catalog service does only when the catalog changed.
+    """
+
+    FIELDS = ("movie_titles", "genre_names", "actor_names")
+
+    def __init__(self, snapshot_provider: Callable[[], object]):
+        """Initialize the search.
+
+        Args:
+            snapshot_provider (Callable[[], CatalogSnapshot]): Returns the current snapshot
+        """
+        self.snapshot_provider = snapshot_provider
+        self._indexes: Dict[str, TypeaheadIndex] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, field: str) -> TypeaheadIndex:
+        """Return the index of a snapshot list, building it if the list changed."""
+        values = getattr(self.snapshot_provider(), field)
+        index = self._indexes.get(field)
+        if index is not None and index.values is values:
+            return index
+        with self._lock:
+            index = self._indexes.get(field)
+            if index is None or index.values is not values:
+                index = self._indexes[field] = TypeaheadIndex(values)
+            return index
+
+    def search(self, field: str, query: str, limit: int = 10) -> List[str]:
+        """Return up to ``limit`` values of a snapshot list matching the typed text."""
+        return self.get_index(field).search(query, limit)
+
+    def match(
+        self,
+        field: str,
+        names: Iterable[str],
+        min_similarity: float = 0.75,
+        max_fuzzy: int = 1000,
+    ) -> NameMatches:
+        """Match many names against a snapshot list at once.
+
+        Names are matched up to case and spacing first. Only the names left
+        over are compared by trigram similarity, at most ``max_fuzzy`` of them.
+        The rest are reported as unchecked rather than unknown.
+
+        Args:
+            field (str): Snapshot list, one of FIELDS
+            names (Iterable[str]): Names to match
+            min_similarity (float): Minimum Dice coefficient of a fuzzy match
+            max_fuzzy (int): Maximum number of names compared by similarity
+
+        Returns:
+            NameMatches: The catalog names found, in order and without
+                duplicates, the fuzzy matches, the unknown names and the
+                names not compared by similarity
+        """
+        index = self.get_index(field)
+        matches = NameMatches()
+        found: Dict[str, None] = {}
+        fuzzy_left = max_fuzzy
+        for name in names:
+            value = index.lookup(name)
+            if value is None:
+                if fuzzy_left <= 0:
+                    matches.unchecked.append(name)
+                    continue
+                fuzzy_left -= 1
+                value = index.closest(name, min_similarity)
+                if value is not None:
+                    matches.fuzzy.append((name, value))
+            if value is None:
+                matches.unknown.append(name)
+            else:
+                found.setdefault(value)
+        matches.matched = list(found)
+        return matches
+
+    def warm_up(self) -> "CatalogSearch":
+        """Build the indexes of every list."""
+        for field in self.FIELDS:
+            self.get_index(field)
+        return self
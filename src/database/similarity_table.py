@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set
+
+from langchain_neo4j import Neo4jGraph
+
+# Scores every movie sharing a genre with the seed: shared genres * 2 + shared actors.
+# Same scoring function as CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_TEMPLATE.
+COMPUTE_SIMILAR_MOVIES_QUERY = """
+UNWIND $titles AS seedTitle
+MATCH (target:Movie {title: seedTitle})-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m:Movie)
+WHERE m <> target
+WITH target, m, COUNT(DISTINCT g) AS sharedGenres
+OPTIONAL MATCH (target)<-[:ACTED_IN]-(a:Actor)-[:ACTED_IN]->(m)
+WITH target, m, sharedGenres * 2 + COUNT(DISTINCT a) AS score
+ORDER BY score DESC, m.title
+WITH target, COLLECT({title: m.title, score: score})[..$top_n] AS neighbours
+RETURN target.title AS title, neighbours
+"""
+
+WRITE_SIMILAR_MOVIES_QUERY = """
+UNWIND $rows AS row
+MATCH (target:Movie {title: row.title})
+CALL {
+    WITH target
+    MATCH (target)-[old:SIMILAR]->()
+    DELETE old
+}
+SET target.similarComputedAt = datetime(),
+    target.similarityFingerprint = row.fingerprint
+WITH target, row
+UNWIND range(0, size(row.neighbours) - 1) AS rank
+WITH target, rank, row.neighbours[rank] AS neighbour
+MATCH (m:Movie {title: neighbour.title})
+CREATE (target)-[:SIMILAR {score: neighbour.score, rank: rank}]->(m)
+"""
+
+MOVIE_NEIGHBOURHOODS_QUERY = """
+MATCH (m:Movie)
+RETURN m.title AS title,
+    [(m)-[:IN_GENRE]->(g:Genre) | g.genre] AS genres,
+    [(a:Actor)-[:ACTED_IN]->(m) | a.actorName] AS actors,
+    m.similarityFingerprint AS storedFingerprint,
+    m.similarComputedAt < datetime() - duration({days: $max_age_days}) AS stale
+ORDER BY m.title
+SKIP $skip LIMIT $limit
+"""
+
+AFFECTED_MOVIES_QUERY = """
+UNWIND $titles AS changedTitle
+MATCH (changed:Movie {title: changedTitle})
+CALL {
+    WITH changed
+    MATCH (changed)<-[:ACTED_IN]-(:Actor)-[:ACTED_IN]->(m:Movie)
+    RETURN m
+    UNION
+    WITH changed
+    MATCH (m:Movie)-[:SIMILAR]->(changed)
+    RETURN m
+}
+RETURN DISTINCT m.title AS title
+"""
+
+
+def neighbourhood_fingerprint(genres: Iterable[str], actors: Iterable[str]) -> str:
+    """Return a fingerprint of the genres and actors of a movie."""
+    payload = "\0".join(sorted(genres)) + "\x01" + "\0".join(sorted(actors))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def find_movies_to_recompute(
+    graph: Neo4jGraph, max_age_days: int = 30, batch_size: int = 2000
+) -> Dict[str, str]:
+    """Find movies whose stored similarity list is missing, stale or outdated.
+
+    A movie is outdated when its genres or actors changed since its list was
+    computed. Movies that share an actor with an outdated movie, or that have
+    it in their own list, are recomputed as well. Changes to genre membership
+    alone only refresh the changed movie, since genres are shared by large
+    parts of the catalog and stale entries are picked up by the age check.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        max_age_days (int): Lists older than this are recomputed
+        batch_size (int): Number of movies fetched per query
+
+    Returns:
+        Dict[str, str]: Title to current fingerprint of every movie to recompute
+    """
+    fingerprints: Dict[str, str] = {}
+    selected: Set[str] = set()
+    changed: List[str] = []
+    skip = 0
+    while True:
+        rows = graph.query(
+            MOVIE_NEIGHBOURHOODS_QUERY,
+            {"skip": skip, "limit": batch_size, "max_age_days": max_age_days},
+        )
+        for row in rows:
+            fingerprint = neighbourhood_fingerprint(row["genres"], row["actors"])
+            fingerprints[row["title"]] = fingerprint
+            if row["storedFingerprint"] != fingerprint:
+                changed.append(row["title"])
+                selected.add(row["title"])
+            elif row["stale"] is not False:
+                selected.add(row["title"])
+        if len(rows) < batch_size:
+            break
+        skip += batch_size
+
+    for start in range(0, len(changed), batch_size):
+        rows = graph.query(AFFECTED_MOVIES_QUERY, {"titles": changed[start : start + batch_size]})
+        selected.update(row["title"] for row in rows)
+    return {title: fingerprints[title] for title in selected if title in fingerprints}
+
+
+def compute_similarity_table(
+    graph: Neo4jGraph,
+    titles: Optional[Dict[str, str]] = None,
+    top_n: int = 50,
+    batch_size: int = 100,
+    max_age_days: int = 30,
+) -> int:
+    """Compute and store the top-N similar movies as weighted SIMILAR relationships.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        titles (Dict[str, str], optional): Title to fingerprint of the movies to
+            recompute. Defaults to the result of ``find_movies_to_recompute``.
+        top_n (int): Number of similar movies stored per movie
+        batch_size (int): Number of movies scored per query
+        max_age_days (int): Age after which a stored list is recomputed
+
+    Returns:
+        int: Number of movies whose list was recomputed
+    """
+    if titles is None:
+        titles = find_movies_to_recompute(graph, max_age_days=max_age_days)
+    pending = sorted(titles)
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start : start + batch_size]
+        results = graph.query(COMPUTE_SIMILAR_MOVIES_QUERY, {"titles": batch, "top_n": top_n})
+        neighbours = {record["title"]: record["neighbours"] for record in results}
+        rows = [
+            {
+                "title": title,
+                "fingerprint": titles[title],
+                "neighbours": neighbours.get(title, []),
+            }
+            for title in batch
+        ]
+        graph.query(WRITE_SIMILAR_MOVIES_QUERY, {"rows": rows})
+        print(f"Stored similar movies for {start + len(batch)}/{len(pending)} movies")
+    return len(pending)
+
+
+if __name__ == "__main__":
+    from src.database.graph import graph
+
+    parser = argparse.ArgumentParser(description="Precompute the SIMILAR relationships between movies")
+    parser.add_argument("--full", action="store_true", help="Recompute every movie")
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-age-days", type=int, default=30)
+    args = parser.parse_args()
+
+    selection = None
+    if args.full:
+        selection = find_movies_to_recompute(graph, max_age_days=0)
+    count = compute_similarity_table(
+        graph,
+        titles=selection,
+        top_n=args.top_n,
+        batch_size=args.batch_size,
+        max_age_days=args.max_age_days,
+    )
+    print(f"Recomputed similar movies for {count} movies")
@@ -0,0 +1,61 @@
+import inspect
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_neo4j import Neo4jGraph
+
+
+class TimeoutNeo4jGraph(Neo4jGraph):
+    """Neo4jGraph whose queries accept a transaction timeout of their own.
+
+    ``Neo4jGraph.query`` sends ``self.timeout`` with every statement. Here
+    that attribute is per thread while a query with its own timeout runs, so
+    concurrent queries keep their own limits and everything else, including
+    ``session_params`` and the result handling, is the parent's.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        self._local = threading.local()
+        self._default_timeout: Optional[float] = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return getattr(self._local, "timeout", self._default_timeout)
+
+    @timeout.setter
+    def timeout(self, value: Optional[float]) -> None:
+        self._default_timeout = value
+
+    def query(
+        self,
+        query: str,
+        params: dict = {},
+        session_params: dict = {},
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Query Neo4j, aborting the transaction on the server after ``timeout`` seconds.
+
+        Args:
+            query (str): The Cypher query to execute
+            params (dict): The parameters to pass to the query
+            session_params (dict): Parameters of the session used for the query
+            timeout (float, optional): Transaction timeout, defaults to the
+                ``timeout`` the graph was created with
+
+        Returns:
+            List[Dict[str, Any]]: The records of the query result
+        """
+        if timeout is None:
+            return super().query(query, params, session_params)
+        self._local.timeout = timeout
+        try:
+            return super().query(query, params, session_params)
+        finally:
+            del self._local.timeout
+
+
+def supports_query_timeout(graph_instance: Any) -> bool:
+    """Return whether the ``query`` method of a graph accepts a ``timeout`` argument."""
+    query = getattr(type(graph_instance), "query", None)
+    return query is not None and "timeout" in inspect.signature(query).parameters
@@ -0,0 +1,277 @@
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import streamlit as st
+from langchain_neo4j import Neo4jGraph
+
+from src.chat.embedding_cache import normalize_text
+from src.database.graph import graph
+
+# Session state list -> (relationship from the User node, label, key property)
+PROFILE_RELATIONSHIPS = {
+    "user_movies": ("LIKES", "Movie", "title"),
+    "user_actors": ("FAVOURITE_ACTOR", "Actor", "actorName"),
+    "user_genres": ("FAVOURITE_GENRE", "Genre", "genre"),
+    "user_watched": ("WATCHED", "Movie", "title"),
+}
+
+# Session state keys of the open profile, of the lists last written to it and
+# of the names the last write found no node for
+PROFILE_ID_KEY = "profile_id"
+PROFILE_SYNCED_KEY = "profile_synced"
+PROFILE_UNMATCHED_KEY = "profile_unmatched"
+
+# Shortest PIN accepted for a profile
+MIN_PIN_LENGTH = 4
+# PBKDF2 rounds deriving a profile ID, so PINs cannot be enumerated cheaply
+PROFILE_ID_ITERATIONS = 100_000
+
+LOAD_PROFILE_QUERY = (
+    "MATCH (u:User {userId: $user_id})\nRETURN\n"
+    + ",\n".join(
+        f"    COLLECT {{ MATCH (u)-[r:{rel_type}]->(n:{label}) "
+        f"RETURN n.{key} ORDER BY r.addedAt, n.{key} }} AS {list_key}"
+        for list_key, (rel_type, label, key) in PROFILE_RELATIONSHIPS.items()
+    )
+    + "\n"
+)
+
+DELETE_PROFILE_QUERY = "MATCH (u:User {userId: $user_id})\nDETACH DELETE u\n"
+
+# Only the added and removed names are sent, as $added.<list> and $removed.<list>.
+# Each name is found through its index, so a write does not grow with the profile.
+# Added names that match no node are returned in missing.<list>.
+APPLY_PROFILE_CHANGES_QUERY = (
+    "MERGE (u:User {userId: $user_id})\n"
+    "ON CREATE SET u.createdAt = datetime()\n"
+    "SET u.updatedAt = datetime()\n"
+    "WITH u\n"
+    + "".join(
+        f"CALL {{\n"
+        f"    WITH u\n"
+        f"    UNWIND $removed.{list_key} AS name\n"
+        f"    MATCH (u)-[r:{rel_type}]->(n:{label} {{{key}: name}})\n"
+        f"    DELETE r\n"
+        f"}}\n"
+        f"CALL {{\n"
+        f"    WITH u\n"
+        f"    UNWIND $added.{list_key} AS name\n"
+        f"    OPTIONAL MATCH (n:{label} {{{key}: name}})\n"
+        f"    FOREACH (node IN CASE WHEN n IS NULL THEN [] ELSE [n] END |\n"
+        f"        MERGE (u)-[r:{rel_type}]->(node)\n"
+        f"        ON CREATE SET r.addedAt = datetime())\n"
+        f"    RETURN collect(CASE WHEN n IS NULL THEN name END) AS missing_{list_key}\n"
+        f"}}\n"
+        for list_key, (rel_type, label, key) in PROFILE_RELATIONSHIPS.items()
+    )
+    + "RETURN u.userId AS userId, {"
+    + ", ".join(f"{list_key}: missing_{list_key}" for list_key in PROFILE_RELATIONSHIPS)
+    + "} AS missing\n"
+)
+
+
+def derive_profile_id(name: str, pin: str, secret: str = "") -> str:
+    """Return the user ID of a profile name and PIN.
+
+    The name is compared ignoring case and extra spaces. The ID is a salted
+    PBKDF2 hash, so knowing a name is not enough to open its profile and the
+    stored IDs do not reveal the names or PINs.
+
+    Args:
+        name (str): Profile name entered by the user
+        pin (str): PIN entered by the user
+        secret (str): Server-side secret mixed into every ID
+
+    Returns:
+        str: The user ID, empty if the name is empty or the PIN too short
+    """
+    name = normalize_text(name)
+    if not name or len(pin) < MIN_PIN_LENGTH:
+        return ""
+    return hashlib.pbkdf2_hmac(
+        "sha256",
+        pin.encode("utf-8"),
+        f"{secret}\0{name}".encode("utf-8"),
+        PROFILE_ID_ITERATIONS,
+    ).hex()
+
+
+def diff_profiles(
+    previous: Dict[str, Sequence[str]], current: Dict[str, Sequence[str]]
+) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Compare two sets of preference lists.
+
+    Args:
+        previous (Dict[str, Sequence[str]]): Lists last written to the graph
+        current (Dict[str, Sequence[str]]): Lists of the session
+
+    Returns:
+        Dict[str, Tuple[List[str], List[str]]]: The added and removed names of
+            every list that changed
+    """
+    changes = {}
+    for key in PROFILE_RELATIONSHIPS:
+        old, new = list(previous.get(key, [])), list(current.get(key, []))
+        old_set, new_set = set(old), set(new)
+        added = list(dict.fromkeys(name for name in new if name not in old_set))
+        removed = list(dict.fromkeys(name for name in old if name not in new_set))
+        if added or removed:
+            changes[key] = (added, removed)
+    return changes
+
+
+class UserProfileStore:
+    """Keeps the preference lists of named profiles in the graph.
+
+    A profile is a ``User`` node with a relationship to every liked movie,
+    favourite actor and genre and watched movie. The session remembers the
+    lists it last wrote or loaded, so each change only writes the difference.
+
+    Profiles are keyed by a hash of the name and a PIN. This keeps casual
+    visitors out of each other's lists, but the profiles are not private:
+    anyone with access to the database can read them.
+    """
+
+    def __init__(self, graph_instance: Neo4jGraph, id_secret: str = ""):
+        """Initialize the store.
+
+        Args:
+            graph_instance (Neo4jGraph): Neo4j graph instance
+            id_secret (str): Server-side secret mixed into every profile ID
+        """
+        self.graph = graph_instance
+        self.id_secret = id_secret
+        self._lock = threading.Lock()
+        self.stats = {
+            "loads": 0,
+            "writes": 0,
+            "names_written": 0,
+            "unmatched_names": 0,
+            "errors": 0,
+        }
+
+    def load(self, user_id: str) -> Optional[Dict[str, List[str]]]:
+        """Read the preference lists of a profile.
+
+        Args:
+            user_id (str): ID of the profile
+
+        Returns:
+            Dict[str, List[str]]: The lists keyed like the session state, None
+                if the profile does not exist
+        """
+        result = self.graph.query(LOAD_PROFILE_QUERY, {"user_id": user_id})
+        with self._lock:
+            self.stats["loads"] += 1
+        if not result:
+            return None
+        return {key: list(result[0][key] or []) for key in PROFILE_RELATIONSHIPS}
+
+    def apply_changes(
+        self, user_id: str, changes: Dict[str, Tuple[List[str], List[str]]]
+    ) -> Dict[str, List[str]]:
+        """Write the added and removed names of a profile in one query.
+
+        Args:
+            user_id (str): ID of the profile, created if missing
+            changes (Dict[str, Tuple[List[str], List[str]]]): As returned by diff_profiles
+
+        Returns:
+            Dict[str, List[str]]: Added names that match no node and were not
+                saved, for every list that has some
+        """
+        params = {
+            "user_id": user_id,
+            "added": {key: list(changes.get(key, ([], []))[0]) for key in PROFILE_RELATIONSHIPS},
+            "removed": {key: list(changes.get(key, ([], []))[1]) for key in PROFILE_RELATIONSHIPS},
+        }
+        result = self.graph.query(APPLY_PROFILE_CHANGES_QUERY, params)
+        missing = {
+            key: list(names)
+            for key, names in ((result[0]["missing"] if result else None) or {}).items()
+            if names
+        }
+        with self._lock:
+            self.stats["writes"] += 1
+            self.stats["names_written"] += sum(
+                len(added) + len(removed) for added, removed in changes.values()
+            )
+            self.stats["unmatched_names"] += sum(len(names) for names in missing.values())
+        return missing
+
+    def delete(self, user_id: str) -> None:
+        """Delete a profile and its relationships.
+
+        Args:
+            user_id (str): ID of the profile
+        """
+        self.graph.query(DELETE_PROFILE_QUERY, {"user_id": user_id})
+
+    def open(self, session_state: Any, name: str, pin: str) -> bool:
+        """Attach a session to a profile.
+
+        A stored profile replaces the session's lists. A new profile keeps
+        them, and they are written on the next ``sync``.
+
+        Args:
+            session_state (st.session_state): Session state holding the lists
+            name (str): Profile name entered by the user
+            pin (str): PIN entered by the user, at least ``MIN_PIN_LENGTH`` characters
+
+        Returns:
+            bool: Whether a stored profile was loaded
+        """
+        user_id = derive_profile_id(name, pin, self.id_secret)
+        if not user_id:
+            self.close(session_state)
+            return False
+        stored = self.load(user_id)
+        if stored is not None:
+            for key, values in stored.items():
+                session_state[key] = list(values)
+        session_state[PROFILE_ID_KEY] = user_id
+        session_state[PROFILE_SYNCED_KEY] = stored or {key: [] for key in PROFILE_RELATIONSHIPS}
+        session_state[PROFILE_UNMATCHED_KEY] = {}
+        return stored is not None
+
+    def close(self, session_state: Any) -> None:
+        """Detach a session from its profile, keeping its lists."""
+        session_state[PROFILE_ID_KEY] = None
+        session_state[PROFILE_SYNCED_KEY] = None
+        session_state[PROFILE_UNMATCHED_KEY] = {}
+
+    def sync(self, session_state: Any) -> Optional[str]:
+        """Write the changes of the session's lists to its profile.
+
+        Names that match no node cannot be saved. They are kept in the
+        session's lists, counted as written so they are not sent again on
+        every run, and reported under ``PROFILE_UNMATCHED_KEY``.
+
+        Args:
+            session_state (st.session_state): Session state holding the lists
+
+        Returns:
+            str: ID of the profile, now matching the session, None if no
+                profile is open or the write failed
+        """
+        user_id = session_state.get(PROFILE_ID_KEY)
+        if not user_id:
+            return None
+        current = {key: list(session_state.get(key, []) or []) for key in PROFILE_RELATIONSHIPS}
+        changes = diff_profiles(session_state.get(PROFILE_SYNCED_KEY) or {}, current)
+        if changes:
+            try:
+                missing = self.apply_changes(user_id, changes)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"Error saving user profile: {e}")
+                return None
+            session_state[PROFILE_SYNCED_KEY] = current
+            session_state[PROFILE_UNMATCHED_KEY] = missing
+        return user_id
+
+
+# Create the profile store shared by all sessions
+user_profile_store = UserProfileStore(graph, id_secret=st.secrets.get("PROFILE_ID_SECRET", ""))
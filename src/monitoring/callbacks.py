@@ -0,0 +1,211 @@
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.monitoring.tracing import Span, Tracer, tracer
+
+# Chains that only glue prompts, parsers and lambdas together; their time is
+# attributed to the nearest traced ancestor instead of getting a span of their own
+UNTRACED_CHAIN_PREFIXES = ("Runnable", "ChatPromptTemplate", "PromptTemplate")
+UNTRACED_CHAIN_SUFFIXES = ("Parser",)
+# Internal steps of RunnableWithMessageHistory
+UNTRACED_CHAIN_NAMES = {"insert_history", "load_history", "check_sync_or_async"}
+
+
+def _run_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+    """Return the name LangChain reports for a run."""
+    if kwargs.get("name"):
+        return kwargs["name"]
+    if serialized:
+        if serialized.get("name"):
+            return serialized["name"]
+        if serialized.get("id"):
+            return serialized["id"][-1]
+    return default
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain callbacks into spans of a ``Tracer``.
+
+    Chains, tools, retrievers and LLM calls become spans nested under the
+    span that was active when the run started. While a run is in progress its
+    span is the active one, so Cypher statements issued by a tool nest below
+    that tool. LLM spans record the prompt and completion token counts.
+
+    Create one handler per chat turn and pass it in the ``callbacks`` config.
+    """
+
+    def __init__(self, tracer_instance: Optional[Tracer] = None):
+        """Initialize the handler.
+
+        Args:
+            tracer_instance (Tracer, optional): Tracer to use, defaults to the module tracer
+        """
+        self.tracer = tracer_instance or tracer
+        self._spans: Dict[UUID, Span] = {}
+        # Runs without a span of their own mapped to the span of their nearest traced ancestor
+        self._untraced: Dict[UUID, Optional[Span]] = {}
+        self._previous: Dict[UUID, Optional[Span]] = {}
+
+    def _parent(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        if parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return self._spans[parent_run_id]
+            if parent_run_id in self._untraced:
+                return self._untraced[parent_run_id]
+        return self.tracer.current_span()
+
+    def _start(
+        self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str, **attributes: Any
+    ) -> Span:
+        span = self.tracer.start_span(
+            name, kind, parent=self._parent(parent_run_id), **attributes
+        )
+        self._spans[run_id] = span
+        self._previous[run_id] = self.tracer.current_span()
+        self.tracer.activate(span)
+        return span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        self._untraced.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return None
+        self.tracer.end_span(span, error=error)
+        self.tracer.activate(self._previous.pop(run_id, None))
+        return span
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = _run_name(serialized, kwargs, "chain")
+        if parent_run_id is not None and (
+            name in UNTRACED_CHAIN_NAMES
+            or name.startswith(UNTRACED_CHAIN_PREFIXES)
+            or name.endswith(UNTRACED_CHAIN_SUFFIXES)
+        ):
+            self._untraced[run_id] = self._parent(parent_run_id)
+            return
+        self._start(run_id, parent_run_id, name, "chain")
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(
+            run_id,
+            parent_run_id,
+            _run_name(serialized, kwargs, "tool"),
+            "tool",
+            input_chars=len(input_str or ""),
+        )
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    def on_retriever_start(
+        self,
+        serialized: Dict[str, Any],
+        query: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(run_id, parent_run_id, _run_name(serialized, kwargs, "retriever"), "retriever")
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None:
+            span.set_attribute("rows", len(documents))
+        self._end(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    def _start_llm(
+        self,
+        serialized: Dict[str, Any],
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        kwargs: Dict[str, Any],
+    ) -> None:
+        invocation = kwargs.get("invocation_params") or {}
+        model = invocation.get("model_name") or invocation.get("model") or ""
+        self._start(
+            run_id, parent_run_id, _run_name(serialized, kwargs, "llm"), "llm", model=model
+        )
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_llm(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_llm(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None:
+            prompt_tokens, completion_tokens = self._token_usage(response)
+            span.set_attribute("prompt_tokens", prompt_tokens)
+            span.set_attribute("completion_tokens", completion_tokens)
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    @staticmethod
+    def _token_usage(response: LLMResult) -> tuple:
+        """Read the prompt and completion token counts of an LLM result.
+
+        OpenAI models report them in ``llm_output``; streamed and other chat
+        models only attach ``usage_metadata`` to the generated message.
+        """
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            return usage.get("prompt_tokens"), usage.get("completion_tokens")
+        prompt_tokens = completion_tokens = None
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+        return prompt_tokens, completion_tokens
@@ -0,0 +1,425 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import streamlit as st
+
+# Upper bounds of the latency histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """A timed unit of work: a chat turn, a tool run, an LLM call or a Cypher statement."""
+
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Attach an attribute, like a row or token count, to the span."""
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the span as a JSON serializable dictionary."""
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Creates nested spans and hands finished ones to the registered exporters.
+
+    The active span is kept in a context variable, so spans opened by the
+    LangChain callback handler, the graph wrapper and application code nest
+    without passing spans around. The spans of the most recent traces are
+    kept in memory for the timing panel of the UI.
+    """
+
+    def __init__(self, enabled: bool = True, max_traces: int = 200):
+        """Initialize the tracer.
+
+        Args:
+            enabled (bool): Record spans; when False spans are created but never exported
+            max_traces (int): Number of recent traces kept in memory
+        """
+        self.enabled = enabled
+        self.max_traces = max_traces
+        self.exporters: List[Any] = []
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: Any) -> None:
+        """Register an object with an ``export(span)`` method."""
+        self.exporters.append(exporter)
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        """Return the span active in the current context."""
+        return _current_span.get()
+
+    @staticmethod
+    def activate(span: Optional[Span]) -> None:
+        """Make a span the active one in the current context."""
+        _current_span.set(span)
+
+    def start_span(
+        self, name: str, kind: str = "internal", parent: Optional[Span] = None, **attributes: Any
+    ) -> Span:
+        """Start a span, by default as a child of the active span.
+
+        Args:
+            name (str): Name of the span
+            kind (str): Category used for aggregation: turn, agent, chain, tool, llm, cypher, ...
+            parent (Span, optional): Parent span, defaults to the active span
+            **attributes: Initial attributes
+
+        Returns:
+            Span: The started span
+        """
+        parent = parent or _current_span.get()
+        return Span(
+            name=name,
+            kind=kind,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            attributes=dict(attributes),
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """Finish a span, store it with its trace and export it."""
+        span.duration = time.perf_counter() - span._started
+        if error is not None:
+            span.status = "error"
+            span.set_attribute("error", f"{type(error).__name__}: {error}")
+        if not self.enabled:
+            return
+
+        with self._lock:
+            trace = self._traces.setdefault(span.trace_id, [])
+            trace.append(span)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Error exporting span {span.name}: {e}")
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any) -> Iterator[Span]:
+        """Run the enclosed block inside a child span of the active span.
+
+        Example:
+            with tracer.span("catalog.load", kind="catalog") as span:
+                span.set_attribute("movies", len(titles))
+        """
+        span = self.start_span(name, kind, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current_span.reset(token)
+
+    def get_trace(self, trace_id: str) -> List[Span]:
+        """Return the finished spans of a trace ordered by start time."""
+        with self._lock:
+            spans = list(self._traces.get(trace_id, ()))
+        return sorted(spans, key=lambda span: span.start_time)
+
+
+class JsonlSpanExporter:
+    """Appends every finished span as one JSON line to a local file."""
+
+    def __init__(self, path: str):
+        """Open (and create if needed) the span log.
+
+        Args:
+            path (str): Path of the JSONL file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class PrometheusExporter:
+    """Aggregates finished spans into metrics in the Prometheus text format.
+
+    Span durations become a histogram labelled by kind and name, LLM spans
+    add to a token counter per model and Cypher spans to a row counter.
+    """
+
+    def __init__(self, namespace: str = "recommender"):
+        """Initialize empty metrics.
+
+        Args:
+            namespace (str): Prefix of every metric name
+        """
+        self.namespace = namespace
+        self._buckets: Dict[Tuple[str, str], List[int]] = defaultdict(
+            lambda: [0] * len(DURATION_BUCKETS)
+        )
+        self._sums: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._errors: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._rows = 0
+        self._first_token_buckets = [0] * len(DURATION_BUCKETS)
+        self._first_token_sum = 0.0
+        self._first_token_count = 0
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        key = (span.kind, span.name)
+        with self._lock:
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    self._buckets[key][i] += 1
+            self._sums[key] += span.duration
+            self._counts[key] += 1
+            if span.status == "error":
+                self._errors[key] += 1
+            if span.kind == "llm":
+                model = str(span.attributes.get("model", span.name))
+                for token_type in ("prompt_tokens", "completion_tokens"):
+                    self._tokens[(model, token_type)] += int(span.attributes.get(token_type) or 0)
+            if span.kind == "cypher":
+                self._rows += int(span.attributes.get("rows") or 0)
+            if span.attributes.get("time_to_first_token_ms") is not None:
+                seconds = span.attributes["time_to_first_token_ms"] / 1000
+                for i, bound in enumerate(DURATION_BUCKETS):
+                    if seconds <= bound:
+                        self._first_token_buckets[i] += 1
+                self._first_token_sum += seconds
+                self._first_token_count += 1
+
+    @staticmethod
+    def _labels(**labels: str) -> str:
+        """Format label pairs, escaping backslashes, quotes and newlines."""
+        pairs = []
+        for key, value in labels.items():
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        prefix = self.namespace
+        lines = [
+            f"# HELP {prefix}_span_duration_seconds Duration of traced operations",
+            f"# TYPE {prefix}_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, name), buckets in sorted(self._buckets.items()):
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    labels = self._labels(kind=kind, name=name, le=str(bound))
+                    lines.append(f"{prefix}_span_duration_seconds_bucket{labels} {count}")
+                labels = self._labels(kind=kind, name=name, le="+Inf")
+                lines.append(
+                    f"{prefix}_span_duration_seconds_bucket{labels} {self._counts[(kind, name)]}"
+                )
+                labels = self._labels(kind=kind, name=name)
+                lines.append(f"{prefix}_span_duration_seconds_sum{labels} {self._sums[(kind, name)]}")
+                lines.append(
+                    f"{prefix}_span_duration_seconds_count{labels} {self._counts[(kind, name)]}"
+                )
+
+            lines += [
+                f"# HELP {prefix}_span_errors_total Traced operations that raised an error",
+                f"# TYPE {prefix}_span_errors_total counter",
+            ]
+            for (kind, name), count in sorted(self._errors.items()):
+                lines.append(f"{prefix}_span_errors_total{self._labels(kind=kind, name=name)} {count}")
+
+            lines += [
+                f"# HELP {prefix}_llm_tokens_total Tokens used by LLM calls",
+                f"# TYPE {prefix}_llm_tokens_total counter",
+            ]
+            for (model, token_type), count in sorted(self._tokens.items()):
+                labels = self._labels(model=model, type=token_type)
+                lines.append(f"{prefix}_llm_tokens_total{labels} {count}")
+
+            lines += [
+                f"# HELP {prefix}_cypher_rows_total Rows returned by Cypher statements",
+                f"# TYPE {prefix}_cypher_rows_total counter",
+                f"{prefix}_cypher_rows_total {self._rows}",
+                f"# HELP {prefix}_time_to_first_token_seconds Time until the first answer token was shown",
+                f"# TYPE {prefix}_time_to_first_token_seconds histogram",
+            ]
+            for bound, count in zip(DURATION_BUCKETS, self._first_token_buckets):
+                labels = self._labels(le=str(bound))
+                lines.append(f"{prefix}_time_to_first_token_seconds_bucket{labels} {count}")
+            lines += [
+                f'{prefix}_time_to_first_token_seconds_bucket{{le="+Inf"}} {self._first_token_count}',
+                f"{prefix}_time_to_first_token_seconds_sum {self._first_token_sum}",
+                f"{prefix}_time_to_first_token_seconds_count {self._first_token_count}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the metrics on ``http://host:port/metrics`` from a daemon thread."""
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics-endpoint", daemon=True
+        ).start()
+        return server
+
+
+def _statement_summary(query: str, max_length: int = 200) -> str:
+    """Collapse whitespace and shorten a Cypher statement for span attributes."""
+    statement = " ".join(query.split())
+    return statement if len(statement) <= max_length else statement[: max_length - 3] + "..."
+
+
+def instrument_graph(graph_instance: Any, tracer_instance: Optional[Tracer] = None) -> Any:
+    """Wrap ``graph_instance.query`` so every Cypher statement gets its own span.
+
+    The span records the shortened statement, the parameter names and the
+    number of returned rows. The graph is modified in place and returned.
+
+    Args:
+        graph_instance (Any): Neo4jGraph or any object with a ``query`` method
+        tracer_instance (Tracer, optional): Tracer to use, defaults to the module tracer
+
+    Returns:
+        Any: The instrumented graph
+    """
+    if getattr(graph_instance, "_traced", False):
+        return graph_instance
+    query = graph_instance.query
+
+    def traced_query(query_text: str, params: dict = {}, *args: Any, **kwargs: Any) -> Any:
+        active_tracer = tracer_instance or tracer
+        with active_tracer.span(
+            "graph.query",
+            kind="cypher",
+            statement=_statement_summary(query_text),
+            params=sorted(params or {}),
+        ) as span:
+            result = query(query_text, params, *args, **kwargs)
+            span.set_attribute("rows", len(result) if isinstance(result, list) else None)
+            return result
+
+    graph_instance.query = traced_query
+    graph_instance._traced = True
+    return graph_instance
+
+
+def trace_summary(spans: List[Span]) -> List[Dict[str, Any]]:
+    """Flatten a trace into indented rows for the timing panel of the UI."""
+    children: Dict[Optional[str], List[Span]] = defaultdict(list)
+    span_ids = {span.span_id for span in spans}
+    for span in spans:
+        children[span.parent_id if span.parent_id in span_ids else None].append(span)
+
+    rows: List[Dict[str, Any]] = []
+
+    def visit(span: Span, depth: int) -> None:
+        details = {
+            key: span.attributes[key]
+            for key in (
+                "rows",
+                "prompt_tokens",
+                "completion_tokens",
+                "time_to_first_token_ms",
+                "error",
+            )
+            if span.attributes.get(key) is not None
+        }
+        rows.append(
+            {
+                "span": "  " * depth + span.name,
+                "kind": span.kind,
+                "ms": round((span.duration or 0) * 1000, 1),
+                "details": ", ".join(f"{key}={value}" for key, value in details.items()),
+            }
+        )
+        for child in children.get(span.span_id, ()):
+            visit(child, depth + 1)
+
+    for root in children.get(None, ()):
+        visit(root, 0)
+    return rows
+
+
+# Process-wide tracer, configured from the secrets
+tracer = Tracer(
+    enabled=str(st.secrets.get("TRACING_ENABLED", True)).lower() not in ("false", "0"),
+    max_traces=int(st.secrets.get("TRACE_MAX_TRACES", 200)),
+)
+
+if st.secrets.get("TRACE_EXPORT_PATH"):
+    try:
+        tracer.add_exporter(JsonlSpanExporter(st.secrets["TRACE_EXPORT_PATH"]))
+    except OSError as e:
+        print(f"Error opening span log: {e}")
+
+prometheus_exporter = PrometheusExporter()
+tracer.add_exporter(prometheus_exporter)
+
+if st.secrets.get("METRICS_PORT"):
+    try:
+        prometheus_exporter.serve(
+            int(st.secrets["METRICS_PORT"]), st.secrets.get("METRICS_HOST", "127.0.0.1")
+        )
+    except OSError as e:
+        print(f"Error starting metrics endpoint: {e}")
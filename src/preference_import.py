@@ -0,0 +1,281 @@
+import ast
+import csv
+import io
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.database.search import CatalogSearch
+
+# Session state list -> catalog list its names are matched against
+PREFERENCE_FIELDS = {
+    "user_movies": "movie_titles",
+    "user_actors": "actor_names",
+    "user_genres": "genre_names",
+    "user_watched": "movie_titles",
+}
+
+# Order of the lists in the four-line TXT format written by "Save Preferences"
+TXT_LIST_ORDER = ("user_movies", "user_actors", "user_genres", "user_watched")
+
+# Accepted spellings of the list names in JSON keys and CSV columns
+LIST_ALIASES = {
+    "user_movies": ("user_movies", "movies", "favorite_movies", "favourite_movies", "liked_movies", "likes"),
+    "user_actors": ("user_actors", "actors", "favorite_actors", "favourite_actors"),
+    "user_genres": ("user_genres", "genres", "favorite_genres", "favourite_genres"),
+    "user_watched": ("user_watched", "watched", "watched_movies", "history"),
+}
+_ALIAS_TO_LIST = {alias: key for key, aliases in LIST_ALIASES.items() for alias in aliases}
+
+# Column names of the long CSV layout: one "list,name" row per entry
+CSV_LIST_COLUMNS = ("list", "type", "category")
+
+CHUNK_SIZE = 64 * 1024
+
+# A quoted string, a bracket, or the opening quote of a string cut off by the end of the chunk
+_TOKEN_PATTERN = re.compile(
+    r'"(?:[^"\\]|\\.)*"' r"|'(?:[^'\\]|\\.)*'" r"|[\[\]{}:,]" r"""|(?P<cut>["'])""",
+    re.DOTALL,
+)
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import: the matched lists and what could not be matched."""
+
+    format: str
+    lists: Dict[str, List[str]] = field(default_factory=dict)
+    # Names read per list, before deduplication and matching
+    read: Dict[str, int] = field(default_factory=dict)
+    # (given name, catalog name) pairs, unknown names and names beyond the fuzzy
+    # budget that were not compared, up to max_reported each per list
+    fuzzy: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)
+    unknown: Dict[str, List[str]] = field(default_factory=dict)
+    unchecked: Dict[str, List[str]] = field(default_factory=dict)
+    fuzzy_count: int = 0
+    unknown_count: int = 0
+    unchecked_count: int = 0
+    seconds: float = 0.0
+
+
+def _list_key(name: str) -> Optional[str]:
+    """Return the session state list of a JSON key or CSV column, None if unknown."""
+    return _ALIAS_TO_LIST.get(re.sub(r"[\s\-]+", "_", name.strip().lower()))
+
+
+def _decode_string(token: str) -> str:
+    """Return the value of a JSON or Python string literal."""
+    inner = token[1:-1]
+    if "\\" not in inner:
+        return inner
+    try:
+        return json.loads(token) if token[0] == '"' else ast.literal_eval(token)
+    except (ValueError, SyntaxError):
+        return ast.literal_eval(token)
+
+
+def iter_tokens(stream: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield the string literals and brackets of a text stream, chunk by chunk.
+
+    Strings are yielded with their quotes, everything but ``[]{}:,`` between
+    them is skipped. Only a string cut off by the end of a chunk is kept for
+    the next one, so memory does not grow with the size of the file.
+
+    Args:
+        stream (IO[str]): Text to tokenize
+        chunk_size (int): Characters read at a time
+
+    Yields:
+        str: The next token
+
+    Raises:
+        ValueError: If the file ends inside a string
+    """
+    buffer = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        carry = len(buffer)
+        for match in _TOKEN_PATTERN.finditer(buffer):
+            if match.lastgroup == "cut":
+                if not chunk:
+                    raise ValueError("The file ends inside a quoted name")
+                carry = match.start()
+                break
+            yield match.group()
+        if not chunk:
+            return
+        buffer = buffer[carry:]
+
+
+def _iter_list_entries(tokens: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (list, name) pairs of a JSON object or of a sequence of list literals.
+
+    An object maps list names to names or lists of names. Outside an object
+    the innermost lists are taken in TXT_LIST_ORDER, which covers the
+    four-line TXT format and a JSON array of four lists.
+    """
+    # Open brackets: "bracket", list "key", "in_object", and "ordinal", "has_child"
+    # for lists or "expect_key" for objects
+    stack: List[Dict] = []
+    ordinal = 0
+    for token in tokens:
+        frame = stack[-1] if stack else None
+        if token == "{":
+            stack.append({"bracket": "{", "key": None, "in_object": True, "expect_key": True})
+        elif token == "[":
+            if frame is not None and frame["bracket"] == "[":
+                frame["has_child"] = True
+            stack.append(
+                {
+                    "bracket": "[",
+                    "key": frame["key"] if frame else None,
+                    "in_object": bool(frame and frame["in_object"]),
+                    "ordinal": None,
+                    "has_child": False,
+                }
+            )
+        elif token in "]}":
+            if not stack:
+                continue
+            stack.pop()
+            if frame["bracket"] == "[" and not frame["in_object"]:
+                if frame["ordinal"] is None and not frame["has_child"]:
+                    # An empty list still takes its place in the order
+                    ordinal += 1
+        elif token in ",:":
+            if frame is not None and frame["bracket"] == "{":
+                frame["expect_key"] = token == ","
+        elif frame is not None:
+            value = _decode_string(token)
+            if frame["bracket"] == "{" and frame["expect_key"]:
+                frame["key"] = _list_key(value)
+            elif frame["key"] is not None:
+                yield frame["key"], value
+            elif frame["bracket"] == "[" and not frame["in_object"]:
+                if frame["ordinal"] is None:
+                    frame["ordinal"] = ordinal
+                    ordinal += 1
+                if frame["ordinal"] < len(TXT_LIST_ORDER):
+                    yield TXT_LIST_ORDER[frame["ordinal"]], value
+
+
+def _iter_csv_entries(stream: IO[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (list, name) pairs of a CSV file.
+
+    Either one column per list, with the list names in the header, or a
+    ``list,name`` column pair with one row per entry.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [_list_key(cell) for cell in header]
+    if any(columns):
+        for row in reader:
+            for list_key, cell in zip(columns, row):
+                if list_key is not None and cell.strip():
+                    yield list_key, cell.strip()
+        return
+
+    rows: Iterable[List[str]] = reader
+    if header[0].strip().lower() not in CSV_LIST_COLUMNS:
+        # No header, the first row is an entry
+        rows = _chain_row(header, reader)
+    for row in rows:
+        if len(row) >= 2 and row[1].strip():
+            list_key = _list_key(row[0])
+            if list_key is not None:
+                yield list_key, row[1].strip()
+
+
+def _chain_row(first: List[str], rows: Iterable[List[str]]) -> Iterator[List[str]]:
+    yield first
+    yield from rows
+
+
+def detect_format(filename: str, head: str) -> str:
+    """Guess the format of a preference file from its name and first characters.
+
+    Returns:
+        str: "json", "csv" or "txt"
+    """
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in ("json", "csv", "txt"):
+        return extension
+    stripped = head.lstrip()
+    if stripped.startswith("{"):
+        return "json"
+    if stripped.startswith("["):
+        return "txt"
+    return "csv"
+
+
+def import_preferences(
+    file: IO[bytes],
+    catalog_search: CatalogSearch,
+    filename: str = "",
+    min_similarity: float = 0.75,
+    max_reported: int = 50,
+    max_fuzzy: int = 1000,
+) -> ImportReport:
+    """Read a preference file and match its names against the catalog.
+
+    Supports the four-line TXT format of "Save Preferences", a JSON object
+    of lists and a CSV file. The file is read in chunks and the names are
+    matched list by list once it is read, so a long watch history costs one
+    pass over the file and one lookup per name.
+
+    Args:
+        file (IO[bytes]): Uploaded file
+        catalog_search (CatalogSearch): Search over the catalog lists
+        filename (str): Name of the file, used to detect the format
+        min_similarity (float): Minimum similarity of a fuzzy match
+        max_reported (int): Maximum number of fuzzy matches, unknown names and
+            unchecked names reported per list; the counts cover all of them
+        max_fuzzy (int): Maximum number of names per list compared by similarity
+
+    Returns:
+        ImportReport: The matched lists, in file order and without duplicates
+    """
+    start = time.perf_counter()
+    head = file.read(256).decode("utf-8-sig", errors="ignore")
+    file.seek(0)
+    file_format = detect_format(filename, head)
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        entries = _iter_csv_entries(stream)
+    else:
+        entries = _iter_list_entries(iter_tokens(stream))
+
+    # Names per list in file order, duplicates dropped while reading
+    names: Dict[str, Dict[str, None]] = {key: {} for key in PREFERENCE_FIELDS}
+    read = {key: 0 for key in PREFERENCE_FIELDS}
+    try:
+        for list_key, name in entries:
+            names[list_key].setdefault(name)
+            read[list_key] += 1
+    finally:
+        # Leave the uploaded file open
+        stream.detach()
+
+    report = ImportReport(format=file_format, read=read)
+    for list_key, field_name in PREFERENCE_FIELDS.items():
+        matches = catalog_search.match(
+            field_name, names[list_key], min_similarity=min_similarity, max_fuzzy=max_fuzzy
+        )
+        report.lists[list_key] = matches.matched
+        if matches.fuzzy:
+            report.fuzzy[list_key] = matches.fuzzy[:max_reported]
+            report.fuzzy_count += len(matches.fuzzy)
+        if matches.unknown:
+            report.unknown[list_key] = matches.unknown[:max_reported]
+            report.unknown_count += len(matches.unknown)
+        if matches.unchecked:
+            report.unchecked[list_key] = matches.unchecked[:max_reported]
+            report.unchecked_count += len(matches.unchecked)
+    report.seconds = time.perf_counter() - start
+    return report
+
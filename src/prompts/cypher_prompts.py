@@ -83,6 +83,36 @@ LIMIT 5
     """
 
 
+CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_TEMPLATE = """
+UNWIND $user_movies AS seedTitle
+MATCH (target:Movie {title: seedTitle})-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m:Movie)
+WHERE NOT m.title IN $excluded_movies
+WITH target, m, COUNT(DISTINCT g) AS sharedGenres
+OPTIONAL MATCH (target)<-[:ACTED_IN]-(a:Actor)-[:ACTED_IN]->(m)
+WITH target, m, sharedGenres, COUNT(DISTINCT a) AS sharedActors
+WITH m, 
+    target.title AS seed, 
+    (sharedGenres * 2 + sharedActors) AS seedScore
+ORDER BY seedScore DESC, seed
+WITH m, 
+    SUM(seedScore) AS score, 
+    COLLECT({seed: seed, score: seedScore}) AS seeds
+RETURN m.title AS RecommendedMovie, score, seeds
+ORDER BY score DESC, m.title 
+LIMIT $limit
+    """
+
+
+CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_TEMPLATE = """
+UNWIND $user_movies AS seedTitle
+OPTIONAL MATCH (target:Movie {title: seedTitle})
+RETURN seedTitle AS seed,
+    coalesce(target.similarComputedAt >= datetime() - duration({days: $max_age_days}), false) AS fresh,
+    [(target)-[s:SIMILAR]->(m:Movie) WHERE NOT m.title IN $excluded_movies 
+        | {title: m.title, score: s.score}] AS neighbours
+    """
+
+
 CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE = """
 MATCH (rec:Movie)-[:IN_GENRE]-(g:Genre)
 WHERE g.genre IN $user_genres
@@ -103,3 +133,197 @@ WITH rec, SIZE([actor IN $user_actors WHERE actor in Actors]) AS actorsMatchCoun
 ORDER BY actorsMatchCount DESC
 RETURN DISTINCT rec.title LIMIT 5
 """
+
+
+CYPHER_RESOLVE_PREFERENCE_IDS_TEMPLATE = """
+CALL {
+    UNWIND $titles AS title
+    MATCH (m:Movie {title: title})
+    RETURN collect([title, elementId(m)]) AS movies
+}
+CALL {
+    UNWIND $actors AS name
+    MATCH (a:Actor {actorName: name})
+    RETURN collect([name, elementId(a)]) AS actors
+}
+CALL {
+    UNWIND $genres AS name
+    MATCH (g:Genre {genre: name})
+    RETURN collect([name, elementId(g)]) AS genres
+}
+RETURN movies, actors, genres
+    """
+
+
+# The *_BY_ID templates take the node IDs resolved by src/database/preference_ids.py.
+# Exclusions are a single list parameter, so it is not rebuilt on every row.
+CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE = """
+MATCH (target:Movie)-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m:Movie)
+WHERE elementId(target) = $movie_id
+AND NOT elementId(m) IN $excluded_ids
+OPTIONAL MATCH (target)<-[:ACTED_IN]-(a:Actor)-[:ACTED_IN]->(m)
+WITH m, g, 
+    CASE WHEN a IS NOT NULL THEN a ELSE "No Actor" END AS validActor
+WITH m, 
+    COUNT(DISTINCT g) AS sharedGenres, 
+    COUNT(DISTINCT validActor) AS sharedActors
+WITH m, 
+    sharedGenres, 
+    sharedActors, 
+    (sharedGenres * 2 + sharedActors) AS score
+RETURN m.title AS RecommendedMovie, score
+ORDER BY score DESC, m.title 
+LIMIT 5
+    """
+
+
+CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE = """
+UNWIND $movie_ids AS seedId
+MATCH (target:Movie)-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m:Movie)
+WHERE elementId(target) = seedId
+AND NOT elementId(m) IN $excluded_ids
+WITH target, m, COUNT(DISTINCT g) AS sharedGenres
+OPTIONAL MATCH (target)<-[:ACTED_IN]-(a:Actor)-[:ACTED_IN]->(m)
+WITH target, m, sharedGenres, COUNT(DISTINCT a) AS sharedActors
+WITH m, 
+    target.title AS seed, 
+    (sharedGenres * 2 + sharedActors) AS seedScore
+ORDER BY seedScore DESC, seed
+WITH m, 
+    SUM(seedScore) AS score, 
+    COLLECT({seed: seed, score: seedScore}) AS seeds
+RETURN m.title AS RecommendedMovie, score, seeds
+ORDER BY score DESC, m.title 
+LIMIT $limit
+    """
+
+
+CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE = """
+UNWIND $movie_ids AS seedId
+OPTIONAL MATCH (target:Movie)
+WHERE elementId(target) = seedId
+RETURN seedId, target.title AS seed,
+    coalesce(target.similarComputedAt >= datetime() - duration({days: $max_age_days}), false) AS fresh,
+    [(target)-[s:SIMILAR]->(m:Movie) WHERE NOT elementId(m) IN $excluded_ids 
+        | {title: m.title, score: s.score}] AS neighbours
+    """
+
+
+CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE = """
+MATCH (rec:Movie)-[:IN_GENRE]->(g:Genre)
+WHERE elementId(g) IN $genre_ids
+AND NOT elementId(rec) IN $watched_ids
+WITH rec, COUNT(DISTINCT g) AS genreMatchCount
+ORDER BY genreMatchCount DESC, rec.title
+RETURN rec.title LIMIT 5
+    """
+
+
+CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE = """
+MATCH (rec:Movie)<-[:ACTED_IN]-(a:Actor)
+WHERE elementId(a) IN $actor_ids
+AND NOT elementId(rec) IN $watched_ids
+WITH rec, COUNT(DISTINCT a) AS actorsMatchCount
+ORDER BY actorsMatchCount DESC, rec.title
+RETURN rec.title LIMIT 5
+"""
+
+
+# The *_BY_USER templates start from the profile written by src/database/user_profiles.py,
+# so the parameters do not grow with the user's history. $seed_ids may limit the seeds.
+CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE = """
+MATCH (u:User {userId: $user_id})-[:LIKES]->(target:Movie)
+WHERE $seed_ids IS NULL OR elementId(target) IN $seed_ids
+MATCH (target)-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m:Movie)
+WHERE NOT (u)-[:LIKES|WATCHED]->(m)
+WITH u, target, m, COUNT(DISTINCT g) AS sharedGenres
+OPTIONAL MATCH (target)<-[:ACTED_IN]-(a:Actor)-[:ACTED_IN]->(m)
+WITH target, m, sharedGenres, COUNT(DISTINCT a) AS sharedActors
+WITH m, 
+    target.title AS seed, 
+    (sharedGenres * 2 + sharedActors) AS seedScore
+ORDER BY seedScore DESC, seed
+WITH m, 
+    SUM(seedScore) AS score, 
+    COLLECT({seed: seed, score: seedScore}) AS seeds
+RETURN m.title AS RecommendedMovie, score, seeds
+ORDER BY score DESC, m.title 
+LIMIT $limit
+    """
+
+
+CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_USER_TEMPLATE = """
+MATCH (u:User {userId: $user_id})-[:LIKES]->(target:Movie)
+RETURN elementId(target) AS seedId, target.title AS seed,
+    coalesce(target.similarComputedAt >= datetime() - duration({days: $max_age_days}), false) AS fresh,
+    [(target)-[s:SIMILAR]->(m:Movie) WHERE NOT (u)-[:LIKES|WATCHED]->(m) 
+        | {title: m.title, score: s.score}] AS neighbours
+    """
+
+
+CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE = """
+MATCH (u:User {userId: $user_id})-[:FAVOURITE_GENRE]->(g:Genre)<-[:IN_GENRE]-(rec:Movie)
+WHERE NOT (u)-[:WATCHED]->(rec)
+WITH rec, COUNT(DISTINCT g) AS genreMatchCount
+ORDER BY genreMatchCount DESC, rec.title
+RETURN rec.title LIMIT 5
+    """
+
+
+CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE = """
+MATCH (u:User {userId: $user_id})-[:FAVOURITE_ACTOR]->(a:Actor)-[:ACTED_IN]->(rec:Movie)
+WHERE NOT (u)-[:WATCHED]->(rec)
+WITH rec, COUNT(DISTINCT a) AS actorsMatchCount
+ORDER BY actorsMatchCount DESC, rec.title
+RETURN rec.title LIMIT 5
+"""
+
+
+CYPHER_HYBRID_RECOMMENDATION_TEMPLATE = """
+CALL db.index.vector.queryNodes($index_name, $fetch_k, $embedding) YIELD node, score
+WITH node, score
+WHERE NOT node.title IN $excluded_movies
+WITH collect({title: node.title, score: score}) AS vectorHits
+WITH vectorHits,
+    COLLECT {
+        UNWIND $user_movies AS seedTitle
+        MATCH (target:Movie {title: seedTitle})-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m:Movie)
+        WHERE NOT m.title IN $excluded_movies
+        WITH target, m, COUNT(DISTINCT g) AS sharedGenres
+        OPTIONAL MATCH (target)<-[:ACTED_IN]-(a:Actor)-[:ACTED_IN]->(m)
+        WITH target, m, sharedGenres, COUNT(DISTINCT a) AS sharedActors
+        WITH m, SUM(sharedGenres * 2 + sharedActors) AS score
+        ORDER BY score DESC, m.title
+        LIMIT $fetch_k
+        RETURN {title: m.title, score: score}
+    } AS movieHits,
+    COLLECT {
+        MATCH (m:Movie)-[:IN_GENRE]->(g:Genre)
+        WHERE g.genre IN $user_genres AND NOT m.title IN $excluded_movies
+        WITH m, COUNT(DISTINCT g) AS score
+        ORDER BY score DESC, m.title
+        LIMIT $fetch_k
+        RETURN {title: m.title, score: score}
+    } AS genreHits,
+    COLLECT {
+        MATCH (m:Movie)<-[:ACTED_IN]-(a:Actor)
+        WHERE a.actorName IN $user_actors AND NOT m.title IN $excluded_movies
+        WITH m, COUNT(DISTINCT a) AS score
+        ORDER BY score DESC, m.title
+        LIMIT $fetch_k
+        RETURN {title: m.title, score: score}
+    } AS actorHits
+WITH vectorHits, movieHits, genreHits, actorHits,
+    [hit IN vectorHits + movieHits + genreHits + actorHits | hit.title] AS titles
+RETURN vectorHits, movieHits, genreHits, actorHits,
+    COLLECT {
+        MATCH (m:Movie)
+        WHERE m.title IN titles
+        RETURN {
+            title: m.title,
+            description: m.description,
+            genres: [(m)-[:IN_GENRE]->(g:Genre) | g.genre],
+            actors: [(a:Actor)-[:ACTED_IN]->(m) | a.actorName][..5]
+        }
+    } AS movies
+    """
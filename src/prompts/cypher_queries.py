@@ -31,4 +31,77 @@ def get_actor_names(graph):
     results = graph.query(query)
 
     results_list = [record["name"] for record in results]
-    return results_list
\ No newline at end of file
+    return results_list
+
+def get_catalog_lists(graph):
+    query = """
+        CALL { MATCH (m:Movie) RETURN collect(m.title) AS titles }
+        CALL { MATCH (g:Genre) RETURN collect(g.genre) AS genres }
+        CALL { MATCH (a:Actor) RETURN collect(a.actorName) AS actors }
+        RETURN titles, genres, actors
+    """
+
+    results = graph.query(query)
+
+    record = results[0] if results else {"titles": [], "genres": [], "actors": []}
+    return record["titles"], record["genres"], record["actors"]
+
+def get_catalog_counts(graph):
+    # Counts the same non-null names get_catalog_lists collects
+    query = """
+        CALL { MATCH (m:Movie) RETURN count(m.title) AS movies }
+        CALL { MATCH (g:Genre) RETURN count(g.genre) AS genres }
+        CALL { MATCH (a:Actor) RETURN count(a.actorName) AS actors }
+        RETURN movies, genres, actors
+    """
+
+    results = graph.query(query)
+
+    record = results[0] if results else {"movies": 0, "genres": 0, "actors": 0}
+    return record["movies"], record["genres"], record["actors"]
+
+def get_movie_vector_count(graph):
+    query = """
+        MATCH (m:Movie)
+        WHERE m.descriptionEmbedding IS NOT NULL
+        RETURN count(m) AS count
+    """
+
+    results = graph.query(query)
+
+    return results[0]["count"] if results else 0
+
+def get_movie_vectors(graph, skip, limit):
+    query = """
+        MATCH (m:Movie)
+        WHERE m.descriptionEmbedding IS NOT NULL
+        RETURN elementId(m) AS id, m.title AS title, m.descriptionEmbedding AS embedding
+        ORDER BY id
+        SKIP $skip LIMIT $limit
+    """
+
+    results = graph.query(query, {"skip": skip, "limit": limit})
+
+    return [(record["id"], record["title"], record["embedding"]) for record in results]
+
+def get_movie_metadata(graph, ids):
+    query = """
+        UNWIND range(0, size($ids) - 1) AS position
+        MATCH (node:Movie)
+        WHERE elementId(node) = $ids[position]
+        RETURN
+            position,
+            node.description AS text,
+            {
+                title: node.title,
+                type: [(node)-[:IS_TYPE]->(MovieType) | MovieType.movieType],
+                directors: [(node)-[:DIRECTED_BY]->(Director) | Director.directorName],
+                actors: [(Actor)-[:ACTED_IN]->(node) | Actor.actorName],
+                genres: [(node)-[:IN_GENRE]->(genre) | genre.genre]
+            } AS metadata
+        ORDER BY position
+    """
+
+    results = graph.query(query, {"ids": ids})
+
+    return [(record["position"], record["text"], record["metadata"]) for record in results]
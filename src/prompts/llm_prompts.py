@@ -46,6 +46,9 @@ You can use "Movie recommendation based on user preferences" only when:
 4. Avoid to use this tool, if user does not instruct you to take his given preferences into account. As base pick up this tool take this phrases as an example:
 "based on my preferences", "according to movies I like", "taking my preferences into account"
 
+Use "Movie recommendation based on similar viewers" when the user asks what other viewers with a similar taste
+liked or watched, for example "what do people who like my movies watch" or "viewers like me".
+
 To use a tool, please use the following format in loop:
 
 ```
@@ -115,3 +118,58 @@ Recommendations:
 
 Remember to maintain a conversational and professional tone. 
 """
+
+HISTORY_SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and a movie
+recommendation assistant. Update the summary with the new messages below.
+
+Keep the movies, actors and genres the user mentioned, what they liked or
+disliked, and which titles were already recommended. Drop greetings and
+anything that will not help answer later questions.
+Write at most {max_words} words of plain text.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:
+"""
+
+HYBRID_RECOMMENDATION_PROMPT = """
+You are a movie recommendation assistant. The movies below were ranked for the
+user by combining how closely their descriptions match the request with how
+strongly they are connected to the movies, genres and actors the user likes.
+Each movie lists the signals that contributed to its rank.
+
+Recommend movies from this list only, keeping roughly its order, and explain in
+one sentence per movie why it fits, based on its signals and description.
+
+Ranked movies:
+{ranking}
+
+Respond in the following format:
+Recommendations:
+1. Recommendation 1 - reason
+2. Recommendation 2 - reason
+...
+"""
+
+COLLABORATIVE_RECOMMENDATION_PROMPT = """
+You are a movie recommendation assistant. The movies below are the ones most
+often liked and watched by viewers whose taste matches the user's favourite and
+watched movies. Each movie lists the user's movies it is closest to.
+
+Recommend movies from this list only, keeping its order, and explain in one
+sentence per movie that viewers who enjoyed the listed movies also liked it.
+
+Ranked movies:
+{ranking}
+
+Respond in the following format:
+Recommendations:
+1. Recommendation 1 - reason
+2. Recommendation 2 - reason
+...
+"""
@@ -0,0 +1,182 @@
+import importlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from src.monitoring.tracing import tracer
+
+
+@dataclass
+class ResourceTiming:
+    """How long a resource took to build, and which thread built it."""
+
+    name: str
+    seconds: float
+    status: str
+    thread: str
+    finished_at: float
+
+
+class ResourceRegistry:
+    """Process-wide registry of lazily built, shared resources.
+
+    Each resource is described by a factory and the resources it depends on.
+    It is built on the first ``get``, or by ``warm_up`` in a background thread,
+    exactly once per process. Concurrent callers wait for the thread that is
+    already building it. Every build is timed, so the startup report shows
+    what each component costs.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._depends_on: Dict[str, Sequence[str]] = {}
+        self._resources: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._timings: Dict[str, ResourceTiming] = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread: Optional[threading.Thread] = None
+        self.created_at = time.perf_counter()
+
+    def register(
+        self, name: str, factory: Callable[[], Any], depends_on: Sequence[str] = ()
+    ) -> None:
+        """Register a resource.
+
+        Args:
+            name (str): Name of the resource
+            factory (Callable[[], Any]): Builds the resource
+            depends_on (Sequence[str]): Resources built first, so their cost is
+                reported separately
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._depends_on[name] = tuple(depends_on)
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_ready(self, name: str) -> bool:
+        """Return whether a resource has been built."""
+        return name in self._resources
+
+    def get(self, name: str) -> Any:
+        """Return a resource, building it and its dependencies on first use.
+
+        Args:
+            name (str): Name of the resource
+
+        Returns:
+            Any: The shared resource
+
+        Raises:
+            KeyError: If no resource of that name is registered
+        """
+        if name in self._resources:
+            return self._resources[name]
+        if name not in self._factories:
+            raise KeyError(f"Unknown resource: {name}")
+
+        for dependency in self._depends_on[name]:
+            self.get(dependency)
+
+        with self._locks[name]:
+            if name in self._resources:
+                return self._resources[name]
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                with tracer.span(f"init.{name}", kind="init"):
+                    resource = self._factories[name]()
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                self._timings[name] = ResourceTiming(
+                    name=name,
+                    seconds=time.perf_counter() - start,
+                    status=status,
+                    thread=threading.current_thread().name,
+                    finished_at=time.perf_counter() - self.created_at,
+                )
+            self._resources[name] = resource
+            return resource
+
+    def warm_up(self, names: Optional[Sequence[str]] = None) -> threading.Thread:
+        """Build resources in a background thread, once per process.
+
+        Args:
+            names (Sequence[str], optional): Resources to build in this order,
+                default all in registration order
+
+        Returns:
+            threading.Thread: The warm-up thread
+        """
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(
+                    target=self._warm_up,
+                    args=(list(names or self._factories),),
+                    name="resource-warm-up",
+                    daemon=True,
+                )
+                self._warm_up_thread.start()
+            return self._warm_up_thread
+
+    def _warm_up(self, names: List[str]) -> None:
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Error warming up {name}: {e}")
+
+    def timing_report(self) -> List[Dict[str, Any]]:
+        """Return one row per built resource, in the order they finished."""
+        return [
+            {
+                "component": timing.name,
+                "ms": round(timing.seconds * 1000, 1),
+                "ready_at_ms": round(timing.finished_at * 1000, 1),
+                "status": timing.status,
+                "thread": timing.thread,
+            }
+            for timing in sorted(self._timings.values(), key=lambda t: t.finished_at)
+        ]
+
+
+def _import(module: str, attribute: str) -> Callable[[], Any]:
+    """Return a factory importing ``attribute`` from ``module``."""
+    return lambda: getattr(importlib.import_module(module), attribute)
+
+
+def _warm_vector_pool() -> Any:
+    pool = _import("src.tools.vector_recommender", "vector_recommender_pool")()
+    pool.warm_up()
+    return pool
+
+
+registry = ResourceRegistry()
+# Connecting to Neo4j also checks the schema snapshot
+registry.register("graph", _import("src.database.graph", "graph"))
+registry.register("llm", _import("src.chat.llm", "llm"))
+registry.register("catalog", _import("src.database.catalog", "catalog"), depends_on=["graph"])
+registry.register(
+    "catalog_search",
+    lambda: _import("src.database.catalog", "catalog_search")().warm_up(),
+    depends_on=["catalog"],
+)
+registry.register(
+    "user_profiles",
+    _import("src.database.user_profiles", "user_profile_store"),
+    depends_on=["graph"],
+)
+registry.register(
+    "preference_snapshot",
+    lambda: _import("src.database.preference_snapshot", "preference_snapshot_store")().warm_up(),
+    depends_on=["graph"],
+)
+registry.register("vector_pool", _warm_vector_pool, depends_on=["graph", "llm"])
+# Importing the agent module builds the tools, the Cypher QA chain and the agent
+registry.register(
+    "app",
+    _import("src.chat.agent", "MovieRecommenderApp"),
+    depends_on=["graph", "llm", "catalog", "vector_pool"],
+)
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List
+
+import streamlit as st
+from langchain.prompts import PromptTemplate
+from langchain.schema import StrOutputParser
+from langchain.tools import tool
+
+from src.chat.llm import llm
+from src.chat.streaming import ANSWER_TAG
+from src.database.collaborative_model import get_collaborative_model
+from src.monitoring.tracing import tracer
+from src.prompts.llm_prompts import COLLABORATIVE_RECOMMENDATION_PROMPT
+from src.tools.user_preferences import recommend_movies_user_preferences
+
+
+class MovieRecommenderCollaborative:
+    """Recommends movies that viewers with a similar taste liked or watched.
+
+    Uses the factor model trained offline from the stored user profiles
+    (``python -m src.database.collaborative_model``). Without a model, or
+    when it knows none of the session's movies, the preference-based tool
+    answers instead.
+    """
+
+    def __init__(self, model_directory: str = ".cache/collaborative_model", top_k: int = 10):
+        """Initialize the collaborative recommender.
+
+        Args:
+            model_directory (str): Directory of the trained model
+            top_k (int): Movies passed to the LLM
+        """
+        self.session_state = st.session_state
+        self.model_directory = model_directory
+        self.top_k = top_k
+        self.chat_chain = (
+            PromptTemplate.from_template(COLLABORATIVE_RECOMMENDATION_PROMPT)
+            | llm
+            | StrOutputParser()
+        ).with_config(tags=[ANSWER_TAG])
+
+    def rank(self) -> List[Dict[str, Any]]:
+        """Score the movies of the model for the session's liked and watched movies.
+
+        Returns:
+            List[Dict[str, Any]]: Up to ``top_k`` movies, best first, empty if
+                there is no model or it knows none of the session's movies
+        """
+        model = get_collaborative_model(self.model_directory)
+        if model is None:
+            return []
+        with tracer.span("collaborative.rank", kind="branch", model_version=model.version):
+            return model.recommend(
+                self.session_state.get("user_movies", []),
+                self.session_state.get("user_watched", []),
+                top_k=self.top_k,
+            )
+
+    @staticmethod
+    def _format_ranking(ranking: List[Dict[str, Any]]) -> str:
+        """Render the ranking as prompt text."""
+        return "\n".join(
+            f"{position}. {entry['title']} (closest to: {', '.join(entry['because'])})"
+            for position, entry in enumerate(ranking, start=1)
+        )
+
+    def generate_recommendation_response(self, user_input: str) -> str:
+        """Rank the movies and let the LLM explain the ranking.
+
+        Args:
+            user_input (str): The user message, passed on to the fallback tool
+
+        Returns:
+            str: Formatted recommendation response from the LLM
+        """
+        ranking = self.rank()
+        if not ranking:
+            return recommend_movies_user_preferences.func(user_input)
+        try:
+            return self.chat_chain.invoke({"ranking": self._format_ranking(ranking)})
+        except Exception as e:
+            print(f"Error generating collaborative recommendation response: {e}")
+            return "Sorry, I couldn't generate recommendations at this time."
+
+
+@tool("recommend_movies_collaborative", return_direct=True)
+def recommend_movies_collaborative(user_input: str) -> str:
+    """Tool to recommend movies liked by viewers with a similar taste to the user.
+
+    Returns:
+        str: The answer generated by the LLM
+    """
+    recommender = MovieRecommenderCollaborative(
+        model_directory=st.secrets.get("COLLABORATIVE_MODEL_DIR", ".cache/collaborative_model"),
+        top_k=int(st.secrets.get("COLLABORATIVE_TOP_K", 10)),
+    )
+    return recommender.generate_recommendation_response(user_input)
@@ -1,19 +1,29 @@
 import streamlit as st
-from langchain_neo4j import GraphCypherQAChain
 from langchain.prompts.prompt import PromptTemplate
 
 from src.chat.llm import llm
 from src.database.graph import graph
+from src.database.catalog import catalog
 from src.prompts.cypher_prompts import CYPHER_GENERATION_TEMPLATE
+from src.tools.cypher_cache import CachedGraphCypherQAChain, CypherCache
 
 # Create the Cypher prompt
 cypher_prompt = PromptTemplate.from_template(CYPHER_GENERATION_TEMPLATE)
 
+# Create the cache of generated Cypher queries
+cypher_cache = CypherCache(
+    catalog_provider=catalog.get_snapshot,
+    max_entries=int(st.secrets.get("CYPHER_CACHE_MAX_ENTRIES", 1024)),
+)
+
 # Create the Cypher QA chain
-recommend_movies_relationships = GraphCypherQAChain.from_llm(
+recommend_movies_relationships = CachedGraphCypherQAChain.from_llm(
     llm,
     graph=graph,
     cypher_prompt=cypher_prompt,
+    cypher_cache=cypher_cache,
+    # Prompt with the compact rendering of the schema snapshot
+    graph_schema=graph.get_schema,
     verbose=True,
     allow_dangerous_requests=True,
 )
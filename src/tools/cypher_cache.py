@@ -0,0 +1,322 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForChainRun
+from langchain_core.runnables import Runnable, RunnableConfig, patch_config
+from langchain_neo4j import GraphCypherQAChain
+from pydantic import Field
+
+from src.chat.embedding_cache import normalize_text
+from src.chat.streaming import ANSWER_TAG
+from src.database.catalog import CatalogSnapshot
+
+# Longest catalog name (in words) that is looked up in a question
+MAX_ENTITY_WORDS = 8
+
+# Catalog names shorter than this are too ambiguous to be treated as entities
+MIN_ENTITY_LENGTH = 4
+
+QUOTED_PATTERN = re.compile(r'"([^"]{2,})"')
+CODE_BLOCK_PATTERN = re.compile(r"```(?:cypher)?(.*?)```", re.DOTALL | re.IGNORECASE)
+PLACEHOLDER = "\x00{}\x00"
+
+
+def _canonical(text: str) -> str:
+    """Normalize text and drop punctuation so names can be matched word by word."""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize_text(text)).split())
+
+
+def _cypher_string(value: str) -> str:
+    """Escape a value so it can be placed inside a double-quoted Cypher string."""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class CypherCache:
+    """LRU cache of generated Cypher keyed on the normalized question.
+
+    Entity names found in a question (double-quoted strings and catalog
+    actors, genres and movie titles) are replaced by typed slots, so
+    "movies with tom hanks" and "movies with meg ryan" share one cached
+    template. Entries are dropped whenever the graph schema changes.
+    """
+
+    def __init__(
+        self,
+        catalog_provider: Optional[Callable[[], CatalogSnapshot]] = None,
+        max_entries: int = 1024,
+    ):
+        """Initialize the cache.
+
+        Args:
+            catalog_provider (Callable, optional): Returns the catalog used for entity extraction
+            max_entries (int): Maximum number of cached queries
+        """
+        self.catalog_provider = catalog_provider
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_hash: Optional[str] = None
+        self._names: Dict[str, Tuple[str, str]] = {}
+        self._names_version: Any = None
+        self.stats = {"hits": 0, "template_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def _entity_names(self) -> Dict[str, Tuple[str, str]]:
+        """Return a mapping of canonical catalog names to (kind, catalog value)."""
+        if self.catalog_provider is None:
+            return {}
+        try:
+            snapshot = self.catalog_provider()
+        except Exception as e:
+            print(f"Error loading catalog for the Cypher cache: {e}")
+            return self._names
+        if snapshot.version != self._names_version:
+            names = {}
+            for kind, values in (
+                ("movie", snapshot.movie_titles),
+                ("genre", snapshot.genre_names),
+                ("actor", snapshot.actor_names),
+            ):
+                for value in values:
+                    canonical = _canonical(value)
+                    if len(canonical) >= MIN_ENTITY_LENGTH:
+                        names[canonical] = (kind, value)
+            self._names, self._names_version = names, snapshot.version
+        return self._names
+
+    def extract_entities(self, question: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """Replace entity names in a question by typed slots.
+
+        Args:
+            question (str): The user question
+
+        Returns:
+            Tuple[str, List[Tuple[str, str]]]: The question template and the
+                (slot, value) pairs in order of appearance
+        """
+        entities: List[Tuple[str, str]] = []
+        counters: Dict[str, int] = {}
+
+        def slot(kind: str, value: str) -> str:
+            name = f"{kind}{counters.get(kind, 0)}"
+            counters[kind] = counters.get(kind, 0) + 1
+            entities.append((name, value))
+            return f"{{{name}}}"
+
+        names = self._entity_names()
+
+        def match_names(text: str) -> List[str]:
+            words = _canonical(text).split()
+            template: List[str] = []
+            i = 0
+            while i < len(words):
+                for size in range(min(MAX_ENTITY_WORDS, len(words) - i), 0, -1):
+                    match = names.get(" ".join(words[i : i + size]))
+                    if match is not None:
+                        template.append(slot(*match))
+                        i += size
+                        break
+                else:
+                    template.append(words[i])
+                    i += 1
+            return template
+
+        template: List[str] = []
+        position = 0
+        for match in QUOTED_PATTERN.finditer(question):
+            template.extend(match_names(question[position : match.start()]))
+            template.append(slot("quoted", match.group(1)))
+            position = match.end()
+        template.extend(match_names(question[position:]))
+        return " ".join(template), entities
+
+    @staticmethod
+    def _extract_cypher(text: str) -> str:
+        """Return the Cypher statement from an LLM answer, without code fences."""
+        match = CODE_BLOCK_PATTERN.search(text)
+        return (match.group(1) if match else text).strip()
+
+    @staticmethod
+    def _parameterize(cypher: str, entities: List[Tuple[str, str]]) -> Optional[str]:
+        """Replace the entity values in a query by placeholders.
+
+        Returns None when an entity does not appear as a string literal, since
+        the query can then not safely be reused for other values.
+        """
+        for name, value in entities:
+            pattern = re.compile(
+                r"([\"'])" + re.escape(_cypher_string(value)) + r"\1", re.IGNORECASE
+            )
+            cypher, count = pattern.subn(lambda _: '"' + PLACEHOLDER.format(name) + '"', cypher)
+            if count == 0:
+                return None
+        return cypher
+
+    def _check_schema(self, schema: str) -> None:
+        """Drop every entry if the schema differs from the one they were generated for."""
+        schema_hash = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+        if schema_hash != self._schema_hash:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._schema_hash = schema_hash
+
+    def _put(self, key: str, cypher: str) -> None:
+        """Store an entry and evict the least recently used ones."""
+        self._entries[key] = cypher
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, question: str, schema: str) -> Optional[str]:
+        """Return the cached Cypher for a question, or None on a miss."""
+        exact_key = "exact:" + normalize_text(question)
+        template_key, entities = self.extract_entities(question)
+        with self._lock:
+            self._check_schema(schema)
+            cypher = self._entries.get(exact_key)
+            if cypher is not None:
+                self._entries.move_to_end(exact_key)
+                self.stats["hits"] += 1
+                return cypher
+            template = self._entries.get("template:" + template_key) if entities else None
+            if template is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end("template:" + template_key)
+            self.stats["template_hits"] += 1
+        for name, value in entities:
+            template = template.replace(PLACEHOLDER.format(name), _cypher_string(value))
+        return template
+
+    def store(self, question: str, schema: str, generated: str) -> None:
+        """Store the Cypher generated for a question."""
+        cypher = self._extract_cypher(generated)
+        template_key, entities = self.extract_entities(question)
+        template = self._parameterize(cypher, entities) if entities else None
+        with self._lock:
+            self._check_schema(schema)
+            self._put("exact:" + normalize_text(question), cypher)
+            if template is not None:
+                self._put("template:" + template_key, template)
+            self.stats["stores"] += 1
+
+    def discard(self, question: str) -> None:
+        """Remove the entries of a question, e.g. after its query failed."""
+        template_key, entities = self.extract_entities(question)
+        with self._lock:
+            self._entries.pop("exact:" + normalize_text(question), None)
+            if entities:
+                self._entries.pop("template:" + template_key, None)
+
+    def wrap(self, generation_chain: Runnable) -> Runnable:
+        """Wrap a Cypher generation chain so cached queries skip the LLM call.
+
+        Args:
+            generation_chain (Runnable): Chain taking ``question`` and ``schema``
+                and returning the generated Cypher
+
+        Returns:
+            Runnable: Chain with the same input and output
+        """
+
+        return CachedCypherGeneration(cache=self, generation_chain=generation_chain)
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters, the hit rate and the number of entries."""
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["template_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            round((stats["hits"] + stats["template_hits"]) / lookups, 4) if lookups else 0.0
+        )
+        stats["entries"] = len(self._entries)
+        return stats
+
+
+def _with_callbacks(config: Optional[RunnableConfig], kwargs: Dict[str, Any]) -> RunnableConfig:
+    """Move a ``callbacks`` keyword argument into the runnable config.
+
+    GraphCypherQAChain passes the callbacks of its run to the generation and
+    QA steps as a keyword argument, which runnables ignore. Moving them into
+    the config makes those steps report to the chain instead of its caller.
+    """
+    callbacks = kwargs.pop("callbacks", None)
+    return patch_config(config, callbacks=callbacks) if callbacks is not None else config
+
+
+class RunWithCallbacks(Runnable[Dict[str, Any], Any]):
+    """Runnable that runs another one with the callbacks passed as a keyword argument."""
+
+    def __init__(self, bound: Runnable):
+        self.bound = bound
+
+    def invoke(
+        self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        """Invoke the wrapped runnable under the given callbacks."""
+        config = _with_callbacks(config, kwargs)
+        return self.bound.invoke(input, config, **kwargs)
+
+
+class CachedCypherGeneration(Runnable[Dict[str, Any], str]):
+    """Cypher generation step that serves repeated questions from a CypherCache."""
+
+    def __init__(self, cache: CypherCache, generation_chain: Runnable):
+        self.cache = cache
+        self.generation_chain = generation_chain
+
+    def invoke(
+        self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> str:
+        """Return the cached Cypher for the question or generate and store it."""
+        config = _with_callbacks(config, kwargs)
+        cached = self.cache.lookup(input["question"], input["schema"])
+        if cached is not None:
+            return cached
+        generated = self.generation_chain.invoke(input, config, **kwargs)
+        self.cache.store(input["question"], input["schema"], generated)
+        return generated
+
+
+class CachedGraphCypherQAChain(GraphCypherQAChain):
+    """GraphCypherQAChain whose Cypher generation step goes through a CypherCache."""
+
+    cypher_cache: Any = Field(default=None, exclude=True)
+
+    @classmethod
+    def from_llm(
+        cls,
+        *args: Any,
+        cypher_cache: CypherCache,
+        graph_schema: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        """Create the chain and wrap its generation step with the given cache.
+
+        Args:
+            cypher_cache (CypherCache): Cache of the generated queries
+            graph_schema (str, optional): Schema used in the Cypher prompt.
+                GraphCypherQAChain.from_llm always builds it from the structured
+                schema of the graph, so it is replaced here when given.
+        """
+        chain = super().from_llm(*args, **kwargs)
+        if graph_schema is not None:
+            chain.graph_schema = graph_schema
+        chain.cypher_cache = cypher_cache
+        chain.cypher_generation_chain = cypher_cache.wrap(chain.cypher_generation_chain)
+        chain.qa_chain = RunWithCallbacks(chain.qa_chain.with_config(tags=[ANSWER_TAG]))
+        return chain
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        """Run the chain and forget the cached query if executing it failed."""
+        try:
+            return super()._call(inputs, run_manager)
+        except Exception:
+            self.cypher_cache.discard(inputs[self.input_key])
+            raise
@@ -0,0 +1,216 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import streamlit as st
+from langchain.prompts import PromptTemplate
+from langchain.schema import StrOutputParser
+from langchain.tools import tool
+from langchain_neo4j import Neo4jGraph
+
+from src.chat.llm import embeddings, llm
+from src.chat.streaming import ANSWER_TAG
+from src.database.graph import graph
+from src.prompts.cypher_prompts import CYPHER_HYBRID_RECOMMENDATION_TEMPLATE
+from src.prompts.llm_prompts import HYBRID_RECOMMENDATION_PROMPT
+
+# Available score fusion methods
+FUSION_METHODS = ("rrf", "weighted")
+
+# Ranked lists returned by CYPHER_HYBRID_RECOMMENDATION_TEMPLATE, keyed by signal name
+SOURCES = {
+    "description": "vectorHits",
+    "movies": "movieHits",
+    "genres": "genreHits",
+    "actors": "actorHits",
+}
+
+DEFAULT_WEIGHTS = {"description": 1.0, "movies": 1.0, "genres": 0.5, "actors": 0.7}
+
+
+def fuse_rankings(
+    rankings: Dict[str, Sequence[Tuple[str, float]]],
+    method: str = "rrf",
+    weights: Optional[Dict[str, float]] = None,
+    rrf_k: int = 60,
+) -> List[Dict[str, Any]]:
+    """Merge several ranked lists of titles into one.
+
+    ``rrf`` adds ``weight / (rrf_k + rank)`` per list, which only depends on
+    the ranks and so needs no calibration between signals. ``weighted`` adds
+    ``weight * score / max_score`` per list.
+
+    Args:
+        rankings (Dict[str, Sequence[Tuple[str, float]]]): (title, score) pairs
+            per signal, best first
+        method (str): One of FUSION_METHODS
+        weights (Dict[str, float], optional): Weight per signal, default 1.0
+        rrf_k (int): Rank offset of reciprocal-rank fusion
+
+    Returns:
+        List[Dict[str, Any]]: Titles with their fused score and the rank, raw
+            score and contribution of every signal that found them, best first
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"method must be one of {FUSION_METHODS}")
+    weights = weights or {}
+    fused: Dict[str, Dict[str, Any]] = {}
+    for source, hits in rankings.items():
+        weight = weights.get(source, 1.0)
+        if not hits or not weight:
+            continue
+        max_score = max(score for _, score in hits) or 1.0
+        for rank, (title, score) in enumerate(hits, start=1):
+            if method == "rrf":
+                contribution = weight / (rrf_k + rank)
+            else:
+                contribution = weight * score / max_score
+            entry = fused.setdefault(title, {"title": title, "score": 0.0, "signals": {}})
+            entry["score"] += contribution
+            entry["signals"][source] = {
+                "rank": rank,
+                "score": round(float(score), 4),
+                "contribution": round(contribution, 4),
+            }
+    return sorted(fused.values(), key=lambda entry: (-entry["score"], entry["title"]))
+
+
+class MovieRecommenderHybrid:
+    """Recommends movies by fusing description similarity with graph similarity.
+
+    The vector index search and the graph scoring against the user's movies,
+    genres and actors run in a single Cypher query. Their ranked lists are
+    fused into one ranking, which a single LLM call turns into the answer.
+    """
+
+    def __init__(
+        self,
+        graph_instance: Neo4jGraph,
+        index_name: str = "MovieVector",
+        fusion: str = "rrf",
+        weights: Optional[Dict[str, float]] = None,
+        fetch_k: int = 20,
+        top_k: int = 10,
+        rrf_k: int = 60,
+    ):
+        """Initialize the hybrid recommender.
+
+        Args:
+            graph_instance (Neo4jGraph): Neo4j graph instance
+            index_name (str): Name of the movie description vector index
+            fusion (str): Score fusion method, one of FUSION_METHODS
+            weights (Dict[str, float], optional): Weight per signal, see DEFAULT_WEIGHTS
+            fetch_k (int): Candidates fetched per signal
+            top_k (int): Movies passed to the LLM
+            rrf_k (int): Rank offset of reciprocal-rank fusion
+        """
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"fusion must be one of {FUSION_METHODS}")
+        self.session_state = st.session_state
+        self.graph = graph_instance
+        self.index_name = index_name
+        self.fusion = fusion
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.fetch_k = fetch_k
+        self.top_k = top_k
+        self.rrf_k = rrf_k
+        self.chat_chain = (
+            PromptTemplate.from_template(HYBRID_RECOMMENDATION_PROMPT) | llm | StrOutputParser()
+        ).with_config(tags=[ANSWER_TAG])
+
+    def retrieve(self, user_input: str) -> Dict[str, Any]:
+        """Fetch the candidates of every signal and the movie details in one query.
+
+        Args:
+            user_input (str): Description of the wanted movies
+
+        Returns:
+            Dict[str, Any]: The record of CYPHER_HYBRID_RECOMMENDATION_TEMPLATE
+        """
+        user_movies = list(self.session_state.get("user_movies", []))
+        user_watched = list(self.session_state.get("user_watched", []))
+        params = {
+            "index_name": self.index_name,
+            "fetch_k": self.fetch_k,
+            "embedding": embeddings.embed_query(user_input),
+            "user_movies": user_movies,
+            "user_genres": list(self.session_state.get("user_genres", [])),
+            "user_actors": list(self.session_state.get("user_actors", [])),
+            "excluded_movies": list(set(user_movies) | set(user_watched)),
+        }
+        result = self.graph.query(CYPHER_HYBRID_RECOMMENDATION_TEMPLATE, params)
+        return result[0] if result else {}
+
+    def rank(self, user_input: str) -> List[Dict[str, Any]]:
+        """Return the fused ranking with the score breakdown and details of every movie.
+
+        Args:
+            user_input (str): Description of the wanted movies
+
+        Returns:
+            List[Dict[str, Any]]: Up to ``top_k`` movies, best first
+        """
+        record = self.retrieve(user_input)
+        rankings = {
+            source: [(hit["title"], hit["score"]) for hit in record.get(key) or []]
+            for source, key in SOURCES.items()
+        }
+        ranking = fuse_rankings(rankings, self.fusion, self.weights, self.rrf_k)[: self.top_k]
+        details = {movie["title"]: movie for movie in record.get("movies") or []}
+        for entry in ranking:
+            entry["score"] = round(entry["score"], 4)
+            entry.update(
+                {k: v for k, v in details.get(entry["title"], {}).items() if k != "title"}
+            )
+        return ranking
+
+    @staticmethod
+    def _format_ranking(ranking: List[Dict[str, Any]]) -> str:
+        """Render the ranking as prompt text."""
+        lines = []
+        for position, entry in enumerate(ranking, start=1):
+            signals = ", ".join(
+                f"{source} #{signal['rank']}" for source, signal in entry["signals"].items()
+            )
+            lines.append(
+                f"{position}. {entry['title']} (signals: {signals}; "
+                f"genres: {', '.join(entry.get('genres') or [])}; "
+                f"actors: {', '.join(entry.get('actors') or [])})\n"
+                f"   {entry.get('description') or ''}"
+            )
+        return "\n".join(lines)
+
+    def generate_recommendation_response(self, user_input: str) -> Dict[str, Any]:
+        """Rank the movies and let the LLM explain the top of the ranking.
+
+        Args:
+            user_input (str): Description of the wanted movies
+
+        Returns:
+            Dict[str, Any]: The answer and the ranking it is based on
+        """
+        ranking = self.rank(user_input)
+        if not ranking:
+            return {
+                "input": user_input,
+                "answer": "Sorry, I couldn't find any matching movies.",
+                "ranking": [],
+            }
+        answer = self.chat_chain.invoke({"ranking": self._format_ranking(ranking)})
+        return {"input": user_input, "answer": answer, "ranking": ranking}
+
+
+@tool("recommend_movies_hybrid", return_direct=True)
+def recommend_movies_hybrid(user_input: str) -> Dict[str, Any]:
+    """Tool to recommend movies matching a description and the user's preferences
+    in one ranked list.
+
+    Returns:
+        Dict[str, Any]: The answer generated by the LLM and the fused ranking
+    """
+    recommender = MovieRecommenderHybrid(
+        graph_instance=graph,
+        fusion=st.secrets.get("HYBRID_FUSION", "rrf"),
+        weights=dict(st.secrets.get("HYBRID_WEIGHTS", {})),
+        fetch_k=int(st.secrets.get("HYBRID_FETCH_K", 20)),
+        top_k=int(st.secrets.get("HYBRID_TOP_K", 10)),
+    )
+    return recommender.generate_recommendation_response(user_input)
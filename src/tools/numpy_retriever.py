@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_neo4j import Neo4jGraph
+from pydantic import ConfigDict
+
+import src.prompts.cypher_queries as cypher_queries
+
+VECTORS_FILE = "vectors.f32"
+MOVIES_FILE = "movies.json"
+CENTROIDS_FILE = "centroids.npy"
+ASSIGNMENTS_FILE = "assignments.npy"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale every row to unit length so a dot product equals cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _train_centroids(
+    vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 42
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster unit vectors with spherical k-means.
+
+    Args:
+        vectors (np.ndarray): Row-normalized float32 matrix
+        n_lists (int): Number of clusters
+        iterations (int): Number of k-means iterations
+        seed (int): Random seed for the initial centroids
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Centroids and the cluster of every row
+    """
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(vectors))
+    centroids = np.array(vectors[rng.choice(len(vectors), n_lists, replace=False)])
+    assignments = np.zeros(len(vectors), dtype=np.int32)
+    for _ in range(iterations):
+        for start in range(0, len(vectors), 4096):
+            block = vectors[start : start + 4096]
+            assignments[start : start + 4096] = np.argmax(block @ centroids.T, axis=1)
+        for cluster in range(n_lists):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalize_rows(centroids).astype(np.float32)
+    return centroids, assignments
+
+
+def export_movie_vectors(
+    graph: Neo4jGraph, directory: str, n_lists: int = 0, batch_size: int = 1000
+) -> int:
+    """Export every movie description embedding into a memory-mapped matrix.
+
+    Writes a float32 matrix of unit vectors, a sidecar table with the element
+    IDs and titles and, if ``n_lists`` is set, the IVF centroids and cluster
+    assignments.
+
+    Args:
+        graph (Neo4jGraph): Neo4j graph instance
+        directory (str): Output directory
+        n_lists (int): Number of IVF partitions, 0 for exact search only
+        batch_size (int): Number of movies fetched per query
+
+    Returns:
+        int: Number of exported movies
+    """
+    count = cypher_queries.get_movie_vector_count(graph)
+    if count == 0:
+        raise ValueError("No movie embeddings found to export")
+    os.makedirs(directory, exist_ok=True)
+
+    ids: List[str] = []
+    titles: List[str] = []
+    matrix = None
+    for skip in range(0, count, batch_size):
+        rows = cypher_queries.get_movie_vectors(graph, skip, batch_size)
+        if not rows:
+            break
+        block = np.asarray([row[2] for row in rows], dtype=np.float32)
+        if matrix is None:
+            matrix = np.memmap(
+                os.path.join(directory, VECTORS_FILE),
+                dtype=np.float32,
+                mode="w+",
+                shape=(count, block.shape[1]),
+            )
+        block = block[: count - len(ids)]
+        matrix[len(ids) : len(ids) + len(block)] = _normalize_rows(block)
+        ids.extend(row[0] for row in rows[: len(block)])
+        titles.extend(row[1] for row in rows[: len(block)])
+
+    if matrix is None:
+        raise ValueError("No movie embeddings found to export")
+
+    # Movies deleted during the export leave unused rows at the end of the file
+    dim = matrix.shape[1]
+    matrix.flush()
+    del matrix
+    os.truncate(os.path.join(directory, VECTORS_FILE), len(ids) * dim * 4)
+    vectors = np.memmap(
+        os.path.join(directory, VECTORS_FILE), dtype=np.float32, mode="r", shape=(len(ids), dim)
+    )
+
+    n_lists = min(n_lists, len(ids))
+    if n_lists:
+        centroids, assignments = _train_centroids(vectors, n_lists)
+        np.save(os.path.join(directory, CENTROIDS_FILE), centroids)
+        np.save(os.path.join(directory, ASSIGNMENTS_FILE), assignments)
+    else:
+        for name in (CENTROIDS_FILE, ASSIGNMENTS_FILE):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+    with open(os.path.join(directory, MOVIES_FILE), "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "count": len(ids), "ids": ids, "titles": titles}, f)
+    return len(ids)
+
+
+class NumpyVectorIndex:
+    """Read-only vector index over an exported, memory-mapped embedding matrix."""
+
+    def __init__(self, directory: str):
+        """Load an index written by ``export_movie_vectors``.
+
+        Args:
+            directory (str): Directory of the exported index
+        """
+        with open(os.path.join(directory, MOVIES_FILE), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.ids: List[str] = sidecar["ids"]
+        self.titles: List[str] = sidecar["titles"]
+        self.vectors = np.memmap(
+            os.path.join(directory, VECTORS_FILE),
+            dtype=np.float32,
+            mode="r",
+            shape=(sidecar["count"], sidecar["dim"]),
+        )
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        centroids_path = os.path.join(directory, CENTROIDS_FILE)
+        if os.path.exists(centroids_path):
+            self.centroids = np.load(centroids_path)
+            assignments = np.load(os.path.join(directory, ASSIGNMENTS_FILE))
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))
+            self._lists = np.split(order, bounds[:-1])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(
+        self, query_vector: List[float], k: int, n_probe: int = 0
+    ) -> List[Tuple[int, float]]:
+        """Return the rows most similar to the query vector.
+
+        Args:
+            query_vector (List[float]): Query embedding
+            k (int): Number of results
+            n_probe (int): Number of IVF partitions to scan, 0 for an exact search
+
+        Returns:
+            List[Tuple[int, float]]: Row numbers and scores, best first. Scores
+                are mapped to [0, 1] like the Neo4j cosine vector index.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        rows = None
+        if n_probe and self.centroids is not None:
+            probes = np.argsort(self.centroids @ query)[::-1][:n_probe]
+            rows = np.concatenate([self._lists[probe] for probe in probes])
+            scores = self.vectors[rows] @ query
+        else:
+            scores = self.vectors @ query
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        positions = rows[top] if rows is not None else top
+        return [
+            (int(position), float((score + 1) / 2))
+            for position, score in zip(positions, scores[top])
+        ]
+
+
+_indexes: Dict[str, NumpyVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_numpy_vector_index(directory: str) -> NumpyVectorIndex:
+    """Return the process-wide index for a directory, loading it on first use."""
+    with _indexes_lock:
+        if directory not in _indexes:
+            _indexes[directory] = NumpyVectorIndex(directory)
+        return _indexes[directory]
+
+
+class NumpyMovieRetriever(BaseRetriever):
+    """Retriever answering top-k queries in process and fetching metadata from Neo4j.
+
+    Returns documents in the same shape as the ``MovieVector`` retrieval query,
+    so it can replace the Neo4jVector retriever in the recommendation chain.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: Any
+    embeddings: Any
+    graph: Any
+    k: int = 4
+    n_probe: int = 0
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        k: Optional[int] = None,
+        excluded_titles: Optional[List[str]] = None,
+    ) -> List[Document]:
+        """Embed the query, search the local index and fetch metadata in one query.
+
+        Args:
+            query (str): Text to search for
+            run_manager (CallbackManagerForRetrieverRun): Callback manager of the run
+            k (int, optional): Number of documents, defaults to ``self.k``
+            excluded_titles (List[str], optional): Titles left out of the results;
+                enough extra rows are searched that ``k`` others remain
+        """
+        k = k or self.k
+        excluded = set(excluded_titles or ())
+        hits = self.index.search(
+            self.embeddings.embed_query(query), k + len(excluded), self.n_probe
+        )
+        hits = [hit for hit in hits if self.index.titles[hit[0]] not in excluded][:k]
+        if not hits:
+            return []
+        records = cypher_queries.get_movie_metadata(
+            self.graph, [self.index.ids[position] for position, _ in hits]
+        )
+        documents = []
+        for position, text, metadata in records:
+            documents.append(
+                Document(
+                    page_content=text or "",
+                    metadata={**metadata, "score": hits[position][1]},
+                )
+            )
+        return documents
+
+
+if __name__ == "__main__":
+    from src.database.graph import graph
+
+    parser = argparse.ArgumentParser(description="Export movie embeddings for the NumPy retriever")
+    parser.add_argument("--directory", default=".cache/movie_vectors")
+    parser.add_argument("--lists", type=int, default=0, help="IVF partitions, 0 for exact search")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    exported = export_movie_vectors(graph, args.directory, args.lists, args.batch_size)
+    print(f"Exported {exported} movie embeddings to {args.directory}")
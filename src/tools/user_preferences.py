@@ -1,32 +1,121 @@
-from typing import Any
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
 from langchain.prompts import PromptTemplate
 from langchain.schema import StrOutputParser
 from langchain.tools import tool
 from src.chat.llm import llm
+from src.chat.streaming import ANSWER_TAG
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from src.database.catalog import catalog
 from src.database.graph import graph
+from src.database.preference_ids import ResolvedPreferences, get_preference_resolver
+from src.database.preference_snapshot import (
+    PreferenceSnapshot,
+    PreferenceSnapshotStore,
+    preference_snapshot_store,
+)
+from src.database.user_profiles import UserProfileStore, user_profile_store
+from src.database.timeout_graph import supports_query_timeout
+from src.monitoring.tracing import tracer
 from langchain_neo4j import Neo4jGraph
+from neo4j.exceptions import Neo4jError, ServiceUnavailable, SessionExpired
 from src.prompts.cypher_prompts import (
-    CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE,
-    CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE,
-    CYPHER_ACTOR_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_USER_TEMPLATE,
+    CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
+    CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE,
 )
 from src.prompts.llm_prompts import USER_PREFERENCES_RECOMMENDATION_PROMPT
 
+# Available strategies for get_similar_movies
+SIMILARITY_MODES = ("per_seed", "batched", "precomputed")
+
+# Bounded thread pool shared by all sessions for the concurrent recommendation branches
+branch_executor = ThreadPoolExecutor(
+    max_workers=int(st.secrets.get("PREFERENCE_BRANCH_WORKERS", 6)),
+    thread_name_prefix="preference-branch",
+)
+
+
+def _is_unavailable_error(error: Exception) -> bool:
+    """Return whether an error means Neo4j is unreachable or too slow, not that a query is wrong."""
+    if isinstance(error, (ServiceUnavailable, SessionExpired, TimeoutError)):
+        return True
+    return isinstance(error, Neo4jError) and "TransactionTimedOut" in (error.code or "")
+
 
 class MovieRecommenderUserPreferences:
+    # Until when the branches skip Neo4j after an unreachable or slow server, shared by all sessions
+    _graph_unavailable_until = 0.0
+
     def __init__(
         self,
         graph_instance: Neo4jGraph,
+        similarity_mode: str = "batched",
+        similar_movies_top_k: int = 10,
+        concurrent: bool = True,
+        branch_timeout: float = 10.0,
+        query_timeout: Optional[float] = None,
+        precomputed_max_age_days: int = 30,
+        profile_store: Optional[UserProfileStore] = None,
+        snapshot_store: Optional[PreferenceSnapshotStore] = None,
+        fallback_cooldown: float = 30.0,
     ):
         """Initialize the MovieRecommender with the necessary dependencies.
 
         Args:
             session_state (st.session_state): Streamlit session state containing user preferences
             graph_instance (Neo4jGraph): Neo4j graph instance
+            similarity_mode (str): Default strategy of get_similar_movies, one of SIMILARITY_MODES
+            similar_movies_top_k (int): Number of movies returned by the batched strategy
+            concurrent (bool): Run the three recommendation branches in parallel
+            branch_timeout (float): Seconds to wait for each branch in concurrent mode
+            query_timeout (float, optional): Transaction timeout of every query,
+                so Neo4j aborts a hung query and frees its worker. Defaults to
+                ``branch_timeout``. Only sent to graphs whose ``query`` accepts
+                a ``timeout``, like ``TimeoutNeo4jGraph``.
+            precomputed_max_age_days (int): Age after which stored SIMILAR lists are ignored
+            profile_store (UserProfileStore, optional): Store of the session's profile.
+                When a profile is open, the queries start from its User node
+                instead of receiving the preference lists.
+            snapshot_store (PreferenceSnapshotStore, optional): Local copy of the
+                genres and actors of every movie. Branches that fail or time
+                out are answered from it, and so are all branches for
+                ``fallback_cooldown`` seconds afterwards.
+            fallback_cooldown (float): Seconds Neo4j is skipped after a failure
         """
+        if similarity_mode not in SIMILARITY_MODES:
+            raise ValueError(f"similarity_mode must be one of {SIMILARITY_MODES}")
         self.session_state = st.session_state
         self.graph = graph_instance
+        self.similarity_mode = similarity_mode
+        self.similar_movies_top_k = similar_movies_top_k
+        self.concurrent = concurrent
+        self.branch_timeout = branch_timeout
+        self.query_timeout = query_timeout or branch_timeout
+        self._query_kwargs = (
+            {"timeout": self.query_timeout} if supports_query_timeout(graph_instance) else {}
+        )
+        self.precomputed_max_age_days = precomputed_max_age_days
+        self.timings: dict = {}
+        self.resolver = get_preference_resolver(
+            graph_instance, self.session_state, catalog_provider=catalog.get_snapshot
+        )
+        self.preferences: Optional[ResolvedPreferences] = None
+        self.profile_store = profile_store
+        self.user_id: Optional[str] = None
+        self.snapshot_store = snapshot_store
+        self.fallback_cooldown = fallback_cooldown
+        # Branches computed from the snapshot, set by get_recommendations
+        self.local_branches: dict[str, Callable[[], list[str]]] = {}
         self._setup_llm_chain()
 
     def _setup_llm_chain(self) -> None:
@@ -34,7 +123,41 @@ class MovieRecommenderUserPreferences:
         self.prompt_template = PromptTemplate.from_template(
             USER_PREFERENCES_RECOMMENDATION_PROMPT
         )
-        self.chat_chain = self.prompt_template | llm | StrOutputParser()
+        self.chat_chain = (self.prompt_template | llm | StrOutputParser()).with_config(
+            tags=[ANSWER_TAG]
+        )
+
+    def _resolve_preferences(self) -> ResolvedPreferences:
+        """Return the node IDs of the user's preferences.
+
+        The session's resolver only queries Neo4j when the preference lists
+        changed since the last call, and then only for the new names.
+
+        Returns:
+            ResolvedPreferences: Node IDs of the liked and watched movies, actors and genres
+        """
+        if self.preferences is None:
+            try:
+                self.preferences = self.resolver.resolve(self.session_state)
+            except Exception as e:
+                print(f"Error resolving preferences: {e}")
+                if self.local_branches:
+                    # The recommendations are computed from the snapshot instead
+                    raise
+                self.preferences = ResolvedPreferences()
+        return self.preferences
+
+    def _profile_id(self) -> Optional[str]:
+        """Return the ID of the session's stored profile, after writing its pending changes.
+
+        Returns:
+            Optional[str]: ID of the User node, None if no profile is open
+        """
+        if self.profile_store is None:
+            return None
+        if self.user_id is None:
+            self.user_id = self.profile_store.sync(self.session_state)
+        return self.user_id
 
     def _query_graph(self, template: str, params: dict) -> list:
         """Execute a Cypher query on the graph with the given template and parameters.
@@ -44,32 +167,172 @@ class MovieRecommenderUserPreferences:
             params (dict): Parameters to substitute into the template
 
         Returns:
-            list: List of records from the query result
+            list: List of records from the query result. Errors are re-raised
+                rather than returned as an empty list.
+
+        Raises:
+            Exception: If the query fails or times out, so the branch reports an error
         """
         try:
-            result = self.graph.query(template, params)
-            return result
+            return self.graph.query(template, params, **self._query_kwargs)
         except Exception as e:
             print(f"Error executing query: {e}")
-            return []
+            raise
+
+    def get_similar_movies(self, mode: Optional[str] = None) -> list[str]:
+        """Retrieve movies similar to the ones the user likes.
 
-    def get_similar_movies(self) -> list[str]:
-        """Retrieve movies similar to the ones the user has watched.
+        Args:
+            mode (str, optional): "per_seed" runs one query per favourite movie,
+                "batched" scores all of them in a single query and
+                "precomputed" reads the stored SIMILAR relationships. Defaults
+                to the strategy chosen at construction.
 
         Returns:
             list[str]: List of similar movie titles
         """
-        user_movies = self.session_state.user_movies
-        user_watched_movies = self.session_state.user_watched
+        mode = mode or self.similarity_mode
+        if mode == "per_seed":
+            return self._get_similar_movies_per_seed()
+        if mode in ("batched", "precomputed"):
+            return [
+                record["title"]
+                for record in self.get_similar_movies_scored(
+                    precomputed=mode == "precomputed"
+                )
+            ]
+        raise ValueError(f"mode must be one of {SIMILARITY_MODES}")
 
-        similar_movies = []
-        for movie in user_movies:
+    def get_similar_movies_scored(
+        self, top_k: Optional[int] = None, precomputed: bool = False
+    ) -> list[dict]:
+        """Score movies against all favourite movies in a single round trip.
+
+        Scores of a candidate are summed over every favourite movie it shares
+        genres or actors with, so the result is deduplicated and ranked globally.
+
+        Args:
+            top_k (int, optional): Number of movies to return
+            precomputed (bool): Read the stored SIMILAR relationships and only
+                score missing or stale favourites live
+
+        Returns:
+            list[dict]: Records with the title, the aggregated score and the
+                per-seed scores that contributed to it
+        """
+        limit = top_k or self.similar_movies_top_k
+        if self._profile_id() is not None:
+            if not self.session_state.get("user_movies"):
+                return []
+            # The profile's LIKES and WATCHED relationships are the seeds and exclusions
+            seed_ids, excluded_ids = None, None
+        else:
+            preferences = self._resolve_preferences()
+            seed_ids = preferences.params["movie_ids"]
+            if not seed_ids:
+                return []
+            excluded_ids = preferences.params["excluded_ids"]
+
+        if precomputed:
+            return self._get_similar_movies_precomputed(seed_ids, excluded_ids, limit)
+        return self._get_similar_movies_live(seed_ids, excluded_ids, limit)
+
+    def _get_similar_movies_live(
+        self, seed_ids: Optional[list[str]], excluded_ids: Optional[list[str]], limit: int
+    ) -> list[dict]:
+        """Score the candidates of the given seeds with the batched similarity query.
+
+        With a profile open, ``seed_ids`` None scores all liked movies and
+        ``excluded_ids`` is ignored.
+        """
+        if self.user_id is not None:
+            template = CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_USER_TEMPLATE
+            params = {"user_id": self.user_id, "seed_ids": seed_ids, "limit": limit}
+        else:
+            template = CYPHER_MOVIE_SIMILARITY_BATCH_SEARCH_BY_ID_TEMPLATE
             params = {
-                "movie_title": movie,
-                "user_movies": user_movies,
-                "user_watched_movies": user_watched_movies,
+                "movie_ids": seed_ids,
+                "excluded_ids": excluded_ids,
+                "limit": limit,
+            }
+        result = self._query_graph(template, params)
+        return [
+            {
+                "title": record["RecommendedMovie"],
+                "score": record["score"],
+                "seeds": record["seeds"],
             }
-            result = self._query_graph(CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE, params)
+            for record in result
+        ]
+
+    def _get_similar_movies_precomputed(
+        self, seed_ids: Optional[list[str]], excluded_ids: Optional[list[str]], limit: int
+    ) -> list[dict]:
+        """Aggregate the stored SIMILAR lists, falling back to the live query for some seeds.
+
+        A seed is scored live when its list is stale, or when fewer than
+        ``limit`` of its stored neighbours remain after the exclusions. The
+        stored lists are cut to the top N before the watched movies are
+        removed, so a long watch history can use them up.
+        """
+        if self.user_id is not None:
+            template = CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_USER_TEMPLATE
+            params = {"user_id": self.user_id, "max_age_days": self.precomputed_max_age_days}
+        else:
+            template = CYPHER_MOVIE_SIMILARITY_PRECOMPUTED_BY_ID_TEMPLATE
+            params = {
+                "movie_ids": seed_ids,
+                "excluded_ids": excluded_ids,
+                "max_age_days": self.precomputed_max_age_days,
+            }
+        result = self._query_graph(template, params)
+        fresh_seeds = {
+            record["seedId"]
+            for record in result
+            if record["fresh"] and len(record["neighbours"] or []) >= limit
+        }
+
+        candidates: dict[str, dict] = {}
+        for record in result:
+            if record["seedId"] not in fresh_seeds:
+                continue
+            for neighbour in record["neighbours"] or []:
+                candidate = candidates.setdefault(
+                    neighbour["title"],
+                    {"title": neighbour["title"], "score": 0, "seeds": []},
+                )
+                candidate["score"] += neighbour["score"]
+                candidate["seeds"].append({"seed": record["seed"], "score": neighbour["score"]})
+
+        stale_seeds = [
+            record["seedId"] for record in result if record["seedId"] not in fresh_seeds
+        ]
+        if stale_seeds:
+            for record in self._get_similar_movies_live(stale_seeds, excluded_ids, limit):
+                candidate = candidates.setdefault(
+                    record["title"], {"title": record["title"], "score": 0, "seeds": []}
+                )
+                candidate["score"] += record["score"]
+                candidate["seeds"].extend(record["seeds"])
+
+        ranked = sorted(candidates.values(), key=lambda c: (-c["score"], c["title"]))
+        for candidate in ranked:
+            candidate["seeds"].sort(key=lambda s: (-s["score"], s["seed"]))
+        return ranked[:limit]
+
+    def _get_similar_movies_per_seed(self) -> list[str]:
+        """Run the similarity query once per favourite movie and concatenate the results.
+
+        Returns:
+            list[str]: List of similar movie titles
+        """
+        preferences = self._resolve_preferences()
+        excluded_ids = preferences.params["excluded_ids"]
+
+        similar_movies = []
+        for movie_id in preferences.params["movie_ids"]:
+            params = {"movie_id": movie_id, "excluded_ids": excluded_ids}
+            result = self._query_graph(CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE, params)
             similar_movies.extend([record["RecommendedMovie"] for record in result])
         return similar_movies
 
@@ -79,14 +342,22 @@ class MovieRecommenderUserPreferences:
         Returns:
             list[str]: List of movie titles from the selected genres
         """
-        user_genres = self.session_state.user_genres
-        user_watched_movies = self.session_state.user_watched
+        if self._profile_id() is not None:
+            if not self.session_state.get("user_genres"):
+                return []
+            params = {"user_id": self.user_id}
+            result = self._query_graph(CYPHER_GENRE_SIMILARITY_SEARCH_BY_USER_TEMPLATE, params)
+            return [record["rec.title"] for record in result]
+
+        preferences = self._resolve_preferences()
+        if not preferences.genre_ids:
+            return []
 
         params = {
-            "user_genres": user_genres,
-            "user_watched_movies": user_watched_movies,
+            "genre_ids": preferences.params["genre_ids"],
+            "watched_ids": preferences.params["watched_ids"],
         }
-        result = self._query_graph(CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE, params)
+        result = self._query_graph(CYPHER_GENRE_SIMILARITY_SEARCH_BY_ID_TEMPLATE, params)
         return [record["rec.title"] for record in result]
 
     def get_actor_recommendations(self) -> list[str]:
@@ -95,31 +366,203 @@ class MovieRecommenderUserPreferences:
         Returns:
             list[str]: List of movie titles featuring the selected actors
         """
-        user_actors = self.session_state.user_actors
-        user_watched_movies = self.session_state.user_watched
+        if self._profile_id() is not None:
+            if not self.session_state.get("user_actors"):
+                return []
+            params = {"user_id": self.user_id}
+            result = self._query_graph(CYPHER_ACTOR_SIMILARITY_SEARCH_BY_USER_TEMPLATE, params)
+            return [record["rec.title"] for record in result]
+
+        preferences = self._resolve_preferences()
+        if not preferences.actor_ids:
+            return []
 
         params = {
-            "user_actors": user_actors,
-            "user_watched_movies": user_watched_movies,
+            "actor_ids": preferences.params["actor_ids"],
+            "watched_ids": preferences.params["watched_ids"],
         }
-        result = self._query_graph(CYPHER_ACTOR_SIMILARITY_SEARCH_TEMPLATE, params)
+        result = self._query_graph(CYPHER_ACTOR_SIMILARITY_SEARCH_BY_ID_TEMPLATE, params)
         return [record["rec.title"] for record in result]
 
-    def get_recommendations(self) -> dict:
+    def _branches(self) -> dict[str, Callable[[], list[str]]]:
+        """Return the independent recommendation branches keyed by result name."""
+        return {
+            "similar_movies": self.get_similar_movies,
+            "genre_movies": self.get_genre_recommendations,
+            "actor_movies": self.get_actor_recommendations,
+        }
+
+    def _local_branches(self, snapshot: PreferenceSnapshot) -> dict[str, Callable[[], list[str]]]:
+        """Return the branches computed from the snapshot and the session's lists.
+
+        They rank like the Cypher templates. The precomputed mode scores live,
+        as the snapshot has no SIMILAR relationships.
+        """
+        liked = self.session_state.get("user_movies", []) or []
+        watched = self.session_state.get("user_watched", []) or []
+        excluded = [*liked, *watched]
+
+        def similar_movies() -> list[str]:
+            if self.similarity_mode == "per_seed":
+                return snapshot.similar_movies_per_seed(liked, excluded)
+            return [
+                record["title"]
+                for record in snapshot.similar_movies(liked, excluded, self.similar_movies_top_k)
+            ]
+
+        return {
+            "similar_movies": similar_movies,
+            "genre_movies": lambda: snapshot.genre_recommendations(
+                self.session_state.get("user_genres", []) or [], watched
+            ),
+            "actor_movies": lambda: snapshot.actor_recommendations(
+                self.session_state.get("user_actors", []) or [], watched
+            ),
+        }
+
+    def _mark_graph_unavailable(self) -> None:
+        """Answer all branches from the snapshot for the next ``fallback_cooldown`` seconds.
+
+        Only called for connection errors and timeouts. A query that fails for
+        another reason would fail again, so it only sends its own branch to
+        the snapshot.
+        """
+        MovieRecommenderUserPreferences._graph_unavailable_until = (
+            time.time() + self.fallback_cooldown
+        )
+
+    def _run_local(self, name: str) -> list[str]:
+        """Compute a branch from the snapshot, empty on error."""
+        try:
+            with tracer.span(f"preferences.{name}", kind="branch", engine="local"):
+                return self.local_branches[name]()
+        except Exception as e:
+            print(f"Error in local recommendation branch {name}: {e}")
+            return []
+
+    def _run_branch(self, name: str, branch: Callable[[], list[str]], ctx) -> list[str]:
+        """Run a single branch and record its timing.
+
+        A failed branch is computed from the snapshot when there is one.
+
+        Args:
+            name (str): Name of the branch
+            branch (Callable): Branch to execute
+            ctx: Streamlit script run context to attach to worker threads
+
+        Returns:
+            list[str]: Result of the branch, empty on error
+        """
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
+        start = time.perf_counter()
+        engine = "neo4j"
+        try:
+            with tracer.span(f"preferences.{name}", kind="branch"):
+                result = branch()
+            status = "ok"
+        except Exception as e:
+            print(f"Error in recommendation branch {name}: {e}")
+            result, status = [], "error"
+            if name in self.local_branches:
+                if _is_unavailable_error(e):
+                    self._mark_graph_unavailable()
+                result, status, engine = self._run_local(name), "fallback", "local"
+        # A branch finishing after its timeout keeps the "timeout" entry
+        self.timings.setdefault(
+            name,
+            {"seconds": round(time.perf_counter() - start, 4), "status": status, "engine": engine},
+        )
+        return result
+
+    def _get_local_recommendations(self) -> dict:
+        """Compute all branches from the snapshot and record their timings."""
+        recommendations = {}
+        for name in self.local_branches:
+            start = time.perf_counter()
+            recommendations[name] = self._run_local(name)
+            self.timings[name] = {
+                "seconds": round(time.perf_counter() - start, 4),
+                "status": "ok",
+                "engine": "local",
+            }
+        return recommendations
+
+    def get_recommendations(self, concurrent: Optional[bool] = None) -> dict:
         """Combine all recommendations into a single structured response.
 
+        In concurrent mode the three branches run on a shared bounded thread
+        pool. Branches that do not finish within ``branch_timeout`` contribute
+        an empty list, so a slow branch never holds back the others. Timings of
+        every branch are stored in ``self.timings``.
+
+        With a snapshot store, failed and timed out branches are computed
+        locally instead, and while Neo4j is marked unavailable no query is
+        sent at all.
+
+        Args:
+            concurrent (bool, optional): Overrides the mode chosen at construction
+
         Returns:
             dict: Dictionary containing similar movies, genre-based, and actor-based recommendations
         """
-        similar_movies = self.get_similar_movies()
-        genre_movies = self.get_genre_recommendations()
-        actor_movies = self.get_actor_recommendations()
+        concurrent = self.concurrent if concurrent is None else concurrent
+        self.timings = {}
+        # Resolved once up front, so the branches share the profile or the node IDs
+        self.preferences = None
+        self.user_id = None
+        snapshot = self.snapshot_store.get() if self.snapshot_store is not None else None
+        self.local_branches = self._local_branches(snapshot) if snapshot is not None else {}
+        if self.local_branches and time.time() < self._graph_unavailable_until:
+            return self._get_local_recommendations()
+        try:
+            if self._profile_id() is None:
+                self._resolve_preferences()
+        except Exception as e:
+            # Only raised when the snapshot can answer, see _resolve_preferences
+            if _is_unavailable_error(e):
+                self._mark_graph_unavailable()
+            return self._get_local_recommendations()
+        branches = self._branches()
 
-        return {
-            "similar_movies": similar_movies,
-            "genre_movies": genre_movies,
-            "actor_movies": actor_movies,
+        if not concurrent:
+            return {
+                name: self._run_branch(name, branch, None)
+                for name, branch in branches.items()
+            }
+
+        ctx = get_script_run_ctx()
+        start = time.perf_counter()
+        # Each branch runs in a copy of the current context, so its spans nest below the active one
+        futures = {
+            name: branch_executor.submit(
+                contextvars.copy_context().run, self._run_branch, name, branch, ctx
+            )
+            for name, branch in branches.items()
+        }
+        wait(futures.values(), timeout=self.branch_timeout)
+
+        recommendations = {}
+        for name, future in futures.items():
+            if future.done():
+                recommendations[name] = future.result()
+            else:
+                future.cancel()
+                print(f"Recommendation branch {name} timed out after {self.branch_timeout}s")
+                recommendations[name], engine = [], "neo4j"
+                if name in self.local_branches:
+                    self._mark_graph_unavailable()
+                    recommendations[name], engine = self._run_local(name), "local"
+                self.timings[name] = {
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "status": "timeout",
+                    "engine": engine,
+                }
+        self.timings["total"] = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "status": "ok",
         }
+        return recommendations
 
     def generate_recommendation_response(self) -> str:
         """Use the LLM chain to generate a human-readable recommendation response.
@@ -156,5 +599,15 @@ def recommend_movies_user_preferences(input, actual_graph: Neo4jGraph = graph) -
         str: A formatted string containing movie recommendations.
     """
 
-    recommender = MovieRecommenderUserPreferences(graph_instance=actual_graph)
+    recommender = MovieRecommenderUserPreferences(
+        graph_instance=actual_graph,
+        similarity_mode=st.secrets.get("SIMILARITY_MODE", "batched"),
+        profile_store=(
+            user_profile_store
+            if str(st.secrets.get("USER_PROFILES_ENABLED", False)).lower() in ("true", "1")
+            else None
+        ),
+        snapshot_store=preference_snapshot_store,
+        fallback_cooldown=float(st.secrets.get("PREFERENCE_FALLBACK_COOLDOWN", 30)),
+    )
     return recommender.generate_recommendation_response()
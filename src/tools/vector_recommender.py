@@ -1,22 +1,128 @@
-from typing import Dict, Any
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
 import streamlit as st
 from langchain_neo4j import Neo4jVector
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnablePassthrough
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from langchain.tools import tool
+from pydantic import ConfigDict
 
 from src.chat.llm import llm, embeddings
+from src.chat.streaming import ANSWER_TAG
 from src.database.graph import graph
 from src.prompts.llm_prompts import VECTOR_RECOMMENDATION_PROMPT
+from src.tools.numpy_retriever import NumpyMovieRetriever, get_numpy_vector_index
+
+# Available retriever backends for MovieRecommenderVectorSimilarity
+RETRIEVER_BACKENDS = ("neo4j", "numpy")
+
+
+class Neo4jMovieRetriever(BaseRetriever):
+    """Retriever over the ``MovieVector`` index that leaves out excluded titles.
+
+    The exclusion is applied in the retrieval query. Neo4jVector limits the
+    index hits to the requested count before that query runs, so the search
+    over-fetches: it starts at ``over_fetch`` times ``k`` and doubles until
+    ``k`` results remain. ``k`` plus the number of excluded titles always
+    suffices, so that is the last step, capped at ``max_fetch``.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Any
+    k: int = 4
+    over_fetch: int = 2
+    max_fetch: int = 200
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        k: Optional[int] = None,
+        excluded_titles: Optional[List[str]] = None,
+    ) -> List[Document]:
+        """Search the vector index until ``k`` movies that are not excluded are found.
+
+        Args:
+            query (str): Text to search for
+            run_manager (CallbackManagerForRetrieverRun): Callback manager of the run
+            k (int, optional): Number of documents, defaults to ``self.k``
+            excluded_titles (List[str], optional): Titles left out of the results
+
+        Returns:
+            List[Document]: Up to ``k`` movies, best first
+        """
+        k = k or self.k
+        excluded = list(excluded_titles or [])
+        embedding = self.vector_store.embedding.embed_query(query)
+        limit = max(k, min(k + len(excluded), self.max_fetch))
+        fetch = min(k * self.over_fetch, limit) if excluded else k
+        while True:
+            results = self.vector_store.similarity_search_with_score_by_vector(
+                embedding,
+                k=fetch,
+                params={"excluded_titles": excluded, "result_k": k},
+                query=query,
+            )
+            if len(results) >= k or fetch >= limit:
+                break
+            fetch = min(fetch * 2, limit)
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "score": score})
+            for doc, score in results[:k]
+        ]
 
 
 class MovieRecommenderVectorSimilarity:
     """A class for recommending movies based on descriptions using Neo4j and LangChain."""
 
-    def __init__(self):
-        """Initialize the movie recommender system."""
-        self._initialize_neo4j_vector()
+    def __init__(
+        self,
+        retriever_backend: Optional[str] = None,
+        numpy_index_dir: Optional[str] = None,
+        numpy_n_probe: Optional[int] = None,
+        top_k: Optional[int] = None,
+        max_fetch: Optional[int] = None,
+    ):
+        """Initialize the movie recommender system.
+
+        Arguments left as None are read from the secrets when the recommender is created.
+
+        Args:
+            retriever_backend (str, optional): "neo4j" queries the MovieVector index,
+                "numpy" searches an exported matrix in process
+            numpy_index_dir (str, optional): Directory written by numpy_retriever.export_movie_vectors
+            numpy_n_probe (int, optional): IVF partitions scanned by the numpy backend, 0 for exact search
+            top_k (int, optional): Default number of movies passed to the LLM
+            max_fetch (int, optional): Maximum index hits fetched to replace excluded movies
+        """
+        if retriever_backend is None:
+            retriever_backend = st.secrets.get("VECTOR_BACKEND", "neo4j")
+        if numpy_index_dir is None:
+            numpy_index_dir = st.secrets.get("NUMPY_INDEX_DIR", ".cache/movie_vectors")
+        if numpy_n_probe is None:
+            numpy_n_probe = int(st.secrets.get("NUMPY_INDEX_PROBES", 0))
+        if top_k is None:
+            top_k = int(st.secrets.get("VECTOR_TOP_K", 4))
+        if max_fetch is None:
+            max_fetch = int(st.secrets.get("VECTOR_MAX_FETCH", 200))
+        if retriever_backend not in RETRIEVER_BACKENDS:
+            raise ValueError(f"retriever_backend must be one of {RETRIEVER_BACKENDS}")
+        self.retriever_backend = retriever_backend
+        self.numpy_index_dir = numpy_index_dir
+        self.numpy_n_probe = numpy_n_probe
+        self.top_k = top_k
+        self.max_fetch = max_fetch
+        if retriever_backend == "neo4j":
+            self._initialize_neo4j_vector()
         self._setup_retriever()
         self._setup_prompt()
         self._setup_chain()
@@ -31,13 +137,18 @@ class MovieRecommenderVectorSimilarity:
             text_node_property="description",
             embedding_node_property="descriptionEmbedding",
             retrieval_query="""
+                WITH node, score
+                WHERE NOT node.title IN $excluded_titles
+                WITH node, score
+                ORDER BY score DESC
+                LIMIT $result_k
                 RETURN
                     node.description AS text,
                     score,
                     {
                         title: node.title,
                         type: [(node)-[:IS_TYPE]->(MovieType) | MovieType.movieType],
-                        directors: [ (Director)-[:DIRECTED_BY]->(node) | Director.directorName ],
+                        directors: [ (node)-[:DIRECTED_BY]->(Director) | Director.directorName ],
                         actors: [ (Actor)-[r:ACTED_IN]->(node) | Actor.actorName ],
                         genres: [ (node)-[:IN_GENRE]->(genre) | genre.genre]
                     } AS metadata
@@ -46,7 +157,18 @@ class MovieRecommenderVectorSimilarity:
 
     def _setup_retriever(self) -> None:
         """Set up the retriever for fetching movie data."""
-        self.retriever = self.neo4jvector.as_retriever()
+        if self.retriever_backend == "numpy":
+            self.retriever = NumpyMovieRetriever(
+                index=get_numpy_vector_index(self.numpy_index_dir),
+                embeddings=embeddings,
+                graph=graph,
+                k=self.top_k,
+                n_probe=self.numpy_n_probe,
+            )
+        else:
+            self.retriever = Neo4jMovieRetriever(
+                vector_store=self.neo4jvector, k=self.top_k, max_fetch=self.max_fetch
+            )
 
     def _setup_prompt(self) -> None:
         """Set up the prompt template for recommendations."""
@@ -57,24 +179,152 @@ class MovieRecommenderVectorSimilarity:
             ]
         )
 
+    def _retrieve(self, inputs: Dict[str, Any], config: RunnableConfig) -> List[Document]:
+        """Retrieve the context documents with the budget and exclusions of the request."""
+        return self.retriever.invoke(
+            inputs["input"],
+            config,
+            k=inputs.get("k"),
+            excluded_titles=inputs.get("excluded_titles"),
+        )
+
     def _setup_chain(self) -> None:
-        """Set up the chain for recommendations."""
-        self.qa_chain = create_stuff_documents_chain(llm, self.prompt)
-        self.description_retriever = create_retrieval_chain(
-            self.retriever, self.qa_chain
+        """Set up the chain for recommendations.
+
+        Same layout as ``create_retrieval_chain``, but the retriever also
+        receives the result budget and the excluded titles of the request.
+        """
+        self.qa_chain = create_stuff_documents_chain(llm, self.prompt).with_config(
+            tags=[ANSWER_TAG]
         )
+        self.description_retriever = (
+            RunnablePassthrough.assign(
+                context=RunnableLambda(self._retrieve).with_config(run_name="retrieve_documents"),
+            ).assign(answer=self.qa_chain)
+        ).with_config(run_name="retrieval_chain")
 
-    def recommend_similar_movies(self, input: str) -> Dict[str, Any]:
+    def recommend_similar_movies(
+        self,
+        input: str,
+        excluded_titles: Optional[List[str]] = None,
+        k: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """Recommend similar movies based on the input description.
 
         Args:
             input: The input description to find similar movies for.
+            excluded_titles: Titles that must not be passed to the LLM, e.g.
+                the movies the user already watched.
+            k: Number of movies passed to the LLM, defaults to ``top_k``.
 
         Returns:
             A dictionary containing the recommendation results.
         """
-        
-        return self.description_retriever.invoke({"input": input})
+        return self.description_retriever.invoke(
+            {"input": input, "excluded_titles": excluded_titles or [], "k": k or self.top_k}
+        )
+
+
+class VectorRecommenderPool:
+    """Thread-safe pool of warmed MovieRecommenderVectorSimilarity instances.
+
+    The pool is created once per process and shared by all sessions. Instances
+    are built by ``warm_up`` (or lazily on first use) and handed out one at a
+    time through ``acquire``, so concurrent tool calls never share a chain.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        acquire_timeout: float = 30.0,
+        recommender_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """Initialize an empty pool.
+
+        Args:
+            size (int): Number of recommender instances to keep
+            acquire_timeout (float): Seconds to wait for a free instance
+            recommender_kwargs (Dict[str, Any], optional): Arguments passed to
+                every MovieRecommenderVectorSimilarity instance
+        """
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self.recommender_kwargs = recommender_kwargs or {}
+        self._available: "queue.Queue[MovieRecommenderVectorSimilarity]" = queue.Queue()
+        self._instances: List[MovieRecommenderVectorSimilarity] = []
+        self._lock = threading.Lock()
+        self.warmed_up_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _grow(self) -> None:
+        """Create a new instance if the pool is not full yet."""
+        with self._lock:
+            if len(self._instances) >= self.size:
+                return
+            recommender = MovieRecommenderVectorSimilarity(**self.recommender_kwargs)
+            self._instances.append(recommender)
+        self._available.put(recommender)
+
+    def warm_up(self) -> None:
+        """Build every instance of the pool up front. Safe to call repeatedly."""
+        if len(self._instances) >= self.size:
+            return
+        try:
+            while len(self._instances) < self.size:
+                self._grow()
+            self.warmed_up_at = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error warming up the vector recommender pool: {e}")
+
+    @contextmanager
+    def acquire(self) -> Iterator[MovieRecommenderVectorSimilarity]:
+        """Borrow a recommender instance for the duration of the block."""
+        if self._available.empty() and len(self._instances) < self.size:
+            self._grow()
+        recommender = self._available.get(timeout=self.acquire_timeout)
+        try:
+            yield recommender
+        finally:
+            self._available.put(recommender)
+
+    def health_check(self) -> Dict[str, Any]:
+        """Check that the pool is warm and the vector index is online.
+
+        Returns:
+            Dict[str, Any]: Pool size, free instances, index state and last error
+        """
+        status = {
+            "healthy": False,
+            "instances": len(self._instances),
+            "available": self._available.qsize(),
+            "warmed_up_at": self.warmed_up_at,
+            "index_state": None,
+            "last_error": self.last_error,
+        }
+        try:
+            if self._instances and self._instances[0].retriever_backend == "numpy":
+                index = self._instances[0].retriever.index
+                status["index_state"] = "ONLINE" if len(index) else "EMPTY"
+            else:
+                result = graph.query(
+                    "SHOW INDEXES YIELD name, state WHERE name = $name RETURN state",
+                    {"name": "MovieVector"},
+                )
+                status["index_state"] = result[0]["state"] if result else "MISSING"
+        except Exception as e:
+            status["last_error"] = str(e)
+        status["healthy"] = (
+            status["instances"] > 0 and status["index_state"] == "ONLINE"
+        )
+        return status
+
+
+# Create the shared recommender pool
+vector_recommender_pool = VectorRecommenderPool(
+    size=int(st.secrets.get("VECTOR_RECOMMENDER_POOL_SIZE", 2))
+)
 
 
 @tool("recommend_similar_movies", return_direct=True)
@@ -85,5 +335,8 @@ def recommend_similar_movies(user_input: str) -> str:
     Returns:
         str: A string containing the recommendations generated by the LLM
     """
-    recommender = MovieRecommenderVectorSimilarity()
-    return recommender.recommend_similar_movies(user_input)
+    excluded_titles = list(
+        set(st.session_state.get("user_watched", [])) | set(st.session_state.get("user_movies", []))
+    )
+    with vector_recommender_pool.acquire() as recommender:
+        return recommender.recommend_similar_movies(user_input, excluded_titles=excluded_titles)
@@ -23,28 +23,6 @@ def get_session_id():
     return get_script_run_ctx().session_id
 
 
-import ast
-
-
-def clean_uploaded_data(byte_data):
-    """
-    Cleans the byte string data and converts it into a proper Python list.
-
-    Parameters:
-        byte_data (bytes): Byte string, e.g., b"['film1']\r\n"
-
-    Returns:
-        list: Python list extracted from the byte string.
-    """
-    # Decode the byte string to a regular string
-    decoded_str = byte_data.decode("utf-8").strip()
-
-    # Safely evaluate the string as a Python literal (list)
-    python_list = ast.literal_eval(decoded_str)
-
-    return python_list
-
-
 def initialize_session_state():
     # Set up Session State
     if "chat_history" not in st.session_state:
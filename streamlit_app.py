@@ -1,18 +1,29 @@
 import io
 import streamlit as st
 import streamlit.config
-from src.utils import clean_uploaded_data, initialize_session_state
-from src.database.graph import graph
-from src.chat.agent import MovieRecommenderApp
-import src.prompts.cypher_queries as cypher_queries
+from src.utils import initialize_session_state
+from src.monitoring.tracing import trace_summary, tracer
+from src.registry import registry
 
 # Type hinting imports
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from src.database.search import CatalogSearch
 
 # Get sensitive information
 openai_api_key = st.secrets["OPENAI_API_KEY"]
 openai_model = st.secrets["OPENAI_MODEL"]
 
+# Render answers token by token instead of after the whole generation
+STREAM_RESPONSES = str(st.secrets.get("STREAM_RESPONSES", True)).lower() not in ("false", "0")
+
+# Number of matches offered by the movie and actor search boxes
+TYPEAHEAD_RESULTS = int(st.secrets.get("TYPEAHEAD_RESULTS", 20))
+
+# Keep the preferences of named profiles in the graph
+USER_PROFILES_ENABLED = str(st.secrets.get("USER_PROFILES_ENABLED", False)).lower() in ("true", "1")
+
 
 def main() -> None:
     """
@@ -38,14 +49,17 @@ def main() -> None:
     # Initialize session state
     initialize_session_state()
 
+    # Build the graph, models and agent in the background (no-op once started)
+    registry.warm_up()
+
     # Sidebar for user preferences
-    display_sidebar(graph)
+    display_sidebar()
 
     # Main chat interface
     display_chat_interface()
 
 
-def display_sidebar(graph) -> None:
+def display_sidebar() -> None:
     """
     Creates and manages the sidebar components where users can upload
     or manually input their preferences.
@@ -56,69 +70,197 @@ def display_sidebar(graph) -> None:
     )
 
     with st.sidebar.expander("🔧 Set User Preferences"):
-        movie_titles = cypher_queries.get_movie_titles(graph)
-        genre_names = cypher_queries.get_genre_names(graph)
-        actor_names = cypher_queries.get_actor_names(graph)
+        genre_names = registry.get("catalog").get_snapshot().genre_names
+        catalog_search = registry.get("catalog_search")
+
+        if USER_PROFILES_ENABLED:
+            handle_user_profile()
 
         # Handle file upload for preferences
-        txt_file = st.file_uploader("📥 Upload your preferences (TXT)", type="txt")
+        preferences_file = st.file_uploader(
+            "📥 Upload your preferences (TXT, JSON or CSV)", type=["txt", "json", "csv"]
+        )
         if st.button("📤 Upload Preferences"):
-            upload_preferences(txt_file)
+            upload_preferences(preferences_file, catalog_search)
 
         # Handle manual entry of preferences
         st.write("Or enter your preferences manually 👇")
-        handle_manual_preferences(movie_titles, genre_names, actor_names)
+        handle_manual_preferences(catalog_search, genre_names)
 
         if st.button("💾 Save Preferences"):
             save_preferences()
 
+        if USER_PROFILES_ENABLED:
+            # Write changed lists to the open profile, keeping the flag until that succeeds
+            if st.session_state.get("profile_changed"):
+                st.session_state.profile_changed = (
+                    registry.get("user_profiles").sync(st.session_state) is None
+                )
+            unmatched = st.session_state.get("profile_unmatched") or {}
+            if unmatched:
+                names = sorted({name for values in unmatched.values() for name in values})
+                st.warning(
+                    f"⚠️ Not in the catalog, not saved to your profile: {', '.join(names)}"
+                )
+
+    st.sidebar.checkbox(
+        "⏱️ Show timing panel",
+        value=bool(st.secrets.get("SHOW_TIMING_PANEL", False)),
+        key="show_timings",
+        help="Show how long each step of the last answer took.",
+    )
+
 
-def upload_preferences(txt_file: Optional[io.BytesIO]) -> None:
+def mark_preferences_changed() -> None:
+    """
+    Flags the preference lists as changed, so the open profile is synced.
+    """
+    st.session_state.profile_changed = True
+
+
+def handle_user_profile() -> None:
+    """
+    Opens the profile named by the user and unlocked by their PIN, restoring
+    its stored preferences, or starts a new one from the current preferences.
+    """
+    name = st.text_input(
+        "👤 Profile name",
+        key="profile_name",
+        help="Your preferences are saved under this name and PIN and restored on your next visit.",
+    )
+    pin = st.text_input(
+        "🔑 PIN",
+        key="profile_pin",
+        type="password",
+        help="At least 4 characters. Profiles keep casual visitors apart but are not private.",
+    )
+    if (name, pin) == st.session_state.get("profile_opened_name"):
+        return
+
+    profile_store = registry.get("user_profiles")
+    st.session_state.profile_opened_name = (name, pin)
+    if not name.strip() or not pin:
+        profile_store.close(st.session_state)
+        return
+    if len(pin) < 4:
+        profile_store.close(st.session_state)
+        st.warning("🔑 The PIN needs at least 4 characters.")
+        return
+    # A new profile is written from the current lists
+    mark_preferences_changed()
+    try:
+        if profile_store.open(st.session_state, name, pin):
+            st.success("👤 Welcome back! Your preferences were restored.", icon="✅")
+        else:
+            st.info("👤 New profile: your preferences will be saved as you change them.")
+    except Exception as e:
+        st.error("Loading the profile failed", icon="❌")
+        st.error(e)
+
+
+def upload_preferences(
+    preferences_file: Optional[io.BytesIO], catalog_search: "CatalogSearch"
+) -> None:
     """
-    Handles uploading and parsing a TXT file with user preferences.
+    Handles uploading a preference file and matching its names against the catalog.
 
     Args:
-        txt_file (Optional[io.BytesIO]): The file uploaded by the user.
+        preferences_file (Optional[io.BytesIO]): The file uploaded by the user.
+        catalog_search (CatalogSearch): Search over the catalog lists.
     """
+    # Imported on first upload, to keep the app start fast
+    from src.preference_import import import_preferences
 
-    if txt_file is not None:
-        with st.spinner("Uploading TXT File..."):
+    if preferences_file is not None:
+        with st.spinner("Uploading Preferences..."):
             try:
-                lists = [clean_uploaded_data(line) for line in txt_file]
-                st.session_state.user_movies = lists[0]
-                st.session_state.user_actors = lists[1]
-                st.session_state.user_genres = lists[2]
-                st.session_state.user_watched = lists[3]
-                st.success("📂 Preferences Uploaded Successfully!", icon="✅")
+                report = import_preferences(
+                    preferences_file, catalog_search, filename=preferences_file.name
+                )
+                for key, values in report.lists.items():
+                    st.session_state[key] = values
+                mark_preferences_changed()
+                st.success(
+                    f"📂 Preferences Uploaded Successfully! "
+                    f"({sum(len(v) for v in report.lists.values())} entries "
+                    f"in {report.seconds:.1f} s)",
+                    icon="✅",
+                )
+                if report.fuzzy_count or report.unknown_count or report.unchecked_count:
+                    with st.expander(
+                        f"⚠️ {report.fuzzy_count} approximate, "
+                        f"{report.unknown_count} unknown and "
+                        f"{report.unchecked_count} unchecked entries"
+                    ):
+                        for key, pairs in report.fuzzy.items():
+                            st.write(f"**{key}** matched approximately:")
+                            st.write({given: matched for given, matched in pairs})
+                        for key, names in report.unknown.items():
+                            st.write(f"**{key}** not in the catalog:")
+                            st.write(names)
+                        for key, names in report.unchecked.items():
+                            st.write(f"**{key}** not checked for approximate matches:")
+                            st.write(names)
             except Exception as e:
                 st.error("Upload Failed", icon="❌")
                 st.error(e)
     else:
-        st.warning("Please upload a valid TXT file.", icon="⚠️")
+        st.warning("Please upload a valid preferences file.", icon="⚠️")
 
 
-def handle_manual_preferences(
-    movie_titles: List[str], genre_names: List[str], actor_names: List[str]
+def typeahead_multiselect(
+    label: str,
+    catalog_search: "CatalogSearch",
+    field: str,
+    state_key: str,
+    max_selections: Optional[int] = None,
 ) -> None:
+    """
+    Displays a search box and a multiselect offering only the matching values,
+    instead of sending the whole catalog list to the browser.
+
+    Args:
+        label (str): Label of the multiselect.
+        catalog_search (CatalogSearch): Search over the catalog lists.
+        field (str): Catalog list to search, e.g. "movie_titles".
+        state_key (str): Session state key holding the selected values.
+        max_selections (Optional[int]): Maximum number of selected values.
+    """
+    query = st.text_input(f"🔍 Search: {label}", key=f"{state_key}_query")
+    selected = st.session_state.get(state_key, [])
+    matches = catalog_search.search(field, query, limit=TYPEAHEAD_RESULTS) if query else []
+    # Keep the current selection among the options so it survives a new search
+    options = list(dict.fromkeys([*selected, *matches]))
+    st.session_state[state_key] = st.multiselect(
+        label,
+        options,
+        selected,
+        max_selections=max_selections,
+        on_change=mark_preferences_changed,
+    )
+
+
+def handle_manual_preferences(catalog_search: "CatalogSearch", genre_names: Sequence[str]) -> None:
     """
     Handles manual entry of user preferences.
 
     Args:
-        movie_titles (List[str]): List of available movie titles.
-        genre_names (List[str]): List of available genres.
-        actor_names (List[str]): List of available actors.
+        catalog_search (CatalogSearch): Search over the movie titles and actor names.
+        genre_names (Sequence[str]): Available genres.
     """
-    st.session_state.user_movies = st.multiselect(
+    typeahead_multiselect(
         "🎥 Select Your Favorite Movies",
-        movie_titles,
-        st.session_state.get("user_movies", []),
+        catalog_search,
+        "movie_titles",
+        "user_movies",
         max_selections=10,
     )
 
-    st.session_state.user_actors = st.multiselect(
+    typeahead_multiselect(
         "⭐ Choose Favorite Actors",
-        actor_names,
-        st.session_state.get("user_actors", []),
+        catalog_search,
+        "actor_names",
+        "user_actors",
         max_selections=10,
     )
 
@@ -127,12 +269,11 @@ def handle_manual_preferences(
         genre_names,
         st.session_state.get("user_genres", []),
         max_selections=10,
+        on_change=mark_preferences_changed,
     )
 
-    st.session_state.user_watched = st.multiselect(
-        "👀 Mark Movies You've Watched",
-        movie_titles,
-        st.session_state.get("user_watched", []),
+    typeahead_multiselect(
+        "👀 Mark Movies You've Watched", catalog_search, "movie_titles", "user_watched"
     )
 
 
@@ -180,6 +321,41 @@ def display_chat_interface() -> None:
     if user_message:
         handle_user_query(user_message)
 
+    if st.session_state.get("show_timings"):
+        display_timing_panel()
+
+
+def display_timing_panel() -> None:
+    """
+    Displays the startup cost of each component and the per-step timings of the last chat turn.
+    """
+    with st.expander("🚀 Startup timings"):
+        st.dataframe(registry.timing_report(), use_container_width=True, hide_index=True)
+
+    if registry.is_ready("app"):
+        from src.chat.agent import response_cache
+
+        cache_stats = response_cache.get_stats()
+        st.caption(
+            f"Response cache: {cache_stats['hit_rate']:.0%} hit rate · "
+            f"{cache_stats['exact_hits'] + cache_stats['semantic_hits']} hits · "
+            f"{cache_stats['misses']} misses · {cache_stats['entries']} entries"
+        )
+
+    timings = st.session_state.get("last_turn_timings")
+    if not timings:
+        return
+
+    with st.expander("⏱️ Timings of the last answer"):
+        llm_rows = [row for row in timings if row["kind"] == "llm"]
+        cypher_rows = [row for row in timings if row["kind"] == "cypher"]
+        st.caption(
+            f"Total {timings[0]['ms']:.0f} ms · {len(llm_rows)} LLM calls "
+            f"({sum(row['ms'] for row in llm_rows):.0f} ms) · {len(cypher_rows)} Cypher "
+            f"queries ({sum(row['ms'] for row in cypher_rows):.0f} ms)"
+        )
+        st.dataframe(timings, use_container_width=True, hide_index=True)
+
 
 def handle_user_query(user_message: str) -> None:
     """
@@ -194,22 +370,40 @@ def handle_user_query(user_message: str) -> None:
     with st.chat_message("user"):
         st.markdown(user_message)
 
-    with st.spinner("Generating Recommendations..."):
+    preferences = dict(
+        user_input=user_message,
+        user_favorite_movies=st.session_state.get("user_movies", []),
+        user_favorite_actors=st.session_state.get("user_actors", []),
+        user_favorite_genres=st.session_state.get("user_genres", []),
+        user_watched_movies=st.session_state.get("user_watched", []),
+    )
+
+    try:
         try:
-            response = MovieRecommenderApp.generate_response(
-                user_input=user_message,
-                user_favorite_movies=st.session_state.get("user_movies", []),
-                user_favorite_actors=st.session_state.get("user_actors", []),
-                user_favorite_genres=st.session_state.get("user_genres", []),
-                user_watched_movies=st.session_state.get("user_watched", []),
+            with tracer.span("chat_turn", kind="turn") as turn:
+                if not registry.is_ready("app"):
+                    with st.spinner("Starting the recommender..."):
+                        registry.get("app")
+                app = registry.get("app")
+                if STREAM_RESPONSES:
+                    # Tokens of the final answer are rendered while the agent is running
+                    with st.chat_message("assistant"):
+                        response = st.write_stream(
+                            app.stream_response(**preferences)
+                        )
+                else:
+                    with st.spinner("Generating Recommendations..."):
+                        response = app.generate_response(**preferences)
+                    with st.chat_message("assistant"):
+                        st.markdown(response)
+        finally:
+            st.session_state.last_turn_timings = trace_summary(
+                tracer.get_trace(turn.trace_id)
             )
-            st.session_state.chat_history.append(("Assistant", response))
-
-            with st.chat_message("assistant"):
-                st.markdown(response)
-        except Exception as e:
-            st.error("Error generating response.")
-            st.error(e)
+        st.session_state.chat_history.append(("Assistant", response))
+    except Exception as e:
+        st.error("Error generating response.")
+        st.error(e)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+import pytest
+
+from benchmarks.in_memory_graph import InMemoryGraph
+from benchmarks.synthetic_graph import generate_catalog
+from src.prompts.cypher_prompts import (
+    CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+    CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE,
+)
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return InMemoryGraph(generate_catalog(300, seed=5), query_latency=0)
+
+
+def shared(graph, seed, title):
+    movie, other = graph.movies[seed], graph.movies[title]
+    return (
+        len(set(movie.genres) & set(other.genres)),
+        len(set(movie.actors) & set(other.actors)),
+    )
+
+
+def test_per_seed_title_template_keeps_excluded_movies_without_actors(graph):
+    seed = next(title for title, movie in graph.movies.items() if movie.actors)
+    best = graph.query(
+        CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE,
+        {"movie_title": seed, "user_movies": [], "user_watched_movies": []},
+    )[0]["RecommendedMovie"]
+    genres, _ = shared(graph, seed, best)
+
+    records = graph.query(
+        CYPHER_MOVIE_SIMILARITY_SEARCH_TEMPLATE,
+        {"movie_title": seed, "user_movies": [], "user_watched_movies": [best]},
+    )
+    scores = {record["RecommendedMovie"]: record["score"] for record in records}
+    assert scores.get(best, 2 * genres + 1) == 2 * genres + 1
+    assert best in scores or min(scores.values()) >= 2 * genres + 1
+
+    by_id = graph.query(
+        CYPHER_MOVIE_SIMILARITY_SEARCH_BY_ID_TEMPLATE,
+        {"movie_id": graph.ids[seed], "excluded_ids": [graph.ids[best]]},
+    )
+    assert best not in [record["RecommendedMovie"] for record in by_id]
+
+
+def test_genre_title_template_counts_repeated_names(graph):
+    first, second = sorted(graph.movies_by_genre)[:2]
+    records = graph.query(
+        CYPHER_GENRE_SIMILARITY_SEARCH_TEMPLATE,
+        {"user_genres": [first, first, second], "user_watched_movies": []},
+    )
+
+    counts = [
+        2 * (record["rec.title"] in graph.movies_by_genre[first])
+        + (record["rec.title"] in graph.movies_by_genre[second])
+        for record in records
+    ]
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] >= 2
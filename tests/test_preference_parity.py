@@ -0,0 +1,61 @@
+import pytest
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+from benchmarks.runner import install_stand_ins
+from benchmarks.synthetic_graph import generate_catalog
+
+
+@pytest.fixture(scope="module")
+def graph():
+    embeddings = FakeEmbeddings()
+    graph = InMemoryGraph(generate_catalog(400, embeddings=embeddings, seed=7), query_latency=0)
+    install_stand_ins(graph, FakeChatModel(latency=0, token_latency=0), embeddings)
+    return graph
+
+
+@pytest.fixture(scope="module")
+def snapshot(graph):
+    from src.database.preference_snapshot import export_snapshot
+
+    return export_snapshot(graph, batch_size=150)
+
+
+def test_snapshot_ranks_like_the_cypher_templates(graph, snapshot):
+    from src.database.preference_parity import (
+        PARITY_BRANCHES,
+        PROFILE_PARITY_BRANCHES,
+        run_parity,
+    )
+
+    report = run_parity(graph, snapshot, samples=40, seed=3)
+
+    assert set(report["branches"]) == set(PARITY_BRANCHES + PROFILE_PARITY_BRANCHES)
+    assert report["mismatching_samples"] == 0, report["examples"]
+
+
+def test_parity_profiles_are_deleted(graph, snapshot):
+    from src.database.preference_parity import run_parity
+
+    run_parity(graph, snapshot, samples=5, seed=11)
+
+    assert graph.users == {}
+    assert graph.query_counts["movie_similarity_batch_by_user"] > 0
+
+
+def test_same_length_replacement_is_refreshed(graph, snapshot):
+    from src.database.preference_snapshot import refresh_snapshot
+
+    title = snapshot.titles[0]
+    genres, actors = snapshot.neighbourhood(title)
+    renamed = actors[0][:-1] + ("x" if actors[0][-1] != "x" else "y")
+    movie = graph.movies[title]
+    original = list(movie.actors)
+    movie.actors[movie.actors.index(actors[0])] = renamed
+    try:
+        refreshed, changed = refresh_snapshot(graph, snapshot, batch_size=150)
+    finally:
+        movie.actors[:] = original
+
+    assert changed == 1
+    assert renamed in refreshed.neighbourhood(title)[1]
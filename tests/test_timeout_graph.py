@@ -0,0 +1,93 @@
+import threading
+from unittest import mock
+
+from langchain_neo4j import Neo4jGraph
+
+from benchmarks.in_memory_graph import InMemoryGraph
+from benchmarks.synthetic_graph import generate_catalog
+from src.database.timeout_graph import TimeoutNeo4jGraph, supports_query_timeout
+
+
+def make_graph(timeout=None):
+    with mock.patch("neo4j.GraphDatabase.driver") as driver:
+        graph = TimeoutNeo4jGraph(
+            url="bolt://localhost:7687",
+            username="neo4j",
+            password="secret",
+            refresh_schema=False,
+            timeout=timeout,
+        )
+    record = mock.Mock()
+    record.data.return_value = {"title": "Heat"}
+    driver.return_value.execute_query.return_value = ([record], None, None)
+    return graph, driver.return_value
+
+
+def sent_timeouts(driver):
+    return [call.args[0].timeout for call in driver.execute_query.call_args_list]
+
+
+def test_query_timeout_is_sent_with_the_statement():
+    graph, driver = make_graph()
+
+    assert graph.query("RETURN 1", {"x": 1}, timeout=2.5) == [{"title": "Heat"}]
+    graph.query("RETURN 1")
+
+    assert sent_timeouts(driver) == [2.5, None]
+    assert driver.execute_query.call_args.kwargs["parameters_"] == {}
+
+
+def test_query_timeout_defaults_to_the_graph_timeout():
+    graph, driver = make_graph(timeout=30)
+
+    graph.query("RETURN 1")
+    graph.query("RETURN 1", timeout=1)
+    graph.query("RETURN 1")
+
+    assert sent_timeouts(driver) == [30, 1, 30]
+    assert graph.timeout == 30
+
+
+def test_session_params_keep_the_timeout():
+    graph, driver = make_graph()
+    session = driver.session.return_value.__enter__.return_value
+    session.run.return_value = []
+
+    graph.query("RETURN 1", session_params={"database": "movies"}, timeout=4)
+
+    driver.session.assert_called_once_with(database="movies")
+    assert session.run.call_args.args[0].timeout == 4
+    assert graph.timeout is None
+
+
+def test_query_timeout_is_per_thread():
+    graph, driver = make_graph(timeout=30)
+    seen = {}
+    started, release = threading.Event(), threading.Event()
+
+    def slow_execute(query, **kwargs):
+        seen[threading.current_thread().name] = query.timeout
+        if threading.current_thread().name == "slow":
+            started.set()
+            release.wait(5)
+        return [], None, None
+
+    driver.execute_query.side_effect = slow_execute
+    slow = threading.Thread(target=graph.query, args=("RETURN 1",), kwargs={"timeout": 1}, name="slow")
+    slow.start()
+    started.wait(5)
+    fast = threading.Thread(target=graph.query, args=("RETURN 1",), name="fast")
+    fast.start()
+    fast.join(5)
+    release.set()
+    slow.join(5)
+
+    assert seen == {"slow": 1, "fast": 30}
+
+
+def test_supports_query_timeout():
+    graph, _ = make_graph()
+
+    assert supports_query_timeout(graph)
+    assert supports_query_timeout(InMemoryGraph(generate_catalog(20), query_latency=0))
+    assert not supports_query_timeout(mock.create_autospec(Neo4jGraph, instance=True))